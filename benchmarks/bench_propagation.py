@@ -0,0 +1,228 @@
+import os, sys, time, json, platform, itertools, subprocess, tracemalloc, multiprocessing
+import numpy
+
+from benchmarks import wiselib_standin
+
+###################################################################
+# THROUGHPUT OF THE HUYGENS INTEGRAL PROPAGATORS
+#
+# from the root of the repository (not installed with the package):
+# python -m benchmarks.bench_propagation -o results.json
+# python -m benchmarks.bench_propagation -o new.json --compare results.json
+# python -m benchmarks.bench_propagation --standin -o results.json (numpy stand-in instead of wiselib)
+###################################################################
+
+MODES = ("MIRROR_ONLY", "DETECTOR_ONLY", "MIRROR_AND_DETECTOR")
+
+ALGORITHMS = ("HuygensIntegral", "VectorizedHuygensIntegral", "MixedPrecisionHuygensIntegral")
+
+BEAMLINE = {"wavelength": 5e-9,    # m
+            "sigma": 20e-6,        # m
+            "f1": 98.0,            # m
+            "f2": 1.2,             # m
+            "alpha": 2.5,          # deg
+            "length": 0.4,         # m
+            "detector_size": 50e-6,# m
+            "defocus_range": 1e-3} # m
+
+def get_metadata(use_standin):
+    metadata = {"python": platform.python_version(),
+                "numpy": numpy.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "wiselib": "stand-in" if use_standin else _get_wiselib_version(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    try:
+        metadata["commit"] = subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                                     cwd=os.path.dirname(os.path.abspath(__file__)),
+                                                     stderr=subprocess.DEVNULL).decode("utf-8").strip()
+    except Exception:
+        metadata["commit"] = "unknown"
+
+    return metadata
+
+def _get_wiselib_version():
+    from orangecontrib.wise.util.wise_cache import get_package_version
+
+    return get_package_version("wiselib")
+
+def create_beamline():
+    from orangecontrib.wise.util.wise_pipeline import create_gaussian_source, create_elliptical_mirror, position_source_at_mirror_focus
+
+    source = create_gaussian_source(BEAMLINE["wavelength"], BEAMLINE["sigma"], source_on_mirror_focus=True)
+    elliptic_mirror = create_elliptical_mirror(BEAMLINE["f1"], BEAMLINE["f2"], BEAMLINE["alpha"], BEAMLINE["length"])
+
+    return position_source_at_mirror_focus(source, elliptic_mirror).inner_wise_source, elliptic_mirror
+
+def get_propagation_parameters(mode, number_of_points, n_pools, sweep_length):
+    from orangecontrib.wise.util.wise_objects import WiseWavefront, WiseNumericalIntegrationParameters
+    from orangecontrib.wise.util.wise_propagator import WisePropagatorsChain, WisePropagationAlgorithms, WisePropagationParameters
+
+    source, elliptic_mirror = create_beamline()
+
+    numerical_integration_parameters = WiseNumericalIntegrationParameters(WiseNumericalIntegrationParameters.USER_DEFINED,
+                                                                          BEAMLINE["detector_size"],
+                                                                          number_of_points,
+                                                                          number_of_points,
+                                                                          detector_number_of_points=number_of_points) # N x N: comparable with older baselines
+
+    if sweep_length == 1:
+        defocus_sweep = 0.0
+    else:
+        defocus_sweep = numpy.linspace(-BEAMLINE["defocus_range"], BEAMLINE["defocus_range"], sweep_length)
+
+    wavefront = None
+
+    if mode == "DETECTOR_ONLY":
+        mirror_output = WisePropagatorsChain.Instance().do_propagation(WisePropagationParameters(propagation_type=WisePropagationParameters.MIRROR_ONLY,
+                                                                                                 source=source,
+                                                                                                 optical_element=elliptic_mirror,
+                                                                                                 numerical_integration_parameters=numerical_integration_parameters),
+                                                                       WisePropagationAlgorithms.HuygensIntegral)
+
+        wavefront = WiseWavefront(mirror_output.mir_x, mirror_output.mir_y, mirror_output.mir_s, mirror_output.mir_E, mirror_output.residuals)
+
+    return WisePropagationParameters(propagation_type=getattr(WisePropagationParameters, mode),
+                                     source=source,
+                                     optical_element=elliptic_mirror,
+                                     wavefront=wavefront,
+                                     numerical_integration_parameters=numerical_integration_parameters,
+                                     defocus_sweep=defocus_sweep,
+                                     n_pools=n_pools)
+
+def run_case(mode, algorithm, number_of_points, n_pools, sweep_length, repeat=3):
+    from orangecontrib.wise.util.wise_propagator import WisePropagatorsChain
+
+    chain = WisePropagatorsChain.Instance()
+    parameters = get_propagation_parameters(mode, number_of_points, n_pools, sweep_length)
+
+    # every run starts cold: the cached mirror field would hide the cost of MIRROR_ONLY and MIRROR_AND_DETECTOR
+    def propagate():
+        chain.get_mirror_field_cache().clear()
+
+        return chain.do_propagation(parameters, algorithm)
+
+    propagate() # warm up: pool startup, imports, first touch of the memory
+
+    wall_times = []
+    cpu_times = []
+    for _ in range(repeat):
+        t0, c0 = time.perf_counter(), time.process_time()
+        output = propagate()
+        wall_times.append(time.perf_counter() - t0)
+        cpu_times.append(time.process_time() - c0)
+
+    # separate run: tracing slows down the allocations. Only the main process is traced
+    tracemalloc.start()
+    propagate()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    number_of_detector_points = 0 if output.det_x is None else int(numpy.size(output.det_x))
+
+    return {"mode": mode,
+            "algorithm": algorithm,
+            "number_of_points": int(number_of_points),
+            "n_pools": int(n_pools),
+            "sweep_length": int(sweep_length),
+            "repeat": int(repeat),
+            "wall_time_min": float(numpy.min(wall_times)),
+            "wall_time_median": float(numpy.median(wall_times)),
+            "cpu_time_median": float(numpy.median(cpu_times)),
+            "peak_memory": int(peak_memory),
+            "pairs_per_second": float(number_of_detector_points*number_of_points/numpy.min(wall_times)) if number_of_detector_points > 0 else None,
+            "HEW": None if output.HEW is None else numpy.atleast_1d(output.HEW).tolist()}
+
+def get_cases(modes, algorithms, number_of_points_list, n_pools_list, sweep_length_list):
+    for mode, algorithm, number_of_points, n_pools, sweep_length in itertools.product(modes, algorithms, number_of_points_list, n_pools_list, sweep_length_list):
+        # no detector: the sweep is not used. The vectorized integrals run in the main process: n_pools is not used
+        if mode == "MIRROR_ONLY" and (sweep_length != sweep_length_list[0] or n_pools != n_pools_list[0]): continue
+        if algorithm in ("VectorizedHuygensIntegral", "MixedPrecisionHuygensIntegral") and n_pools != n_pools_list[0]: continue
+
+        yield mode, algorithm, number_of_points, n_pools, sweep_length
+
+def get_case_key(result):
+    return result["mode"], result["algorithm"], result["number_of_points"], result["n_pools"], result["sweep_length"]
+
+def compare(results, baseline_results, threshold):
+    baseline = {get_case_key(result): result for result in baseline_results}
+
+    regressions = []
+    for result in results:
+        key = get_case_key(result)
+
+        if key in baseline:
+            ratio = result["wall_time_min"]/baseline[key]["wall_time_min"]
+
+            print("  ".join([str(item) for item in key]) + ": " + str(round(ratio, 3)) + "x baseline")
+
+            if ratio > 1 + threshold: regressions.append((key, ratio))
+
+    return regressions
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark of the WISE Huygens integral propagators")
+    parser.add_argument("-o", "--output", default="wise_benchmark.json", help="JSON file with the timings (default: wise_benchmark.json)")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--algorithms", nargs="+", default=list(ALGORITHMS), choices=ALGORITHMS)
+    parser.add_argument("--number-of-points", nargs="+", type=int, default=[500, 1000, 2000])
+    parser.add_argument("--n-pools", nargs="+", type=int, default=[0, 2])
+    parser.add_argument("--sweep-length", nargs="+", type=int, default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--standin", action="store_true", help="use the numpy stand-in of wiselib (not the same physics)")
+    parser.add_argument("--compare", default=None, help="baseline JSON file: cases slower than the baseline by more than --threshold make the run fail")
+    parser.add_argument("--threshold", type=float, default=0.2)
+
+    arguments = parser.parse_args(argv)
+
+    use_standin = arguments.standin
+
+    if not use_standin and not wiselib_standin.is_wiselib_available(): parser.error("wiselib not available: install it, or run with --standin")
+
+    if use_standin:
+        wiselib_standin.install()
+
+        # the pool workers must inherit the stand-in modules instead of importing wiselib again
+        if "fork" in multiprocessing.get_all_start_methods(): multiprocessing.set_start_method("fork", force=True)
+
+    from orangecontrib.wise.util.wise_propagator import WisePropagatorsChain
+
+    chain = WisePropagatorsChain.Instance()
+    chain.set_disk_cache(None)
+
+    results = []
+
+    try:
+        for mode, algorithm, number_of_points, n_pools, sweep_length in get_cases(arguments.modes,
+                                                                                  arguments.algorithms,
+                                                                                  arguments.number_of_points,
+                                                                                  arguments.n_pools,
+                                                                                  arguments.sweep_length):
+            result = run_case(mode, algorithm, number_of_points, n_pools, sweep_length, arguments.repeat)
+            results.append(result)
+
+            print(mode + " " + algorithm + " N=" + str(number_of_points) + " n_pools=" + str(n_pools) + " sweep=" + str(sweep_length) + ": " +
+                  str(round(result["wall_time_min"], 4)) + " s, peak " + str(round(result["peak_memory"]/1024**2, 2)) + " MB")
+    finally:
+        chain.shutdown_worker_pool()
+
+    with open(arguments.output, "w") as file:
+        json.dump({"metadata": get_metadata(use_standin), "results": results}, file, indent=4)
+
+    if not arguments.compare is None:
+        with open(arguments.compare, "r") as file:
+            regressions = compare(results, json.load(file)["results"], arguments.threshold)
+
+        if len(regressions) > 0:
+            for key, ratio in regressions:
+                print("REGRESSION " + "  ".join([str(item) for item in key]) + ": " + str(round(ratio, 3)) + "x baseline", file=sys.stderr)
+
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
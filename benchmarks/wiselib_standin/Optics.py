@@ -0,0 +1,117 @@
+import numpy
+
+class _Options(object):
+    def __init__(self):
+        self.USE_ROUGHNESS = False
+        self.FIT_NUMERIC_DATA_WITH_POWER_LAW = False
+
+class _Roughness(object):
+    def __init__(self):
+        self.Options = _Options()
+        self.FileName = None
+        self.xScaling = 1.0
+        self.yScaling = 1.0
+
+    def NumericPsdLoadXY(self, FileName, xScaling=1.0, yScaling=1.0, xIsSpatialFreq=False):
+        self.FileName = FileName
+        self.xScaling = xScaling
+        self.yScaling = yScaling
+
+class GaussianSource_1d(object):
+    def __init__(self, Lambda, Waist0=1e-6, ZOrigin=0.0, YOrigin=0.0, Theta=0.0):
+        self.Lambda = Lambda
+        self.Waist0 = Waist0
+        self.ZOrigin = ZOrigin
+        self.YOrigin = YOrigin
+        self.ThetaPropagation = Theta
+
+    def EvalField_XYLab(self, x, y):
+        dx = numpy.asarray(x, dtype=float) - self.ZOrigin
+        dy = numpy.asarray(y, dtype=float) - self.YOrigin
+
+        # beam frame: z along the propagation direction, r transverse
+        z =  dx*numpy.cos(self.ThetaPropagation) + dy*numpy.sin(self.ThetaPropagation)
+        r = -dx*numpy.sin(self.ThetaPropagation) + dy*numpy.cos(self.ThetaPropagation)
+
+        k = 2*numpy.pi/self.Lambda
+        z_rayleigh = numpy.pi*self.Waist0**2/self.Lambda
+
+        waist = self.Waist0*numpy.sqrt(1 + (z/z_rayleigh)**2)
+        inverse_radius = z/(z**2 + z_rayleigh**2)
+        gouy_phase = numpy.arctan(z/z_rayleigh)
+
+        return numpy.sqrt(self.Waist0/waist)*numpy.exp(-(r/waist)**2)*numpy.exp(-1j*(k*z + k*r**2*inverse_radius/2 - gouy_phase/2))
+
+class PointSource_1d(GaussianSource_1d):
+    def __init__(self, Lambda, XOrigin=0.0, YOrigin=0.0):
+        super().__init__(Lambda, Waist0=Lambda, ZOrigin=XOrigin, YOrigin=YOrigin)
+
+#
+# ellipse centred in the origin with the major axis along x, foci F1 = (-c, 0), F2 = (c, 0):
+# the mirror is the arc of length ~L of the lower branch around the pole P, where the grazing angle is Alpha
+#
+class Ellipse(object):
+    def __init__(self, f1, f2, Alpha, L):
+        self.f1 = f1
+        self.f2 = f2
+        self.Alpha = Alpha
+        self.L = L
+
+        self.Options = _Options()
+        self.Roughness = _Roughness()
+
+        self.FigureError = None
+        self.FigureErrorStep = 0.0
+        self.LastResidualUsed = numpy.zeros(0)
+
+        self.a = (f1 + f2)/2
+        self.c = numpy.sqrt(f1**2 + f2**2 + 2*f1*f2*numpy.cos(2*Alpha))/2
+        self.b = numpy.sqrt(self.a**2 - self.c**2)
+
+        self.XYF1 = numpy.array([-self.c, 0.0])
+        self.XYF2 = numpy.array([self.c, 0.0])
+
+        x_pole = (f1**2 - f2**2)/(4*self.c)
+        self.XYPole = numpy.array([x_pole, self._get_y(x_pole)])
+
+        self.pTan_Angle = numpy.arctan(self._get_slope(x_pole))
+        self.p1_Angle = numpy.arctan2(self.XYPole[1] - self.XYF1[1], self.XYPole[0] - self.XYF1[0])
+
+        slope_2 = (self.XYF2[1] - self.XYPole[1])/(self.XYF2[0] - self.XYPole[0])
+        self.p2 = numpy.array([slope_2, self.XYPole[1] - slope_2*self.XYPole[0]])
+
+    def _get_y(self, x):
+        return -self.b*numpy.sqrt(1 - (x/self.a)**2)
+
+    def _get_slope(self, x):
+        return self.b*x/(self.a**2*numpy.sqrt(1 - (x/self.a)**2))
+
+    def FigureErrorAdd(self, FigureError, Step):
+        self.FigureError = numpy.asarray(FigureError, dtype=float)
+        self.FigureErrorStep = Step
+
+    def GetXY_MeasuredMirror(self, N, iRadiation=0):
+        half_width = self.L/2*numpy.cos(self.pTan_Angle)
+
+        x = numpy.linspace(self.XYPole[0] - half_width, self.XYPole[0] + half_width, int(N))
+        y = self._get_y(x)
+
+        if self.FigureError is None:
+            self.LastResidualUsed = numpy.zeros(0)
+        else:
+            figure_error_s = numpy.arange(len(self.FigureError))*self.FigureErrorStep
+            self.LastResidualUsed = numpy.interp(numpy.linspace(0, figure_error_s[-1], int(N)), figure_error_s, self.FigureError)
+
+            y = y + self.LastResidualUsed
+
+        return x, y
+
+    def GetXY_TransversePlaneAtF2(self, DetectorSize, N, Defocus=0.0):
+        direction = self.XYF2 - self.XYPole
+        direction /= numpy.linalg.norm(direction)
+        normal = numpy.array([-direction[1], direction[0]])
+
+        centre = self.XYF2 + Defocus*direction
+        t = numpy.linspace(-DetectorSize/2, DetectorSize/2, int(N))
+
+        return centre[0] + t*normal[0], centre[1] + t*normal[1]
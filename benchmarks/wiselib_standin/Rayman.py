@@ -0,0 +1,44 @@
+import numpy
+
+def Amp(E):
+    return numpy.abs(E)
+
+def Cyc(E):
+    return numpy.angle(E)/(2*numpy.pi)
+
+def xy_to_s(x, y):
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+
+    return numpy.concatenate(([0.0], numpy.cumsum(numpy.sqrt(numpy.diff(x)**2 + numpy.diff(y)**2))))
+
+# number of mirror points sampling the phase seen by a detector of size DetectorSize at distance f2 (factor 2: Nyquist)
+def SamplingCalculator(Lambda, f2, L, DetectorSize, Theta0, Theta1):
+    projected_length = L*numpy.abs(numpy.sin(Theta0 - Theta1))
+
+    return int(max(10, numpy.ceil(2*projected_length*DetectorSize/(Lambda*f2))))
+
+# one detector point at a time, vectorized over the mirror points, as the reference single-process kernel
+def HuygensIntegral_1d_MultiPool(Lambda, E, x, y, xb, yb, nPools=0):
+    k = 2*numpy.pi/Lambda
+
+    E = numpy.asarray(E, dtype=complex)
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+
+    electric_fields = numpy.empty(len(xb), dtype=complex)
+
+    for i in range(len(xb)):
+        r = numpy.sqrt((x - xb[i])**2 + (y - yb[i])**2)
+        electric_fields[i] = numpy.sum(E*numpy.exp(-1j*k*r)/r)
+
+    return electric_fields
+
+# width containing the central 50% of the energy
+def HalfEnergyWidth_1d(I, Step=1):
+    cumulative_energy = numpy.cumsum(numpy.abs(I))
+    cumulative_energy = cumulative_energy/cumulative_energy[-1]
+
+    indexes = numpy.arange(len(cumulative_energy), dtype=float)
+
+    return (numpy.interp(0.75, cumulative_energy, indexes) - numpy.interp(0.25, cumulative_energy, indexes))*Step
@@ -0,0 +1,25 @@
+import sys
+
+#
+# deterministic numpy stand-in for the parts of wiselib.Optics and wiselib.Rayman used by the WISE propagators:
+# same call signatures and comparable amount of work, NOT the same physics. For benchmarking and tests only:
+# not part of the installed package, and active only after an explicit install()
+#
+from benchmarks.wiselib_standin import Optics, Rayman
+
+def is_wiselib_available():
+    try:
+        import wiselib.Rayman, wiselib.Optics
+
+        return not getattr(sys.modules["wiselib"], "IS_STANDIN", False)
+    except ImportError:
+        return False
+
+# registers the stand-in as "wiselib": must be called before importing the WISE propagators
+def install():
+    package = sys.modules[__name__]
+    package.IS_STANDIN = True
+
+    sys.modules["wiselib"] = package
+    sys.modules["wiselib.Optics"] = Optics
+    sys.modules["wiselib.Rayman"] = Rayman
@@ -0,0 +1,321 @@
+import os, shutil, tempfile, hashlib, threading, types
+import numpy
+from collections import OrderedDict
+
+#
+# deterministic content hash of numbers, strings, arrays, containers and plain objects (through their attributes):
+# attributes recording the last calculation (e.g. Optics.Ellipse.LastResidualUsed) are not inputs and are skipped.
+# Objects whose state can't be read entirely (nested deeper than MAX_HASH_DEPTH, no attributes) raise WiseHashError:
+# a key of their type only would return the same entry for different states, callers don't cache them
+#
+VOLATILE_ATTRIBUTES_PREFIXES = ("Last", "_wise_")
+
+MAX_HASH_DEPTH = 32
+
+class WiseHashError(ValueError):
+    pass
+
+def get_hash(*objects):
+    hasher = hashlib.sha1()
+
+    visited = {}
+    for object in objects:
+        _update_hash(hasher, object, visited, 0)
+
+    return hasher.hexdigest()
+
+def _update_hash(hasher, object, visited, depth):
+    if object is None or isinstance(object, (bool, int, float, complex, str, bytes, numpy.generic)):
+        hasher.update((type(object).__name__ + ":" + repr(object) + ";").encode("utf-8"))
+    elif isinstance(object, numpy.ndarray) and not object.dtype.hasobject:
+        hasher.update(("ndarray:" + object.dtype.str + str(object.shape) + ";").encode("utf-8"))
+        hasher.update(numpy.ascontiguousarray(object).reshape(-1).view(numpy.uint8))
+    elif isinstance(object, numpy.ndarray):
+        _update_hash(hasher, object.tolist(), visited, depth)
+    elif id(object) in visited:
+        # already hashed (shared or circular reference): identified by its position in the traversal
+        hasher.update(("ref:" + str(visited[id(object)]) + ";").encode("utf-8"))
+    elif depth > MAX_HASH_DEPTH:
+        raise WiseHashError("Object nested deeper than " + str(MAX_HASH_DEPTH) + " levels: " + type(object).__name__)
+    elif isinstance(object, (list, tuple)):
+        visited[id(object)] = len(visited)
+        hasher.update(("seq:" + str(len(object)) + ";").encode("utf-8"))
+        for item in object: _update_hash(hasher, item, visited, depth + 1)
+    elif isinstance(object, dict):
+        visited[id(object)] = len(visited)
+        hasher.update(("dict:" + str(len(object)) + ";").encode("utf-8"))
+        for key in sorted(object.keys(), key=str):
+            _update_hash(hasher, str(key), visited, depth + 1)
+            _update_hash(hasher, object[key], visited, depth + 1)
+    elif isinstance(object, (type, types.FunctionType, types.MethodType, types.BuiltinFunctionType, types.ModuleType)):
+        hasher.update(("callable:" + getattr(object, "__qualname__", getattr(object, "__name__", "")) + ";").encode("utf-8"))
+    elif hasattr(object, "__dict__") or hasattr(type(object), "__slots__"):
+        visited[id(object)] = len(visited)
+        hasher.update(("object:" + type(object).__module__ + "." + type(object).__qualname__ + ";").encode("utf-8"))
+
+        attributes = get_attributes(object)
+        for name in sorted(attributes.keys()):
+            if name.startswith(VOLATILE_ATTRIBUTES_PREFIXES) or name.startswith("__"): continue
+
+            _update_hash(hasher, name, visited, depth + 1)
+            _update_hash(hasher, attributes[name], visited, depth + 1)
+    else:
+        raise WiseHashError("Object without a readable state: " + type(object).__name__)
+
+class WiseCacheStatistics(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_hit_ratio(self):
+        total = self.hits + self.misses
+
+        return 0.0 if total == 0 else self.hits/total
+
+#
+# in-memory LRU cache with a budget in bytes: entries are tuples of numpy arrays and scalars.
+# Stored arrays are made read-only: an entry is shared by all the hits, callers needing to change it work on a copy
+#
+class WiseLRUCache(object):
+    def __init__(self, max_size=512*1024**2, name="Cache"):
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._size = 0
+        self._max_size = int(max_size)
+        self._lock = threading.RLock()
+
+        self.name = name
+        self.statistics = WiseCacheStatistics()
+
+    def get_size(self):
+        return self._size
+
+    def get_max_size(self):
+        return self._max_size
+
+    def set_max_size(self, max_size):
+        with self._lock:
+            self._max_size = int(max_size)
+            self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.statistics.hits += 1
+
+                return self._entries[key]
+            else:
+                self.statistics.misses += 1
+
+                return None
+
+    def put(self, key, entry):
+        size = get_size_in_bytes(entry)
+
+        set_read_only(entry)
+
+        with self._lock:
+            if key in self._entries: self._remove(key)
+
+            if size <= self._max_size:
+                self._entries[key] = entry
+                self._sizes[key] = size
+                self._size += size
+
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        del self._entries[key]
+        self._size -= self._sizes.pop(key)
+
+    def _evict(self):
+        while self._size > self._max_size and len(self._entries) > 0:
+            self._remove(next(iter(self._entries)))
+            self.statistics.evictions += 1
+
+    def __str__(self):
+        return self.name + ": " + str(len(self._entries)) + " entries, " + \
+               str(round(self._size/1024**2, 2)) + "/" + str(round(self._max_size/1024**2, 2)) + " MB, " + \
+               str(self.statistics.hits) + " hits, " + str(self.statistics.misses) + " misses, " + \
+               str(self.statistics.evictions) + " evictions"
+
+def set_read_only(entry):
+    if isinstance(entry, numpy.ndarray):
+        entry.flags.writeable = False
+    elif isinstance(entry, (list, tuple)):
+        for item in entry: set_read_only(item)
+    elif isinstance(entry, dict):
+        for item in entry.values(): set_read_only(item)
+
+# instance attributes, __slots__ included
+def get_attributes(object):
+    attributes = dict(vars(object)) if hasattr(object, "__dict__") else {}
+
+    for cls in type(object).__mro__:
+        slots = cls.__dict__.get("__slots__", ())
+        for name in ((slots,) if isinstance(slots, str) else slots):
+            if name != "__dict__" and name != "__weakref__" and hasattr(object, name): attributes[name] = getattr(object, name)
+
+    return attributes
+
+def get_size_in_bytes(entry):
+    if isinstance(entry, numpy.ndarray):
+        return entry.nbytes
+    elif isinstance(entry, (list, tuple)):
+        return sum([get_size_in_bytes(item) for item in entry])
+    elif isinstance(entry, dict):
+        return sum([get_size_in_bytes(item) for item in entry.values()])
+    elif hasattr(entry, "__dict__") or hasattr(type(entry), "__slots__"):
+        return sum([get_size_in_bytes(item) for item in get_attributes(entry).values()])
+    else:
+        return 8
+
+#
+# persistent cache on disk: every entry is a directory of .npy files, loaded as read-only memory maps.
+# Entries live in a subdirectory named after the version stamp: a new stamp invalidates all the previous entries
+#
+class WiseDiskCache(object):
+    def __init__(self, directory, max_size=10*1024**3, version_stamp="", name="Disk cache"):
+        self._root_directory = os.path.abspath(directory)
+        self._version_stamp = version_stamp
+        self._directory = os.path.join(self._root_directory, "v_" + version_stamp)
+        self._max_size = int(max_size)
+        self._lock = threading.RLock()
+
+        self.name = name
+        self.statistics = WiseCacheStatistics()
+
+        os.makedirs(self._directory, exist_ok=True)
+
+        self._remove_other_versions()
+        self._size = sum([self._get_entry_size(key) for key in self._get_keys()])
+
+    def get_directory(self):
+        return self._root_directory
+
+    def get_max_size(self):
+        return self._max_size
+
+    def get_size(self):
+        return self._size
+
+    def set_max_size(self, max_size):
+        with self._lock:
+            self._max_size = int(max_size)
+            self._evict()
+
+    def __contains__(self, key):
+        return os.path.isdir(self._get_entry_directory(key))
+
+    def get(self, key):
+        with self._lock:
+            entry_directory = self._get_entry_directory(key)
+
+            if os.path.isdir(entry_directory):
+                try:
+                    entry = {}
+                    for file_name in os.listdir(entry_directory):
+                        if file_name.endswith(".npy"):
+                            array = numpy.load(os.path.join(entry_directory, file_name), mmap_mode="r", allow_pickle=False)
+                            entry[file_name[:-4]] = array[()] if array.ndim == 0 else array
+
+                    os.utime(entry_directory) # LRU: last access time
+
+                    self.statistics.hits += 1
+
+                    return entry
+                except Exception:
+                    self._remove(key) # corrupted entry
+
+            self.statistics.misses += 1
+
+            return None
+
+    def put(self, key, entry):
+        with self._lock:
+            temporary_directory = tempfile.mkdtemp(dir=self._directory, prefix=".tmp_")
+
+            try:
+                for name, value in entry.items():
+                    if value is None: continue
+
+                    numpy.save(os.path.join(temporary_directory, name + ".npy"), numpy.asarray(value), allow_pickle=False)
+
+                if key in self: self._remove(key)
+
+                os.replace(temporary_directory, self._get_entry_directory(key))
+            except Exception:
+                shutil.rmtree(temporary_directory, ignore_errors=True)
+                raise
+
+            self._size += self._get_entry_size(key)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in self._get_keys(): self._remove(key)
+
+    def _get_entry_directory(self, key):
+        return os.path.join(self._directory, key)
+
+    def _get_keys(self):
+        return [key for key in os.listdir(self._directory) if not key.startswith(".")]
+
+    def _get_entry_size(self, key):
+        entry_directory = self._get_entry_directory(key)
+
+        try:
+            return sum([os.path.getsize(os.path.join(entry_directory, file_name)) for file_name in os.listdir(entry_directory)])
+        except OSError:
+            return 0
+
+    def _remove(self, key):
+        self._size -= self._get_entry_size(key)
+        shutil.rmtree(self._get_entry_directory(key), ignore_errors=True)
+
+    def _evict(self):
+        if self._size <= self._max_size: return
+
+        keys = sorted(self._get_keys(), key=lambda key: os.path.getmtime(self._get_entry_directory(key)))
+
+        for key in keys:
+            if self._size <= self._max_size: break
+
+            self._remove(key)
+            self.statistics.evictions += 1
+
+    def _remove_other_versions(self):
+        for directory_name in os.listdir(self._root_directory):
+            if directory_name.startswith("v_") and directory_name != os.path.basename(self._directory):
+                shutil.rmtree(os.path.join(self._root_directory, directory_name), ignore_errors=True)
+
+    def __str__(self):
+        return self.name + " (" + self._root_directory + "): " + \
+               str(round(self._size/1024**2, 2)) + "/" + str(round(self._max_size/1024**2, 2)) + " MB, " + \
+               str(self.statistics.hits) + " hits, " + str(self.statistics.misses) + " misses, " + \
+               str(self.statistics.evictions) + " evictions"
+
+def get_package_version(package_name):
+    try:
+        from importlib import metadata
+
+        return metadata.version(package_name)
+    except Exception:
+        return "unknown"
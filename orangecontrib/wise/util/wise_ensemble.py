@@ -0,0 +1,74 @@
+import os
+import numpy
+from collections import OrderedDict
+
+from srxraylib.metrology import profiles_simulation
+
+from orangecontrib.wise.util.wise_pool import WiseWorkerPool
+
+###################################################################
+# MONTE CARLO ENSEMBLES OF HEIGHT PROFILES
+#
+# realization i is simulate_profile_1D with seed random_seed + i: every profile can be reproduced alone.
+# The ensemble is one (number_of_profiles, N) array, saved as a single .npy file (one profile per row,
+# see wise_metrology)
+###################################################################
+
+ENSEMBLE_FILE_EXTENSION = ".npy"
+
+def _simulate_profile(profile_parameters, random_seed):
+    return profiles_simulation.simulate_profile_1D(random_seed=random_seed, **profile_parameters)
+
+#
+# profile_parameters: arguments of simulate_profile_1D (seed excluded). With n_pools > 1 the realizations
+# are generated by a pool of processes. Returns positions (N,) and heights (number_of_profiles, N)
+#
+def simulate_profile_ensemble(number_of_profiles, random_seed, n_pools=0, **profile_parameters):
+    number_of_profiles = int(number_of_profiles)
+
+    if number_of_profiles <= 0: raise ValueError("Number of profiles must be > 0")
+
+    seeds = [int(random_seed) + index for index in range(number_of_profiles)]
+
+    if n_pools > 1 and number_of_profiles > 1:
+        worker_pool = WiseWorkerPool(min(n_pools, number_of_profiles))
+
+        try:
+            profiles = worker_pool.map(_simulate_profile, [(profile_parameters, seed) for seed in seeds])
+        finally:
+            worker_pool.shutdown()
+    else:
+        profiles = [_simulate_profile(profile_parameters, seed) for seed in seeds]
+
+    positions = profiles[0][0]
+
+    heights = numpy.empty((number_of_profiles, len(positions)))
+    for index, profile in enumerate(profiles): heights[index] = profile[1]
+
+    return positions, heights
+
+# slopes of every profile (the last point repeats the previous slope)
+def get_slopes(positions, heights):
+    heights = numpy.atleast_2d(heights)
+
+    slopes = numpy.empty(heights.shape)
+    slopes[:, :-1] = numpy.arctan(numpy.diff(heights, axis=1)/numpy.diff(positions))
+    slopes[:, -1] = slopes[:, -2]
+
+    return slopes
+
+def get_ensemble_statistics(positions, heights):
+    heights = numpy.atleast_2d(heights)
+
+    return OrderedDict([("height_rms", heights.std(axis=1)),
+                        ("slope_rms", get_slopes(positions, heights).std(axis=1))])
+
+def get_ensemble_file_name(file_name):
+    return os.path.splitext(file_name)[0] + ENSEMBLE_FILE_EXTENSION
+
+def save_profile_ensemble(file_name, heights):
+    file_name = get_ensemble_file_name(file_name)
+
+    numpy.save(file_name, numpy.atleast_2d(heights))
+
+    return file_name
@@ -0,0 +1,102 @@
+import os, json
+import numpy
+
+from orangecontrib.wise.util.wise_metrics import METRICS, WiseFocalMetrics
+from orangecontrib.wise.util.wise_sweep import WiseSweepResult
+
+###################################################################
+# EXPORT OF A DEFOCUS SWEEP
+#
+# one archive with the whole sweep:
+# - .h5/.hdf5 (h5py required): datasets + run parameters as attributes of the root group
+# - .npz: arrays + run parameters as a JSON string ("parameters")
+# datasets: defocus_list, positions, electric_fields, hews, computed, metrics/<name>
+###################################################################
+
+HDF5_EXTENSIONS = (".h5", ".hdf5")
+
+# planes written to HDF5 at once: memory mapped sweeps are never loaded entirely
+PLANES_PER_WRITE = 16
+
+DATASETS = ("defocus_list", "positions", "electric_fields", "hews", "computed")
+
+def _get_arrays(sweep_result):
+    return [(name, getattr(sweep_result, name)) for name in DATASETS] + \
+           [("metrics/" + name, getattr(sweep_result.metrics, name)) for name in METRICS]
+
+def _to_attribute(value):
+    if isinstance(value, (numpy.number, numpy.bool_)): return value.item()
+    elif value is None or isinstance(value, (bool, int, float, str)): return value
+    else: return str(value)
+
+def save_sweep_result(file_name, sweep_result, parameters=None):
+    if sweep_result.positions is None: raise ValueError("Defocus sweep without planes: nothing to save")
+
+    directory = os.path.dirname(os.path.abspath(file_name))
+    if not os.path.exists(directory): os.makedirs(directory)
+
+    if parameters is None: parameters = {}
+
+    if file_name.lower().endswith(HDF5_EXTENSIONS):
+        import h5py
+
+        with h5py.File(file_name, "w") as h5_file:
+            # HDF5 attributes can't be None: missing parameters are None
+            for name, value in parameters.items():
+                if not value is None: h5_file.attrs[name] = _to_attribute(value)
+
+            for name, array in _get_arrays(sweep_result):
+                if array.ndim == 2:
+                    dataset = h5_file.create_dataset(name, shape=array.shape, dtype=array.dtype, chunks=(1, array.shape[1]))
+
+                    for start in range(0, array.shape[0], PLANES_PER_WRITE):
+                        dataset[start:start + PLANES_PER_WRITE] = array[start:start + PLANES_PER_WRITE]
+                else:
+                    h5_file.create_dataset(name, data=array)
+    elif file_name.lower().endswith(".npz"):
+        numpy.savez(file_name,
+                    parameters=json.dumps({name: _to_attribute(value) for name, value in parameters.items()}),
+                    **dict(_get_arrays(sweep_result)))
+    else:
+        raise ValueError("File format not recognized (.h5, .hdf5 or .npz): " + str(file_name))
+
+# returns the sweep and the run parameters (None parameters are missing from HDF5 files)
+def load_sweep_result(file_name):
+    if file_name.lower().endswith(HDF5_EXTENSIONS):
+        import h5py
+
+        with h5py.File(file_name, "r") as h5_file:
+            arrays = {name: numpy.array(h5_file[name]) for name in list(DATASETS) + ["metrics/" + name for name in METRICS] if name in h5_file}
+            parameters = {name: (value.item() if isinstance(value, numpy.generic) else value) for name, value in h5_file.attrs.items()}
+    else:
+        with numpy.load(file_name, allow_pickle=False) as npz_file:
+            arrays = {name: npz_file[name] for name in npz_file.files if name != "parameters"}
+            parameters = json.loads(str(npz_file["parameters"])) if "parameters" in npz_file.files else {}
+
+    if all(["metrics/" + name in arrays for name in METRICS]):
+        metrics = WiseFocalMetrics(**{name: arrays["metrics/" + name] for name in METRICS})
+    else:
+        metrics = None
+
+    sweep_result = WiseSweepResult(arrays["defocus_list"])
+    sweep_result.set_planes(slice(None), arrays["positions"], arrays["electric_fields"], arrays["hews"], metrics)
+    if "computed" in arrays: sweep_result.computed = numpy.array(arrays["computed"], dtype=bool)
+
+    return sweep_result, parameters
+
+#
+# one text file per plane (best_focus_partial_result_<index>.dat): header with defocus and HEW, columns position and intensity
+#
+def save_sweep_result_as_text(directory, sweep_result):
+    if not os.path.exists(directory): os.makedirs(directory)
+
+    for index in range(len(sweep_result)):
+        defocus, positions, electric_fields, hew = sweep_result.get_plane(index)
+
+        numpy.savetxt(os.path.join(directory, "best_focus_partial_result_" + str(index) + ".dat"),
+                      numpy.column_stack((positions, electric_fields.real**2 + electric_fields.imag**2)),
+                      fmt="%.17g",
+                      header="Defocus Sweep: " + str(defocus) + " [m]\n" +
+                             "HEW          : " + str(hew) + " [m]\n" +
+                             "Position [m]  Intensity",
+                      comments="# ")
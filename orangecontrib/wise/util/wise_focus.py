@@ -0,0 +1,111 @@
+import numpy
+
+from orangecontrib.wise.util.wise_sweep import get_best_focus_index
+
+GOLDEN_RATIO = (numpy.sqrt(5) - 1)/2
+
+class WiseBestFocusSearchResult(object):
+    def __init__(self,
+                 defocus,
+                 hew,
+                 defocus_list,
+                 hew_list,
+                 number_of_propagations,
+                 number_of_calls,
+                 converged=True,
+                 interrupted=False):
+        self.defocus = defocus
+        self.hew = hew
+        self.defocus_list = defocus_list
+        self.hew_list = hew_list
+        self.number_of_propagations = number_of_propagations
+        self.number_of_calls = number_of_calls
+        self.converged = converged
+        self.interrupted = interrupted
+
+def estimate_number_of_propagations(defocus_start, defocus_stop, tolerance, coarse_points=11):
+    coarse_points = max(3, int(coarse_points))
+    bracket = 2*(defocus_stop - defocus_start)/(coarse_points - 1)
+
+    return coarse_points + 2 + max(0, int(numpy.ceil(numpy.log(tolerance/bracket)/numpy.log(GOLDEN_RATIO))))
+
+#
+# hew_calculator receives an array of defocus values and returns an array of HEWs:
+# the coarse grid is computed in one call, then the minimum is bracketed by its neighbours
+# and refined by golden section down to tolerance
+#
+def golden_section_best_focus(hew_calculator,
+                              defocus_start,
+                              defocus_stop,
+                              tolerance,
+                              coarse_points=11,
+                              max_iterations=100,
+                              keep_running=None):
+    if defocus_start >= defocus_stop: raise ValueError("Defocus start must be < Defocus stop")
+    if tolerance <= 0: raise ValueError("Tolerance must be > 0")
+
+    evaluated = {}
+    calls = [0]
+
+    def evaluate(defocus_values):
+        defocus_values = numpy.array(defocus_values, dtype=float)
+        hews = numpy.atleast_1d(hew_calculator(defocus_values))
+        calls[0] += 1
+
+        for defocus, hew in zip(defocus_values, hews):
+            evaluated[float(defocus)] = float(hew)
+
+        return hews
+
+    def is_interrupted():
+        return not keep_running is None and not keep_running()
+
+    def build_result(converged, interrupted=False):
+        defocus_list = numpy.array(sorted(evaluated.keys()))
+        hew_list = numpy.array([evaluated[defocus] for defocus in defocus_list])
+
+        index_min = get_best_focus_index(hew_list)
+
+        return WiseBestFocusSearchResult(defocus_list[index_min],
+                                         hew_list[index_min],
+                                         defocus_list,
+                                         hew_list,
+                                         len(evaluated),
+                                         calls[0],
+                                         converged,
+                                         interrupted)
+
+    coarse_points = max(3, int(coarse_points))
+    coarse_defocus = numpy.linspace(defocus_start, defocus_stop, coarse_points)
+    coarse_defocus[numpy.abs(coarse_defocus) < 1e-15] = 0.0
+
+    coarse_hews = evaluate(coarse_defocus)
+
+    index_min = int(numpy.argmin(coarse_hews))
+
+    a = coarse_defocus[max(0, index_min - 1)]
+    b = coarse_defocus[min(coarse_points - 1, index_min + 1)]
+
+    if is_interrupted(): return build_result(False, True)
+
+    c = b - GOLDEN_RATIO*(b - a)
+    d = a + GOLDEN_RATIO*(b - a)
+
+    hew_c, hew_d = evaluate([c, d])
+
+    iterations = 0
+    while (b - a) > tolerance and iterations < max_iterations:
+        if is_interrupted(): return build_result(False, True)
+
+        if hew_c <= hew_d:
+            b, d, hew_d = d, c, hew_c
+            c = b - GOLDEN_RATIO*(b - a)
+            hew_c = evaluate([c])[0]
+        else:
+            a, c, hew_c = c, d, hew_d
+            d = a + GOLDEN_RATIO*(b - a)
+            hew_d = evaluate([d])[0]
+
+        iterations += 1
+
+    return build_result((b - a) <= tolerance)
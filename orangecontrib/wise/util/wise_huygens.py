@@ -0,0 +1,132 @@
+import numpy
+
+from orangecontrib.wise.util.wise_metrics import get_intensities, get_focal_metrics
+
+DEFAULT_MAX_MEMORY = 2*1024**2 # bytes: blocks sized for the L2 cache
+
+# bytes per (detector point, mirror point) pair: distances and phases (float64) + kernel (complex128)
+_BYTES_PER_PAIR = 8 + 8 + 16
+# single precision: distances and phases (float64) + reduced phases (float32) + kernel (complex64)
+_BYTES_PER_PAIR_SINGLE_PRECISION = 8 + 8 + 4 + 8
+
+def get_block_size(number_of_mirror_points, max_memory=DEFAULT_MAX_MEMORY, single_precision=False):
+    bytes_per_pair = _BYTES_PER_PAIR_SINGLE_PRECISION if single_precision else _BYTES_PER_PAIR
+
+    return int(max(1, max_memory // (bytes_per_pair*max(1, number_of_mirror_points))))
+
+#
+# E(det_i) = sum_j E(mir_j) * exp(-i k r_ij) / r_ij
+#
+# same integral of Rayman.HuygensIntegral_1d_MultiPool, evaluated as blocks of
+# (detector x mirror) outer products, so that the sum becomes a BLAS matrix-vector product.
+# Blocks fit in the L2 cache, and k*r (~ 1e9 rad) is reduced modulo 2 pi before cos/sin, whose
+# large-argument path is ~4x slower (the reduction error, < 1e-7 rad, is below the precision of k*r itself).
+# python -m benchmarks.bench_propagation --standin --modes DETECTOR_ONLY --number-of-points 3000:
+# 0.76 s against 1.21 s of Rayman. Rayman remains the default algorithm.
+#
+# single_precision: kernel and sum in complex64 (half the memory traffic). Distances and k*r stay in double
+# precision (k*r ~ 1e9 rad): the phase is reduced modulo 2 pi before the conversion to float32
+#
+def huygens_integral_1d(wavelength, mir_E, mir_x, mir_y, det_x, det_y, max_memory=DEFAULT_MAX_MEMORY, single_precision=False):
+    mir_E = numpy.asarray(mir_E, dtype=complex)
+    mir_x = numpy.asarray(mir_x, dtype=float)
+    mir_y = numpy.asarray(mir_y, dtype=float)
+    det_x = numpy.asarray(det_x, dtype=float)
+    det_y = numpy.asarray(det_y, dtype=float)
+
+    k = 2*numpy.pi/wavelength
+
+    number_of_detector_points = len(det_x)
+    block_size = get_block_size(len(mir_x), max_memory, single_precision)
+
+    if single_precision:
+        kernel_function = _huygens_kernel_single_precision
+        mir_E = mir_E.astype(numpy.complex64)
+    else:
+        kernel_function = _huygens_kernel
+
+    electric_fields = numpy.empty(number_of_detector_points, dtype=complex)
+
+    for start in range(0, number_of_detector_points, block_size):
+        end = min(start + block_size, number_of_detector_points)
+
+        electric_fields[start:end] = kernel_function(k, mir_E, mir_x, mir_y, det_x[start:end], det_y[start:end])
+
+    return electric_fields
+
+def _get_distances(mir_x, mir_y, det_x, det_y):
+    r = numpy.subtract.outer(det_x, mir_x)
+    r *= r
+    dy = numpy.subtract.outer(det_y, mir_y)
+    dy *= dy
+    r += dy
+    del dy
+    numpy.sqrt(r, out=r)
+
+    return r
+
+def _huygens_kernel(k, mir_E, mir_x, mir_y, det_x, det_y):
+    r = _get_distances(mir_x, mir_y, det_x, det_y)
+
+    phase = k*r
+    numpy.remainder(phase, 2*numpy.pi, out=phase)
+
+    kernel = numpy.empty(r.shape, dtype=complex)
+    numpy.cos(phase, out=kernel.real)
+    numpy.sin(phase, out=kernel.imag)
+    numpy.negative(kernel.imag, out=kernel.imag)
+    del phase
+
+    numpy.reciprocal(r, out=r)
+    kernel *= r
+
+    return kernel.dot(mir_E)
+
+def _huygens_kernel_single_precision(k, mir_E, mir_x, mir_y, det_x, det_y):
+    r = _get_distances(mir_x, mir_y, det_x, det_y)
+
+    phase = k*r
+    numpy.remainder(phase, 2*numpy.pi, out=phase)
+    phase = phase.astype(numpy.float32)
+
+    kernel = numpy.empty(r.shape, dtype=numpy.complex64)
+    numpy.cos(phase, out=kernel.real)
+    numpy.sin(phase, out=kernel.imag)
+    numpy.negative(kernel.imag, out=kernel.imag)
+    del phase
+
+    numpy.reciprocal(r, out=r)
+    kernel *= r.astype(numpy.float32)
+
+    return kernel.dot(mir_E)
+
+###################################################################
+# PRECISION CHECK: a subsample of the detector points of every plane is integrated again in double precision,
+# HEW and integrated intensity of the subsampled profiles are compared plane by plane
+###################################################################
+
+VALIDATION_POINTS = 256
+
+# largest relative differences of HEW and integrated intensity among the planes (nan if any is nan).
+# number_of_planes: batched defocus sweeps, with the (number_of_planes x N) detector arrays flattened
+def get_precision_errors(wavelength, mir_E, mir_x, mir_y, det_x, det_y, electric_fields, max_memory=DEFAULT_MAX_MEMORY, number_of_planes=1):
+    det_x = numpy.reshape(det_x, (number_of_planes, -1))
+    det_y = numpy.reshape(det_y, (number_of_planes, -1))
+    electric_fields = numpy.reshape(electric_fields, (number_of_planes, -1))
+
+    indexes = numpy.arange(0, det_x.shape[1], max(1, det_x.shape[1]//VALIDATION_POINTS))
+
+    reference = huygens_integral_1d(wavelength, mir_E, mir_x, mir_y, det_x[:, indexes].flatten(), det_y[:, indexes].flatten(), max_memory)
+
+    # HEW in units of detector points: the same for all the profiles
+    metrics = get_focal_metrics(numpy.arange(len(indexes), dtype=float),
+                                get_intensities(numpy.concatenate((electric_fields[:, indexes], reference.reshape(number_of_planes, len(indexes))))))
+
+    hews, references_hews = metrics.HEW[:number_of_planes], metrics.HEW[number_of_planes:]
+    intensities, references_intensities = metrics.integrated_intensity[:number_of_planes], metrics.integrated_intensity[number_of_planes:]
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        hew_error = numpy.max(numpy.abs(hews - references_hews)/references_hews)
+        intensity_error = numpy.max(numpy.abs(intensities - references_intensities)/references_intensities)
+
+    return float(hew_error), float(intensity_error)
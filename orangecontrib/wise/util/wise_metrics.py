@@ -0,0 +1,181 @@
+import numpy
+from collections import OrderedDict
+
+###################################################################
+# FOCAL METRICS of a stack of intensity profiles (n_planes, N), all computed at once.
+# positions can be shared by all the planes (N,) or given per plane (n_planes, N),
+# with any spacing: every integral uses the trapezoidal rule on the actual positions
+###################################################################
+
+METRICS = ("HEW", "FWHM", "RMS_width", "centroid", "peak_intensity", "integrated_intensity", "strehl_ratio")
+
+def get_intensities(electric_fields):
+    electric_fields = numpy.asarray(electric_fields)
+
+    return electric_fields.real**2 + electric_fields.imag**2
+
+def _as_stack(positions, intensities):
+    intensities = numpy.atleast_2d(numpy.asarray(intensities, dtype=float))
+    positions = numpy.asarray(positions, dtype=float)
+
+    if positions.ndim == 2 and positions.shape[0] == 1 and intensities.shape[0] > 1: positions = positions[0]
+
+    return positions, intensities
+
+def _get_row_values(values, indexes):
+    if values.ndim == 1: return values[indexes]
+    else: return numpy.take_along_axis(values, indexes[:, numpy.newaxis], axis=1)[:, 0]
+
+def _get_crossings(positions, values, level, indexes):
+    # linear interpolation of the crossing of level between indexes-1 and indexes
+    previous = numpy.maximum(indexes - 1, 0)
+
+    s0, s1 = _get_row_values(positions, previous), _get_row_values(positions, indexes)
+    v0, v1 = _get_row_values(values, previous), _get_row_values(values, indexes)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        fraction = numpy.where(v1 != v0, (level - v0)/(v1 - v0), 0.0)
+
+    return s0 + numpy.clip(fraction, 0.0, 1.0)*(s1 - s0)
+
+# cumulative integral of every profile, 0 at the first point
+def get_cumulative_energies(positions, intensities):
+    positions, intensities = _as_stack(positions, intensities)
+
+    cumulative_energies = numpy.zeros(intensities.shape)
+    numpy.cumsum((intensities[:, 1:] + intensities[:, :-1])*numpy.diff(positions, axis=-1)/2, axis=1, out=cumulative_energies[:, 1:])
+
+    return cumulative_energies
+
+def get_integrated_intensities(positions, intensities):
+    return get_cumulative_energies(positions, intensities)[:, -1]
+
+def get_peak_intensities(positions, intensities):
+    return numpy.max(_as_stack(positions, intensities)[1], axis=1)
+
+def get_centroids(positions, intensities):
+    positions, intensities = _as_stack(positions, intensities)
+
+    return get_integrated_intensities(positions, intensities*positions)/get_integrated_intensities(positions, intensities)
+
+def get_rms_widths(positions, intensities, centroids=None):
+    positions, intensities = _as_stack(positions, intensities)
+
+    if centroids is None: centroids = get_centroids(positions, intensities)
+
+    variances = get_integrated_intensities(positions, intensities*(positions - centroids[:, numpy.newaxis])**2)/get_integrated_intensities(positions, intensities)
+
+    return numpy.sqrt(numpy.maximum(variances, 0.0))
+
+def get_fwhms(positions, intensities):
+    positions, intensities = _as_stack(positions, intensities)
+
+    half_maximum = numpy.max(intensities, axis=1)/2
+    above = intensities >= half_maximum[:, numpy.newaxis]
+
+    first = numpy.argmax(above, axis=1)
+    last = intensities.shape[1] - 1 - numpy.argmax(above[:, ::-1], axis=1)
+
+    left = _get_crossings(positions, intensities, half_maximum, first)
+    # right side: the crossing is searched from last+1 backwards
+    after_last = numpy.minimum(last + 1, intensities.shape[1] - 1)
+    right = _get_crossings(positions, intensities, half_maximum, after_last)
+    right = numpy.where(after_last == last, _get_row_values(positions, last), right)
+
+    return right - left
+
+#
+# estimate of the width containing the central 50% of the energy (quartiles of the cumulative energy, every sample
+# weighted by the step to the next one). It is NOT Rayman.HalfEnergyWidth_1d: the HEW of the propagations is calculated
+# by Rayman and passed to get_focal_metrics, this estimate is used only where no Rayman HEW is available
+#
+def get_hews(positions, intensities):
+    positions, intensities = _as_stack(positions, intensities)
+
+    steps = numpy.diff(positions, axis=-1)
+    steps = numpy.concatenate((steps, steps[..., -1:]), axis=-1)
+
+    cumulative_energies = numpy.cumsum(intensities*steps, axis=1)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        cumulative_energies /= cumulative_energies[:, -1:]
+
+    quartiles = []
+    for level in (0.25, 0.75):
+        indexes = numpy.minimum(numpy.sum(cumulative_energies < level, axis=1), intensities.shape[1] - 1)
+        quartiles.append(_get_crossings(positions, cumulative_energies, level, indexes))
+
+    return quartiles[1] - quartiles[0]
+
+#
+# Strehl-like ratio: peak intensity per unit of energy, relative to a reference peak-to-energy ratio.
+# For a focus of angular aperture delta_theta the diffraction limited reference is delta_theta/wavelength
+# (uniform illumination: sinc^2 profile), see get_diffraction_limited_references. Without references,
+# the planes are compared to the sharpest one of the stack
+#
+def get_strehl_ratios(positions, intensities, references=None):
+    positions, intensities = _as_stack(positions, intensities)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        peak_to_energy = get_peak_intensities(positions, intensities)/get_integrated_intensities(positions, intensities)
+
+        if references is None: references = numpy.nanmax(peak_to_energy) if numpy.any(numpy.isfinite(peak_to_energy)) else numpy.nan
+
+        return peak_to_energy/references
+
+# aperture of the mirror seen from the centre of every detector plane
+def get_diffraction_limited_references(wavelength, mir_x, mir_y, det_x, det_y):
+    det_x, det_y = numpy.atleast_2d(det_x), numpy.atleast_2d(det_y)
+
+    centre = det_x.shape[1]//2
+    centre_x, centre_y = det_x[:, centre], det_y[:, centre]
+
+    delta_theta = numpy.arctan2(mir_y[-1] - centre_y, mir_x[-1] - centre_x) - numpy.arctan2(mir_y[0] - centre_y, mir_x[0] - centre_x)
+    delta_theta = numpy.abs((delta_theta + numpy.pi) % (2*numpy.pi) - numpy.pi)
+
+    return delta_theta/wavelength
+
+class WiseFocalMetrics(object):
+    def __init__(self, **metrics):
+        for name in METRICS: setattr(self, name, metrics.get(name, None))
+
+    def __len__(self):
+        return numpy.size(self.HEW)
+
+    # a plane (scalar metrics) or a sub-stack
+    def __getitem__(self, indexes):
+        return WiseFocalMetrics(**{name: getattr(self, name)[indexes] for name in METRICS})
+
+    # profiles with no energy or not finite (e.g. inconsistent source parameters)
+    def get_invalid_indexes(self):
+        return numpy.where(~(numpy.isfinite(numpy.atleast_1d(self.integrated_intensity)) & (numpy.atleast_1d(self.integrated_intensity) > 0)))[0]
+
+    def to_dict(self):
+        return OrderedDict([(name, getattr(self, name)) for name in METRICS])
+
+    def __str__(self):
+        return ", ".join([name + ": " + str(getattr(self, name)) for name in METRICS])
+
+# metrics of single planes (e.g. evaluated by different propagations) in one stack
+def stack_focal_metrics(metrics_list):
+    return WiseFocalMetrics(**{name: numpy.array([getattr(metrics, name) for metrics in metrics_list], dtype=float) for name in METRICS})
+
+# hews: HEW of every plane when already known (e.g. from Rayman.HalfEnergyWidth_1d), estimated otherwise
+def get_focal_metrics(positions, intensities, references=None, hews=None):
+    positions, intensities = _as_stack(positions, intensities)
+
+    if hews is None: hews = get_hews(positions, intensities)
+    else: hews = numpy.array(numpy.atleast_1d(hews), dtype=float)
+
+    integrated_intensities = get_integrated_intensities(positions, intensities)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        centroids = get_integrated_intensities(positions, intensities*positions)/integrated_intensities
+
+        return WiseFocalMetrics(HEW=hews,
+                                FWHM=get_fwhms(positions, intensities),
+                                RMS_width=get_rms_widths(positions, intensities, centroids),
+                                centroid=centroids,
+                                peak_intensity=get_peak_intensities(positions, intensities),
+                                integrated_intensity=integrated_intensities,
+                                strehl_ratio=get_strehl_ratios(positions, intensities, references))
@@ -0,0 +1,212 @@
+import os, copy, tempfile
+import numpy
+
+from orangecontrib.wise.util.wise_cache import WiseLRUCache, get_hash
+
+###################################################################
+# METROLOGY INPUTS: figure error profiles and roughness PSDs
+#
+# - .npy files are memory mapped
+# - .h5/.hdf5 files (h5py required): the first numeric dataset, memory mapped when stored
+#   contiguous and uncompressed, read otherwise
+# - text files are parsed once: the arrays are cached, keyed by path, modification time, size and scaling factors
+# - ensembles of figure errors (see wise_ensemble): 2D arrays, one profile per row
+###################################################################
+
+HDF5_EXTENSIONS = (".h5", ".hdf5")
+BINARY_EXTENSIONS = (".npy",) + HDF5_EXTENSIONS
+
+METROLOGY_FILE_EXTENSION_FILTER = "Data Files (*.dat *.txt *.npy *.h5 *.hdf5)"
+
+_metrology_cache = WiseLRUCache(max_size=1024**3, name="Metrology cache")
+
+# states of Roughness objects after NumericPsdLoadXY
+_roughness_cache = WiseLRUCache(max_size=128*1024**2, name="Roughness PSD cache")
+
+def get_metrology_cache():
+    return _metrology_cache
+
+def is_binary_metrology_file(file_name):
+    return file_name.lower().endswith(BINARY_EXTENSIONS)
+
+def get_file_key(file_name):
+    file_name = os.path.abspath(file_name)
+    file_stat = os.stat(file_name)
+
+    return file_name, file_stat.st_mtime_ns, file_stat.st_size
+
+def _find_hdf5_dataset(h5_group):
+    datasets = []
+
+    def visit(name, item):
+        if len(datasets) == 0 and hasattr(item, "dtype") and item.dtype.kind in "fiu": datasets.append(name)
+
+    h5_group.visititems(visit)
+
+    if len(datasets) == 0: raise ValueError("No numeric dataset in " + str(h5_group.file.filename))
+
+    return datasets[0]
+
+def _load_hdf5(file_name):
+    import h5py
+
+    with h5py.File(file_name, "r") as h5_file:
+        dataset = h5_file[_find_hdf5_dataset(h5_file)]
+
+        offset = dataset.id.get_offset()
+
+        if offset is None or dataset.dtype.byteorder not in ("=", "|", "<" if numpy.little_endian else ">"):
+            return numpy.array(dataset)
+        else:
+            shape, dtype = dataset.shape, dataset.dtype
+
+    return numpy.memmap(file_name, mode="r", dtype=dtype, offset=offset, shape=shape)
+
+# raw content of the file: binary files are mapped, text files are parsed (and cached)
+def load_metrology_file(file_name):
+    if file_name.lower().endswith(".npy"):
+        return numpy.load(file_name, mmap_mode="r")
+    elif file_name.lower().endswith(HDF5_EXTENSIONS):
+        return _load_hdf5(file_name)
+    else:
+        key = ("text",) + get_file_key(file_name)
+
+        data = _metrology_cache.get(key)
+
+        if data is None:
+            data = numpy.loadtxt(file_name)
+            data.flags.writeable = False
+
+            _metrology_cache.put(key, data)
+
+        return data
+
+def get_number_of_profiles(file_name):
+    figure_errors = load_metrology_file(file_name)
+
+    return 1 if figure_errors.ndim == 1 else figure_errors.shape[0]
+
+#
+# height profile [m]: with scaling 1 mapped files are not copied. For ensembles, the profile in row index (default 0)
+#
+def load_figure_error(file_name, scaling=1.0, index=None):
+    scaling = float(scaling)
+
+    figure_error = load_metrology_file(file_name)
+
+    if figure_error.ndim == 2: figure_error = figure_error[0 if index is None else int(index)]
+
+    if scaling == 1.0: return figure_error
+
+    key = get_figure_error_key(file_name, scaling, index)
+
+    scaled_figure_error = _metrology_cache.get(key)
+
+    if scaled_figure_error is None:
+        scaled_figure_error = numpy.multiply(figure_error, scaling, dtype=float)
+        scaled_figure_error.flags.writeable = False
+
+        _metrology_cache.put(key, scaled_figure_error)
+
+    return scaled_figure_error
+
+#
+# Roughness.NumericPsdLoadXY parses the file: the state of the Roughness object after loading is cached and
+# copied into the Roughness of the next mirrors with the same file and scaling. Binary files are converted once
+# to a temporary text file for the parser
+#
+def load_roughness(roughness, file_name, x_scaling=1.0, y_scaling=1.0, x_is_spatial_frequency=False):
+    key = ("roughness", float(x_scaling), float(y_scaling), bool(x_is_spatial_frequency)) + get_file_key(file_name)
+
+    state = _roughness_cache.get(key)
+
+    if state is None:
+        if is_binary_metrology_file(file_name):
+            text_file = tempfile.NamedTemporaryFile(mode="w", suffix=".dat", delete=False)
+            text_file.close()
+
+            try:
+                numpy.savetxt(text_file.name, load_metrology_file(file_name))
+
+                roughness.NumericPsdLoadXY(text_file.name, xScaling=x_scaling, yScaling=y_scaling, xIsSpatialFreq=x_is_spatial_frequency)
+            finally:
+                os.remove(text_file.name)
+        else:
+            roughness.NumericPsdLoadXY(file_name, xScaling=x_scaling, yScaling=y_scaling, xIsSpatialFreq=x_is_spatial_frequency)
+
+        state = copy.deepcopy(vars(roughness))
+
+        _roughness_cache.put(key, state)
+    else:
+        vars(roughness).update(copy.deepcopy(state))
+
+###################################################################
+# RESAMPLING OF THE FIGURE ERROR TO THE PROPAGATION SAMPLING
+###################################################################
+
+# samples of the resampled profile per propagation sample: the interpolation on the mirror points stays accurate
+FIGURE_ERROR_OVERSAMPLING = 2
+
+# resampled points evaluated at once
+RESAMPLING_BLOCK_SIZE = 256
+
+_resampled_figure_error_cache = WiseLRUCache(max_size=256*1024**2, name="Resampled figure error cache")
+
+def get_figure_error_key(file_name, scaling=1.0, index=None):
+    return ("figure_error", float(scaling), None if index is None else int(index)) + get_file_key(file_name)
+
+#
+# the spatial frequencies above the Nyquist frequency of the propagation (1/(2*propagation_step)) can't be
+# represented on the mirror points: they are removed (FFT low pass, after subtracting the line through the
+# end points to avoid the jump of the periodic extension) and the band limited Fourier series is evaluated on
+# at least FIGURE_ERROR_OVERSAMPLING samples per propagation step, spanning exactly the measured length
+# from the measured first to the measured last height.
+# Profiles already coarser are returned as they are.
+# Returns heights and step; results are cached by key (see get_figure_error_key, a hash of the profile if None)
+#
+def resample_figure_error(figure_error, figure_error_step, propagation_step, key=None):
+    number_of_samples = len(figure_error)
+    step = propagation_step/FIGURE_ERROR_OVERSAMPLING
+
+    if figure_error_step <= 0 or propagation_step <= 0 or number_of_samples < 3 or figure_error_step >= step:
+        return figure_error, figure_error_step
+
+    if key is None: key = get_hash(figure_error)
+
+    cache_key = (key, float(figure_error_step), float(propagation_step), FIGURE_ERROR_OVERSAMPLING)
+
+    resampled = _resampled_figure_error_cache.get(cache_key)
+
+    if resampled is None:
+        heights = numpy.asarray(figure_error, dtype=float)
+        length = (number_of_samples - 1)*figure_error_step
+
+        trend = heights[0] + (heights[-1] - heights[0])*numpy.arange(number_of_samples)/(number_of_samples - 1)
+
+        number_of_points = int(numpy.ceil(length/step)) + 1
+        output_step = length/(number_of_points - 1)
+        positions = numpy.arange(number_of_points)*output_step
+
+        # Fourier series of the periodic domain number_of_samples*figure_error_step, up to the cut-off
+        frequencies = numpy.fft.rfftfreq(number_of_samples, figure_error_step)
+        spectrum = numpy.fft.rfft(heights - trend)[frequencies <= 1/(2*propagation_step)]/number_of_samples
+        spectrum[1:] *= 2
+        frequencies = frequencies[:len(spectrum)]
+
+        low_pass = numpy.empty(number_of_points)
+
+        for start in range(0, number_of_points, RESAMPLING_BLOCK_SIZE):
+            end = min(start + RESAMPLING_BLOCK_SIZE, number_of_points)
+            low_pass[start:end] = numpy.exp(2j*numpy.pi*numpy.outer(positions[start:end], frequencies)).dot(spectrum).real
+
+        # the end points keep the measured heights
+        heights = heights[0] + (heights[-1] - heights[0])*positions/length + \
+                  low_pass - (low_pass[0] + (low_pass[-1] - low_pass[0])*positions/length)
+
+        heights.flags.writeable = False
+
+        resampled = (heights, output_step)
+
+        _resampled_figure_error_cache.put(cache_key, resampled)
+
+    return resampled
@@ -0,0 +1,233 @@
+import os, sys, time, copy, json
+import numpy
+from collections import OrderedDict
+from statistics import NormalDist
+
+from orangecontrib.wise.util.wise_pool import WiseWorkerPool
+from orangecontrib.wise.util.wise_pipeline import create_beamline, get_mirror_sampling, propagate_to_mirror, propagate_to_detector, \
+    load_beamline_description, _get_calculation_type
+from orangecontrib.wise.util.wise_propagator import WisePropagationAlgorithms
+from orangecontrib.wise.util.wise_metrology import get_number_of_profiles
+from orangecontrib.wise.util.wise_metrics import METRICS, get_intensities
+from orangecontrib.wise.util.wise_trace import start_tracing, stop_tracing
+
+###################################################################
+# MONTE CARLO ENSEMBLE PROPAGATION: every figure error profile of an ensemble file (one profile per row,
+# see wise_ensemble) is propagated source -> mirror -> detector, the statistics are updated as soon as
+# each profile is completed. Beamline description as in wise_pipeline, plus:
+#
+# ensemble:
+#   number_of_profiles: (optional, default: all the profiles of mirror/figure_error_file)
+#   target_HEW_interval: 1.0e-8 [m] (optional): stop when the confidence interval of the mean HEW is narrower
+#   confidence: 0.95, min_profiles: 10
+###################################################################
+
+#
+# streaming statistics: mean and variance of the metrics (Welford), all the HEWs (percentiles) and the
+# mean intensity profile on the detector positions of the first profile completed
+#
+class WiseEnsembleStatistics(object):
+    def __init__(self, confidence=0.95):
+        if not 0 < confidence < 1: raise ValueError("Confidence must be in (0, 1)")
+
+        self.confidence = confidence
+
+        self.number_of_profiles = 0
+        self.profile_indexes = []
+        self.hews = []
+        self.means = OrderedDict([(name, 0.0) for name in METRICS])
+        self._squared_deviations = OrderedDict([(name, 0.0) for name in METRICS])
+
+        self.positions = None
+        self._intensities_sum = None
+
+    def add(self, profile_index, metrics, positions, intensities):
+        self.number_of_profiles += 1
+        self.profile_indexes.append(profile_index)
+        self.hews.append(metrics["HEW"])
+
+        for name in METRICS:
+            delta = metrics[name] - self.means[name]
+            self.means[name] += delta/self.number_of_profiles
+            self._squared_deviations[name] += delta*(metrics[name] - self.means[name])
+
+        if self.positions is None:
+            self.positions = numpy.array(positions)
+            self._intensities_sum = numpy.array(intensities, dtype=float)
+        elif len(positions) == len(self.positions) and numpy.allclose(positions, self.positions):
+            self._intensities_sum += intensities
+        else:
+            self._intensities_sum += numpy.interp(self.positions, positions, intensities, left=0.0, right=0.0)
+
+    def get_standard_deviation(self, name="HEW"):
+        if self.number_of_profiles < 2: return numpy.nan
+
+        return numpy.sqrt(self._squared_deviations[name]/(self.number_of_profiles - 1))
+
+    # width of the confidence interval of the mean (normal approximation)
+    def get_confidence_interval_width(self, name="HEW"):
+        if self.number_of_profiles < 2: return numpy.inf
+
+        return 2*NormalDist().inv_cdf(0.5 + self.confidence/2)*self.get_standard_deviation(name)/numpy.sqrt(self.number_of_profiles)
+
+    def get_hew_percentiles(self, percentiles=(5, 50, 95)):
+        if self.number_of_profiles == 0: return numpy.full(len(percentiles), numpy.nan)
+
+        return numpy.percentile(self.hews, percentiles)
+
+    def get_mean_intensities(self):
+        if self.number_of_profiles == 0: return None
+
+        return self._intensities_sum/self.number_of_profiles
+
+    def is_converged(self, target_hew_interval, min_profiles=10):
+        return self.number_of_profiles >= max(2, min_profiles) and self.get_confidence_interval_width("HEW") <= target_hew_interval
+
+    def get_summary(self):
+        summary = OrderedDict([("number_of_profiles", self.number_of_profiles),
+                               ("HEW_mean", float(self.means["HEW"])),
+                               ("HEW_std", float(self.get_standard_deviation("HEW"))),
+                               ("HEW_confidence_interval_width", float(self.get_confidence_interval_width("HEW"))),
+                               ("confidence", self.confidence)])
+
+        for percentile, value in zip((5, 50, 95), self.get_hew_percentiles((5, 50, 95))): summary["HEW_percentile_" + str(percentile)] = float(value)
+
+        summary["metrics_mean"] = OrderedDict([(name, float(value)) for name, value in self.means.items()])
+        summary["metrics_std"] = OrderedDict([(name, float(self.get_standard_deviation(name))) for name in METRICS])
+
+        return summary
+
+    def save(self, file_name):
+        numpy.savez(file_name,
+                    profile_indexes=numpy.array(self.profile_indexes, dtype=int),
+                    hews=numpy.array(self.hews),
+                    positions=self.positions,
+                    mean_intensities=self.get_mean_intensities(),
+                    summary=json.dumps(self.get_summary()))
+
+def _run_ensemble_task(description, profile_index):
+    try:
+        profile_description = copy.deepcopy(description)
+        profile_description["mirror"]["figure_error_index"] = profile_index
+
+        detector_description    = profile_description.get("detector", {})
+        calculation_description = profile_description.get("calculation", {})
+        algorithm               = calculation_description.get("algorithm", WisePropagationAlgorithms.HuygensIntegral)
+
+        source, elliptic_mirror = create_beamline(profile_description)
+
+        wise_output, _ = propagate_to_mirror(source, elliptic_mirror, algorithm=algorithm, **get_mirror_sampling(profile_description["mirror"]))
+
+        # worker processes can't open pools of their own: the detector integral runs single process
+        detector_output = propagate_to_detector(wise_output,
+                                                float(detector_description.get("detector_size", 50e-6)),
+                                                numpy.array([float(detector_description.get("defocus", 0.0))]),
+                                                calculation_type=_get_calculation_type(detector_description),
+                                                number_of_points=int(detector_description.get("number_of_points", 0)),
+                                                n_pools=0,
+                                                algorithm=algorithm,
+                                                detector_number_of_points=int(detector_description.get("detector_number_of_points", 0)))
+
+        return (profile_index,
+                {name: float(value) for name, value in detector_output.metrics[0].to_dict().items()},
+                numpy.array(detector_output.det_s[0]),
+                get_intensities(detector_output.electric_fields[0])), None
+    except Exception as exception:
+        return (profile_index, None, None, None), str(exception)
+
+#
+# progress_callback(statistics) is called after every profile; keep_running() False stops the run.
+# Profiles not completed when the target interval is reached are dropped
+#
+def run_ensemble(description, number_of_processes=None, progress_callback=None, keep_running=None):
+    if not "figure_error_file" in description["mirror"]: raise ValueError("Ensemble propagation needs mirror/figure_error_file")
+
+    ensemble_description = description.get("ensemble", {})
+
+    number_of_profiles = get_number_of_profiles(description["mirror"]["figure_error_file"])
+    if "number_of_profiles" in ensemble_description: number_of_profiles = min(number_of_profiles, int(ensemble_description["number_of_profiles"]))
+
+    target_hew_interval = ensemble_description.get("target_HEW_interval", None)
+    min_profiles        = int(ensemble_description.get("min_profiles", 10))
+
+    statistics = WiseEnsembleStatistics(float(ensemble_description.get("confidence", 0.95)))
+
+    if number_of_processes is None: number_of_processes = os.cpu_count() or 1
+
+    if number_of_processes <= 1 or number_of_profiles <= 1:
+        results = (_run_ensemble_task(description, profile_index) for profile_index in range(number_of_profiles))
+        worker_pool = None
+    else:
+        worker_pool = WiseWorkerPool(min(number_of_processes, number_of_profiles))
+        results = worker_pool.imap_unordered(_run_ensemble_task, [(description, profile_index) for profile_index in range(number_of_profiles)])
+
+    completed = False
+
+    try:
+        for (profile_index, metrics, positions, intensities), error in results:
+            if error is None:
+                statistics.add(profile_index, metrics, positions, intensities)
+            else:
+                print("Profile " + str(profile_index) + " failed: " + error, file=sys.stderr)
+
+            if not progress_callback is None: progress_callback(statistics)
+
+            if not target_hew_interval is None and statistics.is_converged(float(target_hew_interval), min_profiles): break
+            if not keep_running is None and not keep_running(): break
+        else:
+            completed = True
+    finally:
+        if not worker_pool is None:
+            results.close() # releases the pool
+            worker_pool.shutdown(wait=completed) # stopped early: the profiles still running are dropped
+
+            print(worker_pool.statistics)
+
+    return statistics
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Propagate an ensemble of figure error profiles without GUI. mirror/figure_error_file must contain one profile per row\n" +
+                                                 "(see the Height Profile Simulator), the beamline description can contain an 'ensemble' section:\n" +
+                                                 "ensemble: {number_of_profiles: 500, target_HEW_interval: 1.0e-8, confidence: 0.95, min_profiles: 10}",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("beamline", help="beamline description file (.yaml, .yml or .json)")
+    parser.add_argument("-o", "--output", default="ensemble.npz", help="HEWs, mean intensity profile and summary (default: ensemble.npz)")
+    parser.add_argument("-n", "--number-of-processes", type=int, default=None, help="parallel processes (default: number of CPUs)")
+    parser.add_argument("--trace", default=None, help="write a timeline of the run in Chrome trace format (.json)")
+
+    arguments = parser.parse_args(argv)
+
+    def print_progress(statistics):
+        print("Ensemble: " + str(statistics.number_of_profiles) + " profiles, HEW " + str(statistics.means["HEW"]) +
+              " +/- " + str(statistics.get_confidence_interval_width("HEW")/2) + " [m]")
+
+    if not arguments.trace is None: start_tracing(arguments.trace)
+
+    try:
+        t0 = time.perf_counter()
+
+        statistics = run_ensemble(load_beamline_description(arguments.beamline),
+                                  number_of_processes=arguments.number_of_processes,
+                                  progress_callback=print_progress)
+
+        if statistics.number_of_profiles == 0: raise ValueError("No profile propagated")
+
+        statistics.save(arguments.output)
+
+        summary = statistics.get_summary()
+        summary["time"] = time.perf_counter() - t0
+
+        print(json.dumps(summary, indent=4))
+    except Exception as exception:
+        print("Error: " + str(exception), file=sys.stderr)
+
+        return 1
+    finally:
+        if not arguments.trace is None: stop_tracing()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,49 +1,110 @@
 import numpy
 from collections import OrderedDict
 
+from orangecontrib.wise.util.wise_metrology import load_figure_error, load_metrology_file, get_number_of_profiles
+
+#
+# x, y, s, E of every point in one contiguous structured array: the fields are (strided) views on it.
+# With single_precision the electric fields are stored as complex64 and the curvilinear positions as float32;
+# x and y stay in double precision, they carry the phase of the Huygens integral (lengths ~ f1 + f2, steps ~ lambda)
+#
+def get_wavefront_dtype(single_precision=False):
+    return numpy.dtype([("x", numpy.float64),
+                        ("y", numpy.float64),
+                        ("s", numpy.float32 if single_precision else numpy.float64),
+                        ("E", numpy.complex64 if single_precision else numpy.complex128)])
+
 class WiseWavefront(object):
-    positions_x = None
-    positions_y = None
-    positions_s = None
-    electric_fields = None
-    residuals = None
+    __slots__ = ("_data", "residuals")
 
     def __init__(self,
-                 positions_x=numpy.zeros(100),
-                 positions_y=numpy.zeros(100),
-                 positions_s=numpy.zeros(100),
-                 electric_fields=numpy.zeros(100),
-                 residuals=numpy.zeros(0)):
-        self.positions_x = positions_x
-        self.positions_y = positions_y
-        self.positions_s = positions_s
-        self.electric_fields = electric_fields
-        self.residuals = residuals
+                 positions_x=None,
+                 positions_y=None,
+                 positions_s=None,
+                 electric_fields=None,
+                 residuals=None,
+                 single_precision=False):
+        arrays = [array for array in (positions_x, positions_y, positions_s, electric_fields) if not array is None]
+
+        self._data = numpy.zeros(len(arrays[0]) if len(arrays) > 0 else 100, dtype=get_wavefront_dtype(single_precision))
+
+        if not positions_x is None: self._data["x"] = positions_x
+        if not positions_y is None: self._data["y"] = positions_y
+        if not positions_s is None: self._data["s"] = positions_s
+        if not electric_fields is None: self._data["E"] = electric_fields
+
+        self.residuals = numpy.zeros(0) if residuals is None else residuals
+
+    def __len__(self):
+        return len(self._data)
+
+    def is_single_precision(self):
+        return self._data.dtype["E"] == numpy.complex64
+
+    def get_data(self):
+        return self._data
+
+    def _set_field(self, name, values):
+        if numpy.size(values) != len(self._data): raise ValueError("Wavefront with " + str(len(self._data)) + " points: " + str(numpy.size(values)) + " values given")
+
+        self._data[name] = values
+
+    @property
+    def positions_x(self):
+        return self._data["x"]
+
+    @positions_x.setter
+    def positions_x(self, positions_x):
+        self._set_field("x", positions_x)
+
+    @property
+    def positions_y(self):
+        return self._data["y"]
+
+    @positions_y.setter
+    def positions_y(self, positions_y):
+        self._set_field("y", positions_y)
+
+    @property
+    def positions_s(self):
+        return self._data["s"]
+
+    @positions_s.setter
+    def positions_s(self, positions_s):
+        self._set_field("s", positions_s)
+
+    @property
+    def electric_fields(self):
+        return self._data["E"]
+
+    @electric_fields.setter
+    def electric_fields(self, electric_fields):
+        self._set_field("E", electric_fields)
 
 class WiseSource(object):
-    inner_wise_source = None
-    properties = OrderedDict()
-    
+    __slots__ = ("inner_wise_source", "properties")
+
     def __init__(self, inner_wise_source=None):
         self.inner_wise_source = inner_wise_source
-        
+        self.properties = OrderedDict()
+
     def set_property(self, key, value):
         self.properties[key] = value
-    
+
     def get_property(self, key):
         return self.properties[key]
-    
+
 class WiseOpticalElement(object):
-    inner_wise_optical_element = None
-    properties = OrderedDict()
-    
+    __slots__ = ("inner_wise_optical_element", "properties")
+
     def __init__(self,
                  inner_wise_optical_element=None):
         self.inner_wise_optical_element = inner_wise_optical_element
+        self.properties = OrderedDict()
 
     def set_property(self, key, value):
         self.properties[key] = value
-    
+
     def get_property(self, key):
         return self.properties[key]
 
@@ -55,18 +116,21 @@ class WiseNumericalIntegrationParameters:
     detector_size = 0.0
     number_of_points = 0
     calculated_number_of_points = 0
+    detector_number_of_points = 0
+    calculated_detector_number_of_points = 0
 
-    def __init__(self, calculation_type=AUTOMATIC, detector_size=0.0, number_of_points=0, calculated_number_of_points=0):
+    # number_of_points: mirror sampling. detector_number_of_points: detector sampling, <= 0 from the expected spot size
+    def __init__(self, calculation_type=AUTOMATIC, detector_size=0.0, number_of_points=0, calculated_number_of_points=0,
+                 detector_number_of_points=0, calculated_detector_number_of_points=0):
         self.calculation_type = calculation_type
         self.detector_size = detector_size
         self.number_of_points = number_of_points
         self.calculated_number_of_points = calculated_number_of_points
+        self.detector_number_of_points = detector_number_of_points
+        self.calculated_detector_number_of_points = calculated_detector_number_of_points
 
 class WiseOutput(object):
-    _source = None
-    _optical_element = None
-    _wavefront = None
-    _numerical_integration_parameters = None
+    __slots__ = ("_source", "_optical_element", "_wavefront", "_numerical_integration_parameters")
 
     def __init__(self,
                  source=None,
@@ -122,4 +186,54 @@ class WisePreInputData:
 
         self.roughness_file = roughness_file
         self.roughness_x_scaling =roughness_x_scaling
-        self.roughness_y_scaling = roughness_y_scaling
\ No newline at end of file
+        self.roughness_y_scaling = roughness_y_scaling
+
+    # files can be text (parsed once), .npy or .h5 (memory mapped): see wise_metrology
+    def get_figure_error(self):
+        if self.figure_error_file == WisePreInputData.NONE: return None
+
+        return load_figure_error(self.figure_error_file, self.figure_user_units_to_m)
+
+    def get_roughness_psd(self):
+        if self.roughness_file == WisePreInputData.NONE: return None
+
+        return load_metrology_file(self.roughness_file)
+
+#
+# Monte Carlo ensemble of figure errors: figure_error_file contains one profile per row (.npy)
+#
+class WiseEnsemblePreInputData(WisePreInputData):
+
+    def __init__(self,
+                figure_error_file=WisePreInputData.NONE,
+                figure_error_step=0.0,
+                figure_user_units_to_m=1.0,
+                roughness_file=WisePreInputData.NONE,
+                roughness_x_scaling=1.0,
+                roughness_y_scaling=1.0,
+                profile_index=0
+                ):
+        super().__init__(figure_error_file=figure_error_file,
+                         figure_error_step=figure_error_step,
+                         figure_user_units_to_m=figure_user_units_to_m,
+                         roughness_file=roughness_file,
+                         roughness_x_scaling=roughness_x_scaling,
+                         roughness_y_scaling=roughness_y_scaling)
+
+        self.profile_index = profile_index
+
+    def get_number_of_profiles(self):
+        if self.figure_error_file == WisePreInputData.NONE: return 0
+
+        return get_number_of_profiles(self.figure_error_file)
+
+    def get_figure_error(self, index=None):
+        if self.figure_error_file == WisePreInputData.NONE: return None
+
+        return load_figure_error(self.figure_error_file, self.figure_user_units_to_m, self.profile_index if index is None else index)
+
+    # all the profiles [m], (number_of_profiles, N)
+    def get_figure_errors(self):
+        if self.figure_error_file == WisePreInputData.NONE: return None
+
+        return numpy.atleast_2d(load_metrology_file(self.figure_error_file))*self.figure_user_units_to_m
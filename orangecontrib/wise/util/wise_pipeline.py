@@ -0,0 +1,453 @@
+import os, sys, time, json
+import numpy
+
+from wiselib import Optics
+
+from orangecontrib.wise.util.wise_objects import WiseSource, WiseOpticalElement, WiseWavefront, WiseOutput, WiseNumericalIntegrationParameters
+from orangecontrib.wise.util.wise_propagator import WisePropagatorsChain, WisePropagationAlgorithms, WisePropagationParameters, get_mirror_number_of_points
+from orangecontrib.wise.util.wise_focus import golden_section_best_focus
+from orangecontrib.wise.util.wise_sweep import WiseSweepResult
+from orangecontrib.wise.util.wise_metrics import stack_focal_metrics
+from orangecontrib.wise.util.wise_export import save_sweep_result
+from orangecontrib.wise.util.wise_metrology import load_figure_error, load_roughness, get_figure_error_key, resample_figure_error
+from orangecontrib.wise.util.wise_trace import start_tracing, stop_tracing
+
+###################################################################
+# GUI-FREE PIPELINE: source -> elliptical mirror -> detector
+# lengths in [m], wavelength in [m], angles in [deg]
+###################################################################
+
+def create_gaussian_source(wavelength, sigma, z_origin=0.0, y_origin=0.0, theta=0.0,
+                           source_on_mirror_focus=False, longitudinal_correction=0.0, transverse_correction=0.0, delta_theta=0.0):
+    if source_on_mirror_focus:
+        z_origin = 0.0
+        y_origin = 0.0
+        theta    = 0.0
+
+    wise_source = WiseSource(inner_wise_source=Optics.GaussianSource_1d(Lambda=wavelength,
+                                                                        Waist0=sigma * numpy.sqrt(2),
+                                                                        ZOrigin=z_origin,
+                                                                        YOrigin=y_origin,
+                                                                        Theta=numpy.radians(theta)))
+
+    wise_source.set_property("source_on_mirror_focus", source_on_mirror_focus)
+
+    if source_on_mirror_focus:
+        wise_source.set_property("longitudinal_correction", longitudinal_correction)
+        wise_source.set_property("transverse_correction", transverse_correction)
+        wise_source.set_property("delta_theta", numpy.radians(delta_theta))
+
+    return wise_source
+
+#
+# with wavelength and mirror_sampling (see get_mirror_sampling) the figure error is resampled to the mirror points of the
+# propagation: figure_error_key identifies the profile in the cache of the resampled profiles (see wise_metrology)
+#
+def create_elliptical_mirror(f1, f2, alpha, length,
+                             figure_error=None, figure_error_step=0.0,
+                             roughness_file=None, roughness_x_scaling=1.0, roughness_y_scaling=1.0, roughness_fit_data=False,
+                             wavelength=None, mirror_sampling=None, figure_error_key=None):
+    elliptic_mirror = Optics.Ellipse(f1 = f1,
+                                     f2 = f2,
+                                     Alpha = numpy.radians(alpha),
+                                     L = length)
+
+    if not figure_error is None:
+        if not wavelength is None and not mirror_sampling is None:
+            number_of_points = get_mirror_number_of_points(wavelength, elliptic_mirror, get_mirror_numerical_integration_parameters(**mirror_sampling))
+
+            if number_of_points > 1:
+                figure_error, figure_error_step = resample_figure_error(figure_error, figure_error_step, length/(number_of_points - 1), key=figure_error_key)
+
+        elliptic_mirror.FigureErrorAdd(figure_error, figure_error_step) # (m)
+
+    if not roughness_file is None:
+        load_roughness(elliptic_mirror.Roughness,
+                       roughness_file,
+                       x_scaling = roughness_x_scaling,
+                       y_scaling = roughness_y_scaling,
+                       x_is_spatial_frequency = False)
+        elliptic_mirror.Roughness.Options.FIT_NUMERIC_DATA_WITH_POWER_LAW = roughness_fit_data
+        elliptic_mirror.Options.USE_ROUGHNESS = True
+    else:
+        elliptic_mirror.Options.USE_ROUGHNESS = False
+
+    return elliptic_mirror
+
+def position_source_at_mirror_focus(source, elliptic_mirror):
+    if source.get_property("source_on_mirror_focus"):
+        longitudinal_correction = float(source.get_property("longitudinal_correction"))
+        transverse_correction   = float(source.get_property("transverse_correction"))
+        delta_theta             = float(source.get_property("delta_theta"))
+
+        if longitudinal_correction == 0.0:
+            if transverse_correction == 0.0:
+                alpha = 0
+            else:
+                alpha = elliptic_mirror.p1_Angle + numpy.sign(transverse_correction)*numpy.pi/2
+        else:
+            alpha = elliptic_mirror.p1_Angle + numpy.arctan(transverse_correction/longitudinal_correction)
+
+        defocus = numpy.sqrt(longitudinal_correction**2 + transverse_correction**2)
+
+        theta = elliptic_mirror.p1_Angle + delta_theta
+        z_origin = elliptic_mirror.XYF1[0] + defocus*numpy.cos(alpha)
+        y_origin = elliptic_mirror.XYF1[1] + defocus*numpy.sin(alpha)
+
+        # point sources first: they could derive from GaussianSource_1d. A point source has no direction
+        if (isinstance(source.inner_wise_source, Optics.PointSource_1d)):
+            source.inner_wise_source = Optics.PointSource_1d(source.inner_wise_source.Lambda,
+                                                             XOrigin=z_origin,
+                                                             YOrigin=y_origin)
+        elif (isinstance(source.inner_wise_source, Optics.GaussianSource_1d)):
+            source.inner_wise_source = Optics.GaussianSource_1d(source.inner_wise_source.Lambda,
+                                                                source.inner_wise_source.Waist0,
+                                                                ZOrigin=z_origin,
+                                                                YOrigin=y_origin,
+                                                                Theta=theta)
+        else:
+            source.inner_wise_source.ZOrigin = z_origin
+            source.inner_wise_source.YOrigin = y_origin
+            source.inner_wise_source.ThetaPropagation = theta
+
+    return source
+
+def get_mirror_numerical_integration_parameters(calculation_type=WiseNumericalIntegrationParameters.AUTOMATIC, detector_size=50e-6, number_of_points=0):
+    if calculation_type == WiseNumericalIntegrationParameters.AUTOMATIC:
+        number_of_points = -1
+    else:
+        detector_size = 0.0
+
+    return WiseNumericalIntegrationParameters(calculation_type, detector_size, number_of_points)
+
+# single_precision: the wavefront on the mirror is stored as complex64 (see WiseWavefront)
+def propagate_to_mirror(source, elliptic_mirror, calculation_type=WiseNumericalIntegrationParameters.AUTOMATIC, detector_size=50e-6, number_of_points=0,
+                        algorithm=WisePropagationAlgorithms.HuygensIntegral, single_precision=False):
+    numerical_integration_parameters = get_mirror_numerical_integration_parameters(calculation_type, detector_size, number_of_points)
+    calculation_type = numerical_integration_parameters.calculation_type
+    detector_size = numerical_integration_parameters.detector_size
+    number_of_points = numerical_integration_parameters.number_of_points
+
+    propagation_parameter = WisePropagationParameters(propagation_type=WisePropagationParameters.MIRROR_ONLY,
+                                                      source=source.inner_wise_source,
+                                                      optical_element=elliptic_mirror,
+                                                      numerical_integration_parameters=numerical_integration_parameters)
+
+    propagation_output = WisePropagatorsChain.Instance().do_propagation(propagation_parameter, algorithm)
+
+    wise_output = WiseOutput(source=source,
+                             optical_element=WiseOpticalElement(inner_wise_optical_element=elliptic_mirror),
+                             wavefront=WiseWavefront(propagation_output.mir_x,
+                                                     propagation_output.mir_y,
+                                                     propagation_output.mir_s,
+                                                     propagation_output.mir_E,
+                                                     propagation_output.residuals,
+                                                     single_precision=single_precision),
+                             numerical_integration_parameters=WiseNumericalIntegrationParameters(calculation_type,
+                                                                                                 detector_size,
+                                                                                                 number_of_points,
+                                                                                                 propagation_output.number_of_points))
+
+    return wise_output, propagation_output
+
+# defocus with respect to F2 (scalar or array), positive downstream
+DEFOCUS_SIGN = -1
+
+# number_of_points: mirror sampling, detector_number_of_points: detector sampling (<= 0: from the expected spot size)
+def propagate_to_detector(wise_output, detector_size, defocus=0.0, calculation_type=WiseNumericalIntegrationParameters.AUTOMATIC, number_of_points=0,
+                          n_pools=0, algorithm=WisePropagationAlgorithms.HuygensIntegral, detector_number_of_points=0):
+    if calculation_type == WiseNumericalIntegrationParameters.AUTOMATIC: number_of_points = -1
+
+    numerical_integration_parameters = WiseNumericalIntegrationParameters(calculation_type, detector_size, int(number_of_points),
+                                                                          detector_number_of_points=int(detector_number_of_points))
+
+    propagation_parameter = WisePropagationParameters(propagation_type=WisePropagationParameters.MIRROR_AND_DETECTOR,
+                                                      source=wise_output.get_source().inner_wise_source,
+                                                      optical_element=wise_output.get_optical_element().inner_wise_optical_element,
+                                                      wavefront=wise_output.get_wavefront(),
+                                                      numerical_integration_parameters=numerical_integration_parameters,
+                                                      defocus_sweep=DEFOCUS_SIGN * numpy.asarray(defocus, dtype=float),
+                                                      n_pools=n_pools)
+
+    return WisePropagatorsChain.Instance().do_propagation(propagation_parameter, algorithm)
+
+def get_defocus_list(defocus_start, defocus_stop, defocus_step):
+    defocus_list = numpy.arange(defocus_start, defocus_stop, defocus_step)
+
+    if defocus_list[-1] != defocus_stop: defocus_list = numpy.append(defocus_list, defocus_stop)
+
+    defocus_list[numpy.abs(defocus_list) < 1e-15] = 0.0
+
+    return defocus_list
+
+def find_best_focus(wise_output, detector_size, defocus_start, defocus_stop, defocus_step,
+                    calculation_type=WiseNumericalIntegrationParameters.AUTOMATIC, number_of_points=0,
+                    search_mode="linear", coarse_points=11, planes_per_propagation=10,
+                    n_pools=0, algorithm=WisePropagationAlgorithms.HuygensIntegral, memory_mapped=False, detector_number_of_points=0):
+    if defocus_start >= defocus_stop: raise ValueError("Defocus sweep start must be < Defocus sweep stop")
+    if defocus_step <= 0: raise ValueError("Defocus sweep step must be > 0")
+
+    if search_mode == "golden_section":
+        evaluated_planes = {}
+
+        def calculate_hews(defocus_values):
+            propagation_output = propagate_to_detector(wise_output, detector_size, numpy.asarray(defocus_values),
+                                                       calculation_type, number_of_points, n_pools, algorithm, detector_number_of_points)
+
+            for j, defocus in enumerate(defocus_values):
+                evaluated_planes[float(defocus)] = (propagation_output.det_s[j], propagation_output.electric_fields[j], propagation_output.HEW[j], propagation_output.metrics[j])
+
+            return propagation_output.HEW
+
+        search_result = golden_section_best_focus(calculate_hews, defocus_start, defocus_stop, defocus_step, coarse_points=coarse_points)
+
+        sweep_result = WiseSweepResult(search_result.defocus_list, memory_mapped=memory_mapped)
+        sweep_result.set_planes(slice(None),
+                                [evaluated_planes[float(defocus)][0] for defocus in sweep_result.defocus_list],
+                                [evaluated_planes[float(defocus)][1] for defocus in sweep_result.defocus_list],
+                                [evaluated_planes[float(defocus)][2] for defocus in sweep_result.defocus_list],
+                                stack_focal_metrics([evaluated_planes[float(defocus)][3] for defocus in sweep_result.defocus_list]))
+    elif search_mode == "linear":
+        sweep_result = WiseSweepResult(get_defocus_list(defocus_start, defocus_stop, defocus_step), memory_mapped=memory_mapped)
+
+        for batch in numpy.array_split(numpy.arange(len(sweep_result)), int(numpy.ceil(len(sweep_result)/planes_per_propagation))):
+            propagation_output = propagate_to_detector(wise_output, detector_size, sweep_result.defocus_list[batch],
+                                                       calculation_type, number_of_points, n_pools, algorithm, detector_number_of_points)
+
+            sweep_result.set_planes(batch, propagation_output.det_s, propagation_output.electric_fields, propagation_output.HEW, propagation_output.metrics)
+    else:
+        raise ValueError("Search mode not recognized: " + str(search_mode))
+
+    return sweep_result
+
+###################################################################
+# BEAMLINE DESCRIPTION (YAML or JSON):
+#
+# source:
+#   wavelength: 10.0e-9       # [m]
+#   sigma: 125.0e-6           # [m]
+#   source_on_mirror_focus: true
+#   longitudinal_correction: 0.0, transverse_correction: 0.0, delta_theta: 0.0 [deg]
+#   (or z_origin, y_origin [m], theta [deg])
+# mirror:
+#   f1: 98.0, f2: 1.2, alpha: 2.0 [deg], length: 0.4 [m]
+#   figure_error_file: figure_error.dat, figure_error_step: 2.0e-3 [m], figure_error_to_m: 1.0, figure_error_index: 0 (ensembles)
+#   roughness_file: roughness.dat, roughness_x_scaling: 1.0, roughness_y_scaling: 1.0, roughness_fit_data: false
+#   (metrology files: text, .npy or .h5, see wise_metrology)
+#   calculation_type: automatic | user_defined, detector_size: 50.0e-6 [m], number_of_points: 0
+# detector:
+#   detector_size: 50.0e-6 [m], calculation_type: automatic, number_of_points: 0 (mirror), defocus: 0.0 [m] (from F2, positive downstream)
+#   detector_number_of_points: 0 (0: from the expected spot size)
+#   best_focus: {defocus_start: -1.0e-3, defocus_stop: 1.0e-3, defocus_step: 1.0e-4, search_mode: linear | golden_section}
+# calculation:
+#   algorithm: HuygensIntegral | VectorizedHuygensIntegral | MixedPrecisionHuygensIntegral, n_pools: 0
+#   disk_cache_directory: (optional), disk_cache_size: 10.0 [GB]
+###################################################################
+
+CALCULATION_TYPES = {"automatic": WiseNumericalIntegrationParameters.AUTOMATIC,
+                     "user_defined": WiseNumericalIntegrationParameters.USER_DEFINED}
+
+def load_beamline_description(file_name):
+    with open(file_name, "r") as file:
+        if file_name.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML is required to read YAML beamline descriptions")
+
+            return yaml.safe_load(file)
+        else:
+            return json.load(file)
+
+def _get_calculation_type(description):
+    calculation_type = description.get("calculation_type", "automatic")
+
+    if not calculation_type in CALCULATION_TYPES: raise ValueError("Calculation type not recognized: " + str(calculation_type))
+
+    return CALCULATION_TYPES[calculation_type]
+
+def create_beamline(description):
+    source_description = description["source"]
+    mirror_description = description["mirror"]
+
+    source = create_gaussian_source(wavelength=float(source_description["wavelength"]),
+                                    sigma=float(source_description["sigma"]),
+                                    z_origin=float(source_description.get("z_origin", 0.0)),
+                                    y_origin=float(source_description.get("y_origin", 0.0)),
+                                    theta=float(source_description.get("theta", 0.0)),
+                                    source_on_mirror_focus=bool(source_description.get("source_on_mirror_focus", True)),
+                                    longitudinal_correction=float(source_description.get("longitudinal_correction", 0.0)),
+                                    transverse_correction=float(source_description.get("transverse_correction", 0.0)),
+                                    delta_theta=float(source_description.get("delta_theta", 0.0)))
+
+    if "figure_error_file" in mirror_description:
+        figure_error_arguments = (mirror_description["figure_error_file"],
+                                  float(mirror_description.get("figure_error_to_m", 1.0)),
+                                  int(mirror_description.get("figure_error_index", 0)))
+
+        figure_error = load_figure_error(*figure_error_arguments)
+        figure_error_key = get_figure_error_key(*figure_error_arguments)
+    else:
+        figure_error = None
+        figure_error_key = None
+
+    elliptic_mirror = create_elliptical_mirror(f1=float(mirror_description["f1"]),
+                                               f2=float(mirror_description["f2"]),
+                                               alpha=float(mirror_description["alpha"]),
+                                               length=float(mirror_description["length"]),
+                                               figure_error=figure_error,
+                                               figure_error_step=float(mirror_description.get("figure_error_step", 0.0)),
+                                               roughness_file=mirror_description.get("roughness_file", None),
+                                               roughness_x_scaling=float(mirror_description.get("roughness_x_scaling", 1.0)),
+                                               roughness_y_scaling=float(mirror_description.get("roughness_y_scaling", 1.0)),
+                                               roughness_fit_data=bool(mirror_description.get("roughness_fit_data", False)),
+                                               wavelength=source.inner_wise_source.Lambda,
+                                               mirror_sampling=get_mirror_sampling(mirror_description),
+                                               figure_error_key=figure_error_key)
+
+    position_source_at_mirror_focus(source, elliptic_mirror)
+
+    return source, elliptic_mirror
+
+def get_mirror_sampling(mirror_description):
+    return {"calculation_type": _get_calculation_type(mirror_description),
+            "detector_size": float(mirror_description.get("detector_size", 50e-6)),
+            "number_of_points": int(mirror_description.get("number_of_points", 0))}
+
+def run_beamline(description, output_directory="."):
+    timings = {}
+
+    mirror_description      = description["mirror"]
+    detector_description    = description.get("detector", {})
+    calculation_description = description.get("calculation", {})
+
+    algorithm = calculation_description.get("algorithm", WisePropagationAlgorithms.HuygensIntegral)
+    n_pools   = int(calculation_description.get("n_pools", 0))
+
+    if "disk_cache_directory" in calculation_description:
+        WisePropagatorsChain.Instance().set_disk_cache(calculation_description["disk_cache_directory"],
+                                                       int(float(calculation_description.get("disk_cache_size", 10.0))*1024**3))
+
+    t0 = time.perf_counter()
+
+    source, elliptic_mirror = create_beamline(description)
+
+    timings["setup"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+
+    wise_output, mirror_output = propagate_to_mirror(source, elliptic_mirror, algorithm=algorithm, **get_mirror_sampling(mirror_description))
+
+    timings["mirror"] = time.perf_counter() - t0
+
+    if not os.path.exists(output_directory): os.makedirs(output_directory)
+
+    numpy.savez(os.path.join(output_directory, "mirror.npz"),
+                mir_x=mirror_output.mir_x,
+                mir_y=mirror_output.mir_y,
+                mir_s=mirror_output.mir_s,
+                mir_E=mirror_output.mir_E,
+                residuals=mirror_output.residuals,
+                number_of_points=mirror_output.number_of_points)
+
+    results = {"mirror_number_of_points": int(mirror_output.number_of_points)}
+
+    if len(detector_description) > 0:
+        detector_size    = float(detector_description.get("detector_size", 50e-6))
+        calculation_type = _get_calculation_type(detector_description)
+        number_of_points = int(detector_description.get("number_of_points", 0))
+        detector_number_of_points = int(detector_description.get("detector_number_of_points", 0))
+
+        t0 = time.perf_counter()
+
+        detector_output = propagate_to_detector(wise_output,
+                                                detector_size,
+                                                defocus=float(detector_description.get("defocus", 0.0)),
+                                                calculation_type=calculation_type,
+                                                number_of_points=number_of_points,
+                                                n_pools=n_pools,
+                                                algorithm=algorithm,
+                                                detector_number_of_points=detector_number_of_points)
+
+        timings["detector"] = time.perf_counter() - t0
+
+        numpy.savez(os.path.join(output_directory, "detector.npz"),
+                    det_x=detector_output.det_x,
+                    det_y=detector_output.det_y,
+                    det_s=detector_output.det_s,
+                    electric_fields=detector_output.electric_fields,
+                    **detector_output.metrics.to_dict()) # HEW included
+
+        results["detector_number_of_points"] = int(detector_output.detector_number_of_points)
+        results["detector_HEW"] = float(detector_output.HEW)
+        results["detector_metrics"] = {name: float(value) for name, value in detector_output.metrics.to_dict().items()}
+
+        if "best_focus" in detector_description:
+            best_focus_description = detector_description["best_focus"]
+
+            t0 = time.perf_counter()
+
+            best_focus = find_best_focus(wise_output,
+                                         detector_size,
+                                         float(best_focus_description["defocus_start"]),
+                                         float(best_focus_description["defocus_stop"]),
+                                         float(best_focus_description["defocus_step"]),
+                                         calculation_type=calculation_type,
+                                         number_of_points=number_of_points,
+                                         search_mode=best_focus_description.get("search_mode", "linear"),
+                                         coarse_points=int(best_focus_description.get("coarse_points", 11)),
+                                         planes_per_propagation=int(best_focus_description.get("planes_per_propagation", 10)),
+                                         n_pools=n_pools,
+                                         algorithm=algorithm,
+                                         detector_number_of_points=detector_number_of_points)
+
+            timings["best_focus"] = time.perf_counter() - t0
+
+            index_min = best_focus.get_best_focus_index()
+
+            save_sweep_result(os.path.join(output_directory, "best_focus.npz"),
+                              best_focus,
+                              parameters=dict(best_focus_description, best_focus_index=index_min, detector_size=detector_size))
+
+            results["best_focus_defocus"] = float(best_focus.defocus_list[index_min])
+            results["best_focus_position"] = float(elliptic_mirror.f2 + best_focus.defocus_list[index_min])
+            results["best_focus_HEW"] = float(best_focus.hews[index_min])
+            results["best_focus_metrics"] = {name: float(value) for name, value in best_focus.metrics[index_min].to_dict().items()}
+            results["best_focus_number_of_propagations"] = len(best_focus)
+
+    results["timings"] = timings
+
+    with open(os.path.join(output_directory, "results.json"), "w") as file:
+        json.dump(results, file, indent=4)
+
+    return results
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a WISE source -> elliptical mirror -> detector propagation without GUI")
+    parser.add_argument("beamline", help="beamline description file (.yaml, .yml or .json)")
+    parser.add_argument("-o", "--output-directory", default=".", help="directory for the results (default: current directory)")
+    parser.add_argument("--trace", default=None, help="write a timeline of the run in Chrome trace format (.json)")
+
+    arguments = parser.parse_args(argv)
+
+    if not arguments.trace is None: start_tracing(arguments.trace)
+
+    try:
+        results = run_beamline(load_beamline_description(arguments.beamline), arguments.output_directory)
+
+        print(json.dumps(results, indent=4))
+    except Exception as exception:
+        print("Error: " + str(exception), file=sys.stderr)
+
+        return 1
+    finally:
+        WisePropagatorsChain.Instance().shutdown_worker_pool()
+
+        if not arguments.trace is None: stop_tracing()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
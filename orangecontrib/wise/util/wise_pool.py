@@ -0,0 +1,194 @@
+import time, threading, multiprocessing
+import numpy
+
+from multiprocessing import shared_memory
+
+from orangecontrib.wise.util.wise_trace import is_tracing, traced, add_events, begin_task_capture, end_task_capture
+
+class WisePoolStatistics(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.startup_time = 0.0
+        self.wall_time = 0.0
+        self.compute_time = 0.0
+        self.number_of_calls = 0
+        self.number_of_tasks = 0
+        self.number_of_workers = 0
+
+    def get_overhead_time(self):
+        if self.number_of_workers == 0: return self.startup_time
+
+        # compute time is summed over the workers: the ideal wall time is compute time/workers
+        return self.startup_time + max(0.0, self.wall_time - self.compute_time/self.number_of_workers)
+
+    def __str__(self):
+        return "Worker pool (" + str(self.number_of_workers) + " processes): " + \
+               str(self.number_of_calls) + " calls, " + str(self.number_of_tasks) + " tasks, " + \
+               "startup " + str(round(self.startup_time, 3)) + " s, " + \
+               "wall " + str(round(self.wall_time, 3)) + " s, " + \
+               "compute " + str(round(self.compute_time, 3)) + " s, " + \
+               "overhead " + str(round(self.get_overhead_time(), 3)) + " s"
+
+def _timed_task(arguments):
+    function, function_arguments, trace = arguments
+
+    if trace: begin_task_capture()
+
+    t0 = time.perf_counter()
+    with traced(function.__name__, "pool task"): result = function(*function_arguments)
+    compute_time = time.perf_counter() - t0
+
+    return result, compute_time, end_task_capture() if trace else None
+
+#
+# long-lived process pool, created at the first request and reused until resized or shut down
+#
+class WiseWorkerPool(object):
+    def __init__(self, n_pools=0):
+        self._n_pools = int(n_pools)
+        self._pool = None
+        self._lock = threading.RLock()
+
+        self.statistics = WisePoolStatistics()
+
+    def get_n_pools(self):
+        return self._n_pools
+
+    def set_n_pools(self, n_pools):
+        n_pools = int(n_pools)
+
+        with self._lock:
+            if n_pools != self._n_pools:
+                self.shutdown()
+                self._n_pools = n_pools
+
+    def is_running(self):
+        return not self._pool is None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._n_pools <= 0: raise ValueError("Number of parallel processes must be > 0")
+
+            if self._pool is None:
+                t0 = time.perf_counter()
+                self._pool = multiprocessing.Pool(self._n_pools)
+                self.statistics.startup_time += time.perf_counter() - t0
+
+            return self._pool
+
+    def map(self, function, arguments_list):
+        with self._lock:
+            pool = self._get_pool()
+
+            self.statistics.number_of_workers = self._n_pools
+
+            trace = is_tracing()
+
+            t0 = time.perf_counter()
+            with traced("WiseWorkerPool.map " + function.__name__, "pool"):
+                outputs = pool.map(_timed_task, [(function, arguments, trace) for arguments in arguments_list])
+
+            self.statistics.wall_time += time.perf_counter() - t0
+            self.statistics.compute_time += sum([output[1] for output in outputs])
+            self.statistics.number_of_calls += 1
+            self.statistics.number_of_tasks += len(arguments_list)
+
+            for output in outputs: add_events(output[2])
+
+            return [output[0] for output in outputs]
+
+    #
+    # results are yielded as soon as each task completes, in completion order. The pool is locked for the whole iteration:
+    # map, set_n_pools and shutdown from other threads wait until it ends or the generator is closed (close() it before
+    # dropping an iteration)
+    #
+    def imap_unordered(self, function, arguments_list):
+        with self._lock:
+            pool = self._get_pool()
+
+            self.statistics.number_of_workers = self._n_pools
+
+            trace = is_tracing()
+
+            t0 = time.perf_counter()
+            try:
+                for result, compute_time, events in pool.imap_unordered(_timed_task, [(function, arguments, trace) for arguments in arguments_list]):
+                    self.statistics.compute_time += compute_time
+                    self.statistics.number_of_tasks += 1
+
+                    add_events(events)
+
+                    yield result
+            finally:
+                self.statistics.wall_time += time.perf_counter() - t0
+                self.statistics.number_of_calls += 1
+
+    # wait=False drops the tasks still queued or running
+    def shutdown(self, wait=True):
+        with self._lock:
+            if not self._pool is None:
+                if wait: self._pool.close()
+                else: self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+#
+# numpy array on a shared memory block: processes exchange only the descriptor (name, shape, dtype)
+# and attach to the same buffer, without copying or pickling the data
+#
+class WiseSharedArray(object):
+    def __init__(self, shape, dtype, name=None):
+        dtype = numpy.dtype(dtype)
+        size  = max(1, int(numpy.prod(shape))*dtype.itemsize)
+
+        if name is None:
+            self._shared_memory = shared_memory.SharedMemory(create=True, size=size)
+            self._owner = True
+        else:
+            self._shared_memory = _attach_shared_memory(name)
+            self._owner = False
+
+        self.array = numpy.ndarray(shape, dtype=dtype, buffer=self._shared_memory.buf)
+
+    @classmethod
+    def from_array(cls, array):
+        array = numpy.asarray(array)
+
+        shared_array = WiseSharedArray(array.shape, array.dtype)
+        shared_array.array[...] = array
+
+        return shared_array
+
+    @classmethod
+    def attach(cls, descriptor):
+        name, shape, dtype = descriptor
+
+        return WiseSharedArray(shape, dtype, name=name)
+
+    def get_descriptor(self):
+        return self._shared_memory.name, self.array.shape, self.array.dtype.str
+
+    def release(self):
+        if not self._shared_memory is None:
+            self.array = None # exported buffers must be released before closing
+
+            self._shared_memory.close()
+            if self._owner: self._shared_memory.unlink()
+
+            self._shared_memory = None
+
+def _attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # python >= 3.13
+    except TypeError:
+        from multiprocessing import resource_tracker
+
+        # the block belongs to the creator process: the attaching process must not track (and unlink) it
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
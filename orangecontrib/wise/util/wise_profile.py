@@ -0,0 +1,191 @@
+import sys, time, threading, tracemalloc
+from collections import OrderedDict
+
+from orangecontrib.wise.util.wise_trace import trace_begin, trace_end
+
+try:
+    import resource
+except ImportError: # windows
+    resource = None
+
+#
+# peak allocation of a stage:
+# - with tracemalloc running (see set_memory_tracing): peak of the python/numpy allocations above the memory at the stage start
+# - otherwise: growth of the peak resident memory of the process (one system call, cheap enough to be always on).
+#   It is 0 when the stage fits in memory already used before, so it flags only the stages that push the peak up
+#
+def set_memory_tracing(trace_memory):
+    if trace_memory and not tracemalloc.is_tracing(): tracemalloc.start()
+    elif not trace_memory and tracemalloc.is_tracing(): tracemalloc.stop()
+
+def is_memory_tracing():
+    return tracemalloc.is_tracing()
+
+def _get_peak_resident_memory():
+    if resource is None: return 0
+
+    # ru_maxrss: kB on linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+class WiseStageProfile(object):
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory = 0
+
+    def __str__(self):
+        return self.name + ": " + str(self.calls) + " calls, " + \
+               "wall " + str(round(self.wall_time, 4)) + " s, " + \
+               "cpu " + str(round(self.cpu_time, 4)) + " s, " + \
+               "peak " + str(round(self.peak_memory/1024**2, 2)) + " MB"
+
+class _StageMeasure(object):
+    def __init__(self, stage):
+        self.stage = stage
+        self.peak_memory = 0
+
+#
+# stages of one propagation, in order of first execution. Stages may be nested: times of the inner stages
+# are also counted in the outer ones
+#
+class WisePropagationProfile(object):
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.memory_tracing = False
+
+        self._stack = []
+
+    def get_stage(self, name):
+        if not name in self.stages: self.stages[name] = WiseStageProfile(name)
+
+        return self.stages[name]
+
+    def begin_stage(self, name):
+        trace_begin(name, "propagation")
+
+        measure = _StageMeasure(self.get_stage(name))
+
+        if tracemalloc.is_tracing():
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+
+            # the peak is global: before resetting it, it's kept by the enclosing stage
+            if len(self._stack) > 0: self._stack[-1].peak_memory = max(self._stack[-1].peak_memory, peak_memory)
+
+            tracemalloc.reset_peak()
+
+            measure.start_memory = current_memory
+            measure.tracing = True
+        else:
+            measure.start_memory = _get_peak_resident_memory()
+            measure.tracing = False
+
+        self._stack.append(measure)
+
+        measure.start_wall_time = time.perf_counter()
+        measure.start_cpu_time = time.process_time()
+
+    def end_stage(self):
+        measure = self._stack.pop()
+
+        wall_time = time.perf_counter() - measure.start_wall_time
+        cpu_time = time.process_time() - measure.start_cpu_time
+
+        if measure.tracing and tracemalloc.is_tracing():
+            peak_memory = max(measure.peak_memory, tracemalloc.get_traced_memory()[1])
+
+            if len(self._stack) > 0: self._stack[-1].peak_memory = max(self._stack[-1].peak_memory, peak_memory)
+
+            peak_memory -= measure.start_memory
+            self.memory_tracing = True
+        else:
+            peak_memory = _get_peak_resident_memory() - measure.start_memory
+
+        stage = measure.stage
+        stage.calls += 1
+        stage.wall_time += wall_time
+        stage.cpu_time += cpu_time
+        stage.peak_memory = max(stage.peak_memory, int(peak_memory))
+
+        if len(self._stack) == 0:
+            self.wall_time += wall_time
+            self.cpu_time += cpu_time
+
+        trace_end(stage.name, "propagation")
+
+    # sums the profile of another propagation into this one (e.g. all the calls of a best focus search)
+    def merge(self, profile):
+        if profile is None: return
+
+        for name, other_stage in profile.stages.items():
+            stage = self.get_stage(name)
+            stage.calls += other_stage.calls
+            stage.wall_time += other_stage.wall_time
+            stage.cpu_time += other_stage.cpu_time
+            stage.peak_memory = max(stage.peak_memory, other_stage.peak_memory)
+
+        self.wall_time += profile.wall_time
+        self.cpu_time += profile.cpu_time
+        self.memory_tracing = self.memory_tracing or profile.memory_tracing
+
+    def to_dict(self):
+        return OrderedDict([(name, {"calls": stage.calls,
+                                    "wall_time": stage.wall_time,
+                                    "cpu_time": stage.cpu_time,
+                                    "peak_memory": stage.peak_memory}) for name, stage in self.stages.items()])
+
+    def __str__(self):
+        text = "Propagation profile (wall " + str(round(self.wall_time, 4)) + " s, cpu " + str(round(self.cpu_time, 4)) + " s, " + \
+               ("traced allocations" if self.memory_tracing else "peak resident memory growth") + "):"
+
+        for stage in self.stages.values(): text += "\n   " + str(stage)
+
+        return text
+
+###################################################################
+# the profile of the running propagation is kept per thread: profile_stage() is a no-op outside of it
+###################################################################
+
+_current = threading.local()
+
+def get_current_profile():
+    return getattr(_current, "profile", None)
+
+class profiled_propagation(object):
+    def __init__(self, name="propagation"):
+        self.name = name
+        self.profile = None
+
+    def __enter__(self):
+        self._previous_profile = get_current_profile()
+
+        self.profile = WisePropagationProfile()
+        _current.profile = self.profile
+
+        self.profile.begin_stage(self.name)
+
+        return self.profile
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profile.end_stage()
+
+        _current.profile = self._previous_profile
+
+        return False
+
+class profile_stage(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.profile = get_current_profile()
+
+        if not self.profile is None: self.profile.begin_stage(self.name)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.profile is None: self.profile.end_stage()
+
+        return False
@@ -40,24 +40,97 @@ class Singleton:
 # DO NOT TOUCH THIS CODE -- END
 ###################################################################
 
+import os, atexit
+
+from orangecontrib.wise.util.wise_pool import WiseWorkerPool, WiseSharedArray
+from orangecontrib.wise.util.wise_cache import WiseLRUCache, WiseDiskCache, WiseHashError, get_hash, get_package_version
+from orangecontrib.wise.util.wise_profile import profiled_propagation, profile_stage
+from orangecontrib.wise.util.wise_trace import traced
+from orangecontrib.wise.util.wise_metrics import get_intensities, get_integrated_intensities, get_focal_metrics, get_diffraction_limited_references
+
 @Singleton
 class WisePropagatorsChain(object):
     def __init__(self):
+       self.worker_pool = WiseWorkerPool()
+       self.worker_pool_users = {} # id of the user: requested number of processes
+       atexit.register(self.shutdown_worker_pool)
+
+       self.mirror_field_cache = WiseLRUCache(name="Mirror wavefronts cache")
+       self.disk_cache = None
+
        self.initialize_chain()
 
     def initialize_chain(self):
         self.propagators_chain = []
         self.propagators_chain.append(HuygensIntegralPropagator())
+        self.propagators_chain.append(VectorizedHuygensIntegralPropagator())
+        self.propagators_chain.append(MixedPrecisionHuygensIntegralPropagator())
 
     def do_propagation(self, propagation_parameters, algorithm):
         for propagator in self.propagators_chain:
             if propagator.is_handler(algorithm):
-                return propagator.handle_request(parameters=propagation_parameters)
+                with traced("do_propagation " + str(algorithm), "chain"):
+                    return propagator.handle_request(parameters=propagation_parameters)
 
         return None
 
+    def get_worker_pool(self):
+        return self.worker_pool
+
+    #
+    # the pool is sized when a setting changes, never by the integrals: with a user (e.g. a widget) the pool gets the
+    # largest size requested by its users, each integral runs at most its own n_pools tasks at once on it
+    #
+    def set_n_pools(self, n_pools, user=None):
+        if user is None:
+            self.worker_pool.set_n_pools(n_pools)
+        else:
+            self.worker_pool_users[id(user)] = int(n_pools)
+            self.worker_pool.set_n_pools(max(self.worker_pool_users.values()))
+
+    def shutdown_worker_pool(self):
+        self.worker_pool.shutdown()
+
+    #
+    # the pool is shared by the whole chain: it is shut down when its last user (e.g. a Detector widget) releases it,
+    # or at exit. Users not registered still work: the pool is created again at the next request
+    #
+    def acquire_worker_pool(self, user):
+        self.worker_pool_users.setdefault(id(user), 0)
+
+    def release_worker_pool(self, user):
+        self.worker_pool_users.pop(id(user), None)
+
+        if len(self.worker_pool_users) == 0: self.shutdown_worker_pool()
+
+    def get_mirror_field_cache(self):
+        return self.mirror_field_cache
+
+    def get_disk_cache(self):
+        return self.disk_cache
+
+    def set_disk_cache(self, directory, max_size=10*1024**3):
+        if directory is None:
+            self.disk_cache = None
+        elif self.disk_cache is None or self.disk_cache.get_directory() != os.path.abspath(directory):
+            self.disk_cache = WiseDiskCache(directory, max_size, version_stamp=get_version_stamp())
+        else:
+            self.disk_cache.set_max_size(max_size)
+
+#
+# cached results are invalidated by any change of the propagators or of wiselib
+#
+PROPAGATORS_VERSION = 1
+
+def get_version_stamp():
+    return get_hash(PROPAGATORS_VERSION,
+                    get_package_version("wiselib"),
+                    get_package_version("OASYS1-WISE"))[:12]
+
 class WisePropagationAlgorithms:
     HuygensIntegral = "HuygensIntegral"
+    VectorizedHuygensIntegral = "VectorizedHuygensIntegral"
+    MixedPrecisionHuygensIntegral = "MixedPrecisionHuygensIntegral"
 
 from  orangecontrib.wise.util.wise_objects import WiseNumericalIntegrationParameters
 
@@ -115,7 +188,11 @@ class HuygensIntegralPropagationOutput(object):
                  det_y,
                  det_s,
                  electric_fields,
-                 HEW):
+                 HEW,
+                 profile=None,
+                 metrics=None,
+                 detector_number_of_points=None,
+                 precision_check=None):
         self.mir_x = mir_x
         self.mir_y = mir_y
         self.mir_s = mir_s
@@ -127,6 +204,14 @@ class HuygensIntegralPropagationOutput(object):
         self.det_s = det_s
         self.electric_fields = electric_fields
         self.HEW = HEW
+        self.profile = profile
+        self.metrics = metrics
+        self.detector_number_of_points = detector_number_of_points
+        self.precision_check = precision_check
+
+# fields stored in the disk cache: the profile belongs to the run that produced the output, the metrics are recalculated
+HUYGENS_INTEGRAL_PROPAGATION_OUTPUT_FIELDS = ["mir_x", "mir_y", "mir_s", "mir_E", "residuals", "number_of_points",
+                                              "det_x", "det_y", "det_s", "electric_fields", "HEW", "detector_number_of_points"]
 
 class HuygensIntegralPropagator(AbstractWisePropagator):
 
@@ -134,6 +219,63 @@ class HuygensIntegralPropagator(AbstractWisePropagator):
         return WisePropagationAlgorithms.HuygensIntegral
 
     def handle_request(self, parameters=WisePropagationParameters()):
+        disk_cache = WisePropagatorsChain.Instance().get_disk_cache()
+
+        with profiled_propagation("Total") as profile:
+            if not disk_cache is None:
+                try:
+                    key = self.get_propagation_key(parameters)
+                except WiseHashError:
+                    disk_cache = None # parameters that can't be identified by a key are never cached
+
+            if disk_cache is None:
+                propagation_output = self.calculate_propagation(parameters)
+            else:
+                with profile_stage("DiskCache"): entry = disk_cache.get(key)
+
+                if entry is None:
+                    propagation_output = self.calculate_propagation(parameters)
+
+                    with profile_stage("DiskCache"): disk_cache.put(key, {name: getattr(propagation_output, name) for name in HUYGENS_INTEGRAL_PROPAGATION_OUTPUT_FIELDS})
+                else:
+                    propagation_output = HuygensIntegralPropagationOutput(**{name: entry.get(name, None) for name in HUYGENS_INTEGRAL_PROPAGATION_OUTPUT_FIELDS})
+
+                    if not propagation_output.electric_fields is None:
+                        with profile_stage("FocalMetrics"):
+                            metrics = self.focal_metrics(parameters.source.Lambda,
+                                                         propagation_output.mir_x,
+                                                         propagation_output.mir_y,
+                                                         propagation_output.det_x,
+                                                         propagation_output.det_y,
+                                                         propagation_output.det_s,
+                                                         propagation_output.electric_fields)
+
+                        propagation_output.metrics = metrics if numpy.ndim(propagation_output.HEW) > 0 else metrics[0]
+
+        propagation_output.profile = profile
+
+        return propagation_output
+
+    def get_propagation_key(self, parameters):
+        numerical_integration_parameters = parameters.numerical_integration_parameters
+
+        if parameters.propagation_type == WisePropagationParameters.DETECTOR_ONLY:
+            mirror_field = (parameters.wavefront, numerical_integration_parameters.calculated_number_of_points)
+        else:
+            mirror_field = get_mirror_field_key(parameters.source, parameters.optical_element, numerical_integration_parameters)
+
+        if parameters.propagation_type == WisePropagationParameters.MIRROR_ONLY:
+            detector = None
+        else:
+            detector = (parameters.source.Lambda,
+                        parameters.optical_element,
+                        float(numerical_integration_parameters.detector_size),
+                        int(numerical_integration_parameters.detector_number_of_points),
+                        numpy.asarray(parameters.defocus_sweep, dtype=float))
+
+        return get_hash(self.get_algorithm(), parameters.propagation_type, mirror_field, detector)
+
+    def calculate_propagation(self, parameters):
         elliptic_mirror = parameters.optical_element
         source = parameters.source
         numerical_integration_parameters = parameters.numerical_integration_parameters
@@ -141,25 +283,9 @@ class HuygensIntegralPropagator(AbstractWisePropagator):
         if parameters.propagation_type == WisePropagationParameters.MIRROR_ONLY or \
             parameters.propagation_type == WisePropagationParameters.MIRROR_AND_DETECTOR:
 
-            theta_0 = elliptic_mirror.pTan_Angle
-            theta_1 = numpy.arctan(-1/elliptic_mirror.p2[0])
-
-            if numerical_integration_parameters.calculation_type == WiseNumericalIntegrationParameters.AUTOMATIC:
-                number_of_points = Rayman.SamplingCalculator(source.Lambda,
-                                                             elliptic_mirror.f2,
-                                                             elliptic_mirror.L,
-                                                             numerical_integration_parameters.detector_size,
-                                                             theta_0,
-                                                             theta_1)
-            else:
-                number_of_points = numerical_integration_parameters.number_of_points
-
-            # Wavefront on mirror surface
-            mir_x, mir_y = elliptic_mirror.GetXY_MeasuredMirror(number_of_points, 0)
-            residuals = elliptic_mirror.LastResidualUsed
-
-            mir_s = Rayman.xy_to_s(mir_x, mir_y)
-            mir_E = source.EvalField_XYLab(mir_x, mir_y)
+            mir_x, mir_y, mir_s, mir_E, residuals, number_of_points = self.get_mirror_field(source,
+                                                                                            elliptic_mirror,
+                                                                                            numerical_integration_parameters)
 
         elif parameters.propagation_type == WisePropagationParameters.DETECTOR_ONLY:
             mir_x = parameters.wavefront.positions_x
@@ -172,24 +298,52 @@ class HuygensIntegralPropagator(AbstractWisePropagator):
         if parameters.propagation_type == WisePropagationParameters.DETECTOR_ONLY or \
             parameters.propagation_type == WisePropagationParameters.MIRROR_AND_DETECTOR:
             # wave front at F2
-            det_x, det_y = elliptic_mirror.GetXY_TransversePlaneAtF2(numerical_integration_parameters.detector_size,
-                                                                     number_of_points,
-                                                                     parameters.defocus_sweep)
-
-            det_s = Rayman.xy_to_s(det_x, det_y)
-
-            electric_fields = Rayman.HuygensIntegral_1d_MultiPool(source.Lambda,
-                                                                  mir_E,
-                                                                  mir_x,
-                                                                  mir_y,
-                                                                  det_x,
-                                                                  det_y,
-                                                                  int(parameters.n_pools))
-            try:
-                hew = Rayman.HalfEnergyWidth_1d(abs(electric_fields)**2, Step = numpy.mean(numpy.diff(det_s)))
-            except ValueError as error:
-                if "cannot convert float NaN to integer" in str(error):
-                    raise Exception("Inconsistent source parameters.\nMaybe " + "\u0394" + "Theta is too big.")
+            # an array of defocus values gives one detector plane per value, sharing the same mirror wavefront
+            is_sweep = numpy.ndim(parameters.defocus_sweep) > 0
+            defocus_list = numpy.atleast_1d(parameters.defocus_sweep)
+
+            with profile_stage("SamplingCalculator"):
+                detector_number_of_points = get_detector_number_of_points(source.Lambda, elliptic_mirror, mir_x, mir_y, numerical_integration_parameters)
+
+            det_x = []
+            det_y = []
+            det_s = []
+
+            with profile_stage("GetXY_TransversePlaneAtF2"):
+                for defocus in defocus_list:
+                    det_x_i, det_y_i = elliptic_mirror.GetXY_TransversePlaneAtF2(numerical_integration_parameters.detector_size,
+                                                                                 detector_number_of_points,
+                                                                                 defocus)
+                    det_x.append(det_x_i)
+                    det_y.append(det_y_i)
+                    det_s.append(Rayman.xy_to_s(det_x_i, det_y_i))
+
+            det_x = numpy.array(det_x)
+            det_y = numpy.array(det_y)
+            det_s = numpy.array(det_s)
+
+            # all the planes are computed within a single integral.
+            # With n_pools > 0 the cpu time of the workers is not included: see the statistics of the worker pool
+            with profile_stage("Huygens"):
+                electric_fields = self.huygens_integral(source.Lambda,
+                                                        mir_E,
+                                                        mir_x,
+                                                        mir_y,
+                                                        det_x.flatten(),
+                                                        det_y.flatten(),
+                                                        parameters).reshape(det_x.shape)
+
+            with profile_stage("FocalMetrics"):
+                metrics = self.focal_metrics(source.Lambda, mir_x, mir_y, det_x, det_y, det_s, electric_fields)
+                hew = metrics.HEW
+
+            if not is_sweep:
+                det_x = det_x[0]
+                det_y = det_y[0]
+                det_s = det_s[0]
+                electric_fields = electric_fields[0]
+                hew = hew[0]
+                metrics = metrics[0]
 
             return HuygensIntegralPropagationOutput(mir_x,
                                                     mir_y,
@@ -201,7 +355,9 @@ class HuygensIntegralPropagator(AbstractWisePropagator):
                                                     det_y,
                                                     det_s,
                                                     electric_fields,
-                                                    hew)
+                                                    hew,
+                                                    metrics=metrics,
+                                                    detector_number_of_points=detector_number_of_points)
         else:
             return HuygensIntegralPropagationOutput(mir_x,
                                                     mir_y,
@@ -215,6 +371,277 @@ class HuygensIntegralPropagator(AbstractWisePropagator):
                                                     None,
                                                     None)
 
+    def get_mirror_field(self, source, elliptic_mirror, numerical_integration_parameters):
+        mirror_field_cache = WisePropagatorsChain.Instance().get_mirror_field_cache()
+
+        with profile_stage("MirrorFieldCache"):
+            try:
+                key = get_mirror_field_key(source, elliptic_mirror, numerical_integration_parameters)
+            except WiseHashError:
+                # source or mirror that can't be identified by a key: always recalculated, never cached
+                return self.calculate_mirror_field(source, elliptic_mirror, numerical_integration_parameters)
+
+            mirror_field = mirror_field_cache.get(key)
+
+        if mirror_field is None:
+            mirror_field = self.calculate_mirror_field(source, elliptic_mirror, numerical_integration_parameters)
+
+            mirror_field_cache.put(key, mirror_field)
+
+            # the calculation could have changed the internal state of the mirror: downstream widgets will look for it
+            try:
+                key_after_calculation = get_mirror_field_key(source, elliptic_mirror, numerical_integration_parameters)
+                if key_after_calculation != key: mirror_field_cache.put(key_after_calculation, mirror_field)
+            except WiseHashError:
+                pass
+
+        return mirror_field
+
+    def calculate_mirror_field(self, source, elliptic_mirror, numerical_integration_parameters):
+        with profile_stage("SamplingCalculator"):
+            number_of_points = get_mirror_number_of_points(source.Lambda, elliptic_mirror, numerical_integration_parameters)
+
+        # Wavefront on mirror surface
+        with profile_stage("GetXY_MeasuredMirror"):
+            mir_x, mir_y = elliptic_mirror.GetXY_MeasuredMirror(number_of_points, 0)
+            residuals = elliptic_mirror.LastResidualUsed
+
+            mir_s = Rayman.xy_to_s(mir_x, mir_y)
+
+        with profile_stage("EvalField_XYLab"):
+            mir_E = source.EvalField_XYLab(mir_x, mir_y)
+
+        return mir_x, mir_y, mir_s, mir_E, residuals, number_of_points
+
+    #
+    # HEW from Rayman.HalfEnergyWidth_1d, plane by plane. The other metrics for all the planes at once, on the actual
+    # detector positions (non uniform spacing included). Planes not finite or with no energy are rejected before
+    # Rayman sees them
+    #
+    def focal_metrics(self, wavelength, mir_x, mir_y, det_x, det_y, det_s, electric_fields):
+        det_s = numpy.atleast_2d(det_s)
+        intensities = numpy.atleast_2d(get_intensities(electric_fields))
+
+        with numpy.errstate(invalid="ignore"):
+            integrated_intensities = get_integrated_intensities(det_s, intensities)
+
+        if not numpy.all(numpy.isfinite(integrated_intensities) & (integrated_intensities > 0)):
+            raise Exception("Inconsistent source parameters.\nMaybe " + "\u0394" + "Theta is too big.")
+
+        hews = numpy.array([self.half_energy_width(intensities[i], det_s[i]) for i in range(len(intensities))])
+
+        return get_focal_metrics(det_s,
+                                 intensities,
+                                 references=get_diffraction_limited_references(wavelength, mir_x, mir_y, det_x, det_y),
+                                 hews=hews)
+
+    def half_energy_width(self, intensities, det_s):
+        return Rayman.HalfEnergyWidth_1d(intensities, Step = numpy.mean(numpy.diff(det_s)))
+
+    def huygens_integral(self, wavelength, mir_E, mir_x, mir_y, det_x, det_y, parameters):
+        return huygens_integral(wavelength, mir_E, mir_x, mir_y, det_x, det_y, parameters.n_pools)
+
+TASKS_PER_PROCESS = 4
+
+#
+# with n_pools > 0 the integral runs on the persistent worker pool of the chain (also used by sources evaluating
+# their field from samples, see WofryWavefrontSource_1d)
+#
+def huygens_integral(wavelength, mir_E, mir_x, mir_y, det_x, det_y, n_pools=0):
+    n_pools = int(n_pools)
+
+    if n_pools <= 0:
+        return _rayman_huygens_integral(wavelength, mir_E, mir_x, mir_y, det_x, det_y)
+    else:
+        # detector points are split among the processes of the persistent pool of the chain, sized by its users
+        # (see WisePropagatorsChain.set_n_pools): here only if nobody did
+        worker_pool = WisePropagatorsChain.Instance().get_worker_pool()
+        if worker_pool.get_n_pools() <= 0: worker_pool.set_n_pools(n_pools)
+
+        # a larger pool runs at most n_pools tasks at once: one task per process
+        if n_pools < worker_pool.get_n_pools(): number_of_tasks = n_pools
+        else: number_of_tasks = worker_pool.get_n_pools()*TASKS_PER_PROCESS
+
+        detector_slices = numpy.array_split(numpy.arange(len(det_x)), min(len(det_x), number_of_tasks))
+
+        # arrays are published once on shared memory: the tasks carry only descriptors and slice bounds
+        input_arrays = [WiseSharedArray.from_array(array) for array in (mir_E, mir_x, mir_y, det_x, det_y)]
+        output_array = WiseSharedArray((len(det_x),), complex)
+
+        try:
+            input_descriptors = [input_array.get_descriptor() for input_array in input_arrays]
+            output_descriptor = output_array.get_descriptor()
+
+            worker_pool.map(_rayman_huygens_integral_on_shared_memory,
+                            [(wavelength, input_descriptors, output_descriptor, detector_slice[0], detector_slice[-1] + 1) for detector_slice in detector_slices])
+
+            electric_fields = output_array.array.copy()
+        finally:
+            for shared_array in input_arrays + [output_array]: shared_array.release()
+
+        return electric_fields
+
+#
+# the wavefront on the mirror depends on source, mirror (shape, figure error, roughness) and sampling only
+#
+def get_mirror_number_of_points(wavelength, elliptic_mirror, numerical_integration_parameters):
+    if numerical_integration_parameters.calculation_type == WiseNumericalIntegrationParameters.AUTOMATIC:
+        theta_0 = elliptic_mirror.pTan_Angle
+        theta_1 = numpy.arctan(-1/elliptic_mirror.p2[0])
+
+        return Rayman.SamplingCalculator(wavelength,
+                                         elliptic_mirror.f2,
+                                         elliptic_mirror.L,
+                                         numerical_integration_parameters.detector_size,
+                                         theta_0,
+                                         theta_1)
+    else:
+        return numerical_integration_parameters.number_of_points
+
+# detector points per diffraction limited spot (lambda/delta_theta, delta_theta: aperture of the mirror seen from F2):
+# aberrations and defocus spread the intensity, but its finest structures stay on the same scale
+DETECTOR_POINTS_PER_SPOT = 4
+MIN_DETECTOR_NUMBER_OF_POINTS = 65
+
+#
+# the cost of the integral is mirror points x detector points: the detector is sampled from the expected spot size,
+# never with more points than the mirror (the sampling used before the two were separated)
+#
+def get_detector_number_of_points(wavelength, elliptic_mirror, mir_x, mir_y, numerical_integration_parameters):
+    if numerical_integration_parameters.detector_number_of_points > 0:
+        return int(numerical_integration_parameters.detector_number_of_points)
+
+    spot_size = 1/get_diffraction_limited_references(wavelength, mir_x, mir_y, [[elliptic_mirror.XYF2[0]]], [[elliptic_mirror.XYF2[1]]])[0]
+
+    number_of_points = int(numpy.ceil(DETECTOR_POINTS_PER_SPOT*numerical_integration_parameters.detector_size/spot_size)) | 1 # odd: a point on F2
+
+    return int(min(len(mir_x), max(MIN_DETECTOR_NUMBER_OF_POINTS, number_of_points)))
+
+def get_mirror_field_key(source, elliptic_mirror, numerical_integration_parameters):
+    if numerical_integration_parameters.calculation_type == WiseNumericalIntegrationParameters.AUTOMATIC:
+        sampling = (WiseNumericalIntegrationParameters.AUTOMATIC, float(numerical_integration_parameters.detector_size))
+    else:
+        sampling = (WiseNumericalIntegrationParameters.USER_DEFINED, int(numerical_integration_parameters.number_of_points))
+
+    return get_hash("mirror_field",
+                    source,
+                    (elliptic_mirror.f1, elliptic_mirror.f2, elliptic_mirror.Alpha, elliptic_mirror.L),
+                    elliptic_mirror,
+                    sampling)
+
+def _rayman_huygens_integral(wavelength, mir_E, mir_x, mir_y, det_x, det_y):
+    return Rayman.HuygensIntegral_1d_MultiPool(wavelength,
+                                               mir_E,
+                                               mir_x,
+                                               mir_y,
+                                               det_x,
+                                               det_y,
+                                               0)
+
+def _rayman_huygens_integral_on_shared_memory(wavelength, input_descriptors, output_descriptor, start, end):
+    input_arrays = [WiseSharedArray.attach(input_descriptor) for input_descriptor in input_descriptors]
+    output_array = WiseSharedArray.attach(output_descriptor)
+
+    try:
+        mir_E, mir_x, mir_y, det_x, det_y = [input_array.array for input_array in input_arrays]
+
+        output_array.array[start:end] = _rayman_huygens_integral(wavelength, mir_E, mir_x, mir_y, det_x[start:end], det_y[start:end])
+    finally:
+        mir_E = mir_x = mir_y = det_x = det_y = None
+
+        for shared_array in input_arrays + [output_array]: shared_array.release()
+
+from orangecontrib.wise.util.wise_huygens import huygens_integral_1d, get_precision_errors, DEFAULT_MAX_MEMORY
+
+class VectorizedHuygensIntegralPropagator(HuygensIntegralPropagator):
+
+    def __init__(self, max_memory=DEFAULT_MAX_MEMORY):
+        super().__init__()
+
+        self.max_memory = max_memory
+
+    def get_algorithm(self):
+        return WisePropagationAlgorithms.VectorizedHuygensIntegral
+
+    def huygens_integral(self, wavelength, mir_E, mir_x, mir_y, det_x, det_y, parameters):
+        return huygens_integral_1d(wavelength,
+                                   mir_E,
+                                   mir_x,
+                                   mir_y,
+                                   det_x,
+                                   det_y,
+                                   max_memory=self.max_memory)
+
+# relative difference of HEW and integrated intensity from double precision above which the integral is recalculated in double precision
+DEFAULT_PRECISION_TOLERANCE = 1e-3
+
+#
+# outcome of the precision check of a mixed precision integral (see get_precision_errors)
+#
+class WisePrecisionCheck(object):
+    def __init__(self, precision_errors, tolerance, recalculated_in_double_precision):
+        self.precision_errors = precision_errors
+        self.tolerance = tolerance
+        self.recalculated_in_double_precision = recalculated_in_double_precision
+
+    def __str__(self):
+        return "Mixed precision Huygens integral: HEW error " + str(self.precision_errors[0]) + \
+               ", integrated intensity error " + str(self.precision_errors[1]) + \
+               (", recalculated in double precision" if self.recalculated_in_double_precision else " (tolerance " + str(self.tolerance) + ")")
+
+class MixedPrecisionHuygensIntegralPropagator(VectorizedHuygensIntegralPropagator):
+
+    def __init__(self, max_memory=DEFAULT_MAX_MEMORY, tolerance=DEFAULT_PRECISION_TOLERANCE):
+        super().__init__(max_memory)
+
+        self.tolerance = tolerance
+
+        self.number_of_integrals = 0
+        self.number_of_fallbacks = 0
+        self.last_precision_errors = None
+        self.last_precision_check = None
+
+    def get_algorithm(self):
+        return WisePropagationAlgorithms.MixedPrecisionHuygensIntegral
+
+    def calculate_propagation(self, parameters):
+        self.last_precision_check = None
+
+        propagation_output = super().calculate_propagation(parameters)
+        propagation_output.precision_check = self.last_precision_check
+
+        return propagation_output
+
+    def huygens_integral(self, wavelength, mir_E, mir_x, mir_y, det_x, det_y, parameters):
+        electric_fields = huygens_integral_1d(wavelength,
+                                              mir_E,
+                                              mir_x,
+                                              mir_y,
+                                              det_x,
+                                              det_y,
+                                              max_memory=self.max_memory,
+                                              single_precision=True)
+
+        # batched defocus sweeps: every plane is checked on its own
+        number_of_planes = numpy.size(parameters.defocus_sweep)
+
+        with profile_stage("PrecisionCheck"):
+            self.last_precision_errors = get_precision_errors(wavelength, mir_E, mir_x, mir_y, det_x, det_y, electric_fields, self.max_memory, number_of_planes)
+
+        self.number_of_integrals += 1
+
+        # nan errors (no intensity, undefined HEW) can't validate the single precision result: recalculated as well
+        recalculated_in_double_precision = not all([error <= self.tolerance for error in self.last_precision_errors])
+
+        if recalculated_in_double_precision:
+            self.number_of_fallbacks += 1
+
+            electric_fields = super().huygens_integral(wavelength, mir_E, mir_x, mir_y, det_x, det_y, parameters)
+
+        self.last_precision_check = WisePrecisionCheck(self.last_precision_errors, self.tolerance, recalculated_in_double_precision)
+
+        return electric_fields
+
 if __name__ == "__main__":
 
     chain1 = WisePropagatorsChain.Instance()
@@ -0,0 +1,369 @@
+import os, sys, time, copy, json
+import numpy
+from collections import OrderedDict
+
+from orangecontrib.wise.util.wise_pool import WiseWorkerPool
+from orangecontrib.wise.util.wise_pipeline import create_beamline, get_mirror_sampling, propagate_to_mirror, propagate_to_detector, \
+    load_beamline_description, _get_calculation_type
+from orangecontrib.wise.util.wise_propagator import WisePropagationAlgorithms
+from orangecontrib.wise.util.wise_trace import start_tracing, stop_tracing
+from orangecontrib.wise.util.wise_metrics import METRICS
+
+###################################################################
+# PARAMETER SCAN: every point of the grid overrides the corresponding
+# entry of a beamline description (see wise_pipeline)
+###################################################################
+
+SCAN_PARAMETERS = OrderedDict([("alpha",                   "mirror"),
+                               ("f1",                      "mirror"),
+                               ("f2",                      "mirror"),
+                               ("length",                  "mirror"),
+                               ("longitudinal_correction", "source"),
+                               ("transverse_correction",   "source"),
+                               ("delta_theta",             "source"),
+                               ("defocus",                 "detector")])
+
+# parameters that don't change the field on the mirror: points differing only by these share one mirror propagation
+DETECTOR_PARAMETERS = ("defocus",)
+
+PENDING = 0
+DONE    = 1
+FAILED  = -1
+
+def _check_parameter_names(parameter_names):
+    for name in parameter_names:
+        if not name in SCAN_PARAMETERS: raise ValueError("Scan parameter not recognized: " + str(name) + " (allowed: " + ", ".join(SCAN_PARAMETERS.keys()) + ")")
+
+def cartesian_grid(parameters):
+    parameter_names = list(parameters.keys())
+    _check_parameter_names(parameter_names)
+
+    # detector parameters vary fastest: consecutive points share the mirror field
+    parameter_names = [name for name in parameter_names if not name in DETECTOR_PARAMETERS] + \
+                      [name for name in parameter_names if name in DETECTOR_PARAMETERS]
+
+    meshes = numpy.meshgrid(*[numpy.atleast_1d(numpy.asarray(parameters[name], dtype=float)) for name in parameter_names], indexing="ij")
+
+    grid = numpy.zeros(meshes[0].size, dtype=[(name, float) for name in parameter_names])
+    for name, mesh in zip(parameter_names, meshes): grid[name] = mesh.ravel()
+
+    return grid
+
+def latin_hypercube_grid(bounds, number_of_points, seed=0):
+    parameter_names = list(bounds.keys())
+    _check_parameter_names(parameter_names)
+
+    if number_of_points <= 0: raise ValueError("Number of points must be > 0")
+
+    random_generator = numpy.random.default_rng(seed)
+
+    grid = numpy.zeros(number_of_points, dtype=[(name, float) for name in parameter_names])
+
+    # one point per stratum on every axis, strata randomly paired across axes
+    for name in parameter_names:
+        minimum, maximum = float(bounds[name][0]), float(bounds[name][1])
+
+        if minimum > maximum: raise ValueError("Scan parameter " + name + ": minimum must be <= maximum")
+
+        grid[name] = minimum + (maximum - minimum)*(random_generator.permutation(number_of_points) + random_generator.random(number_of_points))/number_of_points
+
+    return grid
+
+def get_grid(scan_description):
+    mode = scan_description.get("mode", "cartesian")
+
+    if mode == "cartesian":
+        parameters = OrderedDict()
+
+        for name, values in scan_description["parameters"].items():
+            if isinstance(values, dict):
+                parameters[name] = numpy.linspace(float(values["start"]), float(values["stop"]), int(values["points"]))
+            else:
+                parameters[name] = values
+
+        return cartesian_grid(parameters)
+    elif mode == "latin_hypercube":
+        return latin_hypercube_grid(OrderedDict(scan_description["parameters"]),
+                                    int(scan_description["number_of_points"]),
+                                    int(scan_description.get("seed", 0)))
+    else:
+        raise ValueError("Scan mode not recognized: " + str(mode))
+
+def get_table_dtype(parameter_names):
+    return numpy.dtype([(name, numpy.float64) for name in parameter_names] +
+                       [(name, numpy.float64) for name in METRICS] +
+                       [("mirror_number_of_points", numpy.int64),
+                        ("detector_number_of_points", numpy.int64),
+                        ("time", numpy.float64),
+                        ("status", numpy.int8)])
+
+#
+# one row per scan point, preallocated on disk and written as soon as a point is completed:
+# .npy files are opened as memory maps, .h5/.hdf5 files as HDF5 datasets (h5py required).
+# An existing table with the same grid is reopened and only the points not DONE are calculated again
+#
+class WiseScanTable(object):
+    DATASET_NAME = "scan"
+
+    def __init__(self, file_name, grid):
+        self.file_name = file_name
+        self.parameter_names = list(grid.dtype.names)
+        self.dtype = get_table_dtype(self.parameter_names)
+
+        self._is_hdf5 = file_name.lower().endswith((".h5", ".hdf5"))
+        self._h5_file = None
+
+        if os.path.exists(file_name):
+            self._open()
+
+            existing_grid = self.to_array()
+
+            if existing_grid.dtype != self.dtype or len(self.rows) != len(grid) or \
+               not all([numpy.array_equal(existing_grid[name], grid[name]) for name in self.parameter_names]):
+                self.close()
+                raise ValueError("Existing scan table " + file_name + " doesn't match the scan grid: remove it or change the file name")
+        else:
+            self._create(grid)
+
+    def _create(self, grid):
+        directory = os.path.dirname(os.path.abspath(self.file_name))
+        if not os.path.exists(directory): os.makedirs(directory)
+
+        rows = numpy.zeros(len(grid), dtype=self.dtype)
+        for name in self.parameter_names: rows[name] = grid[name]
+        for name in METRICS: rows[name] = numpy.nan
+        rows["status"] = PENDING
+
+        if self._is_hdf5:
+            import h5py
+
+            self._h5_file = h5py.File(self.file_name, "w")
+            self.rows = self._h5_file.create_dataset(WiseScanTable.DATASET_NAME, data=rows)
+            self._h5_file.flush()
+        else:
+            self.rows = numpy.lib.format.open_memmap(self.file_name, mode="w+", dtype=self.dtype, shape=(len(grid),))
+            self.rows[:] = rows
+            self.rows.flush()
+
+    def _open(self):
+        if self._is_hdf5:
+            import h5py
+
+            self._h5_file = h5py.File(self.file_name, "r+")
+            self.rows = self._h5_file[WiseScanTable.DATASET_NAME]
+        else:
+            self.rows = numpy.load(self.file_name, mmap_mode="r+")
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get_pending_indexes(self):
+        return numpy.where(numpy.asarray(self.rows["status"]) != DONE)[0]
+
+    # metrics: name -> value, see wise_metrics.METRICS (None: not calculated)
+    def write(self, index, metrics, mirror_number_of_points, detector_number_of_points, time, status):
+        row = numpy.array(self.rows[index], dtype=self.dtype)
+        for name in METRICS: row[name] = numpy.nan if metrics is None else metrics[name]
+        row["mirror_number_of_points"] = mirror_number_of_points
+        row["detector_number_of_points"] = detector_number_of_points
+        row["time"] = time
+        row["status"] = status
+
+        self.rows[index] = row
+
+    def flush(self):
+        if self._is_hdf5: self._h5_file.flush()
+        else: self.rows.flush()
+
+    def to_array(self):
+        return numpy.array(self.rows[()])
+
+    def close(self):
+        if self._is_hdf5:
+            if not self._h5_file is None:
+                self._h5_file.close()
+                self._h5_file = None
+        else:
+            self.rows.flush()
+
+        self.rows = None
+
+def _apply_parameters(description, point):
+    description = copy.deepcopy(description)
+    description.setdefault("detector", {})
+
+    for name, value in point.items():
+        description[SCAN_PARAMETERS[name]][name] = float(value)
+
+    return description
+
+def _get_mirror_parameters(point):
+    return tuple([(name, value) for name, value in point.items() if not name in DETECTOR_PARAMETERS])
+
+#
+# points sharing the mirror parameters are grouped in the same task, so that the mirror field is calculated once
+# and all their detector planes are propagated in a single call. Groups are split to have enough tasks for all the processes
+#
+def get_scan_tasks(grid, indexes, number_of_processes=1, max_points_per_task=10):
+    groups = OrderedDict()
+
+    for index in indexes:
+        point = OrderedDict([(name, float(grid[name][index])) for name in grid.dtype.names])
+
+        groups.setdefault(_get_mirror_parameters(point), []).append((int(index), point))
+
+    points_per_task = max(1, min(int(max_points_per_task), int(numpy.ceil(len(indexes)/max(1, 4*number_of_processes)))))
+
+    tasks = []
+    for group in groups.values():
+        for start in range(0, len(group), points_per_task):
+            tasks.append(group[start:start + points_per_task])
+
+    return tasks
+
+def _run_scan_task(description, task):
+    indexes = [index for index, _ in task]
+
+    try:
+        t0 = time.perf_counter()
+
+        point_description = _apply_parameters(description, task[0][1])
+
+        detector_description    = point_description["detector"]
+        calculation_description = point_description.get("calculation", {})
+        algorithm               = calculation_description.get("algorithm", WisePropagationAlgorithms.HuygensIntegral)
+
+        source, elliptic_mirror = create_beamline(point_description)
+
+        wise_output, mirror_output = propagate_to_mirror(source, elliptic_mirror, algorithm=algorithm, **get_mirror_sampling(point_description["mirror"]))
+
+        defocus_list = numpy.array([point.get("defocus", float(detector_description.get("defocus", 0.0))) for _, point in task])
+
+        # worker processes can't open pools of their own: the detector integral runs single process
+        detector_output = propagate_to_detector(wise_output,
+                                                float(detector_description.get("detector_size", 50e-6)),
+                                                defocus_list,
+                                                calculation_type=_get_calculation_type(detector_description),
+                                                number_of_points=int(detector_description.get("number_of_points", 0)),
+                                                n_pools=0,
+                                                algorithm=algorithm,
+                                                detector_number_of_points=int(detector_description.get("detector_number_of_points", 0)))
+
+        elapsed_time = (time.perf_counter() - t0)/len(task)
+
+        return [(index,
+                 {name: float(value) for name, value in detector_output.metrics[i].to_dict().items()},
+                 int(mirror_output.number_of_points),
+                 int(len(detector_output.det_s[i])),
+                 elapsed_time,
+                 DONE) for i, index in enumerate(indexes)], None
+    except Exception as exception:
+        return [(index, None, 0, 0, 0.0, FAILED) for index in indexes], str(exception)
+
+def run_scan(description, grid, table_file_name, number_of_processes=None, max_points_per_task=10, progress_callback=None, keep_running=None):
+    if number_of_processes is None: number_of_processes = os.cpu_count() or 1
+
+    table = WiseScanTable(table_file_name, grid)
+
+    try:
+        pending_indexes = table.get_pending_indexes()
+        number_of_points = len(table)
+        number_of_completed_points = number_of_points - len(pending_indexes)
+
+        if len(pending_indexes) == 0: return table.to_array()
+
+        tasks = get_scan_tasks(grid, pending_indexes, number_of_processes, max_points_per_task)
+
+        if number_of_processes <= 1:
+            results = (_run_scan_task(description, task) for task in tasks)
+            worker_pool = None
+        else:
+            worker_pool = WiseWorkerPool(min(number_of_processes, len(tasks)))
+            results = worker_pool.imap_unordered(_run_scan_task, [(description, task) for task in tasks])
+
+        completed = False
+
+        try:
+            for rows, error in results:
+                for row in rows: table.write(*row)
+                table.flush()
+
+                if not error is None: print("Scan points " + str([row[0] for row in rows]) + " failed: " + error, file=sys.stderr)
+
+                number_of_completed_points += len(rows)
+
+                if not progress_callback is None: progress_callback(number_of_completed_points, number_of_points)
+                if not keep_running is None and not keep_running(): break
+            else:
+                completed = True
+        finally:
+            if not worker_pool is None:
+                results.close() # releases the pool
+                worker_pool.shutdown(wait=completed) # interrupted: the points not written stay PENDING for the next run
+
+                print(worker_pool.statistics)
+
+        return table.to_array()
+    finally:
+        table.close()
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a WISE parameter scan without GUI. The beamline description must contain a 'scan' section:\n" +
+                                                 "scan: {mode: cartesian, parameters: {alpha: [1.9, 2.0, 2.1], defocus: {start: -1.0e-3, stop: 1.0e-3, points: 21}}}\n" +
+                                                 "scan: {mode: latin_hypercube, number_of_points: 1000, seed: 0, parameters: {f2: [1.1, 1.3], delta_theta: [-0.01, 0.01]}}",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("beamline", help="beamline description file (.yaml, .yml or .json)")
+    parser.add_argument("-o", "--output", default="scan.npy", help="scan table, .npy or .h5 (default: scan.npy). An existing table is resumed")
+    parser.add_argument("-n", "--number-of-processes", type=int, default=None, help="parallel processes (default: number of CPUs)")
+    parser.add_argument("--trace", default=None, help="write a timeline of the run in Chrome trace format (.json)")
+
+    arguments = parser.parse_args(argv)
+
+    def print_progress(number_of_completed_points, number_of_points):
+        print("Scan: " + str(number_of_completed_points) + "/" + str(number_of_points) + " points")
+
+    if not arguments.trace is None: start_tracing(arguments.trace)
+
+    try:
+        description = load_beamline_description(arguments.beamline)
+
+        if not "scan" in description: raise ValueError("No 'scan' section in the beamline description")
+
+        t0 = time.perf_counter()
+
+        grid = get_grid(description["scan"])
+
+        table = run_scan(description,
+                         grid,
+                         arguments.output,
+                         number_of_processes=arguments.number_of_processes,
+                         progress_callback=print_progress)
+
+        done = table["status"] == DONE
+
+        summary = {"number_of_points": int(len(table)),
+                   "completed_points": int(numpy.count_nonzero(done)),
+                   "failed_points": int(numpy.count_nonzero(table["status"] == FAILED)),
+                   "time": time.perf_counter() - t0}
+
+        if numpy.any(done):
+            index_min = numpy.where(done)[0][numpy.argmin(table["HEW"][done])]
+
+            summary["best_point"] = OrderedDict([(name, float(table[name][index_min])) for name in grid.dtype.names])
+            summary["best_HEW"] = float(table["HEW"][index_min])
+            summary["best_metrics"] = OrderedDict([(name, float(table[name][index_min])) for name in METRICS])
+
+        print(json.dumps(summary, indent=4))
+    except Exception as exception:
+        print("Error: " + str(exception), file=sys.stderr)
+
+        return 1
+    finally:
+        if not arguments.trace is None: stop_tracing()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
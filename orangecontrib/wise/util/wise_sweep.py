@@ -0,0 +1,218 @@
+import os, shutil, tempfile
+import numpy
+
+from orangecontrib.wise.util.wise_metrics import METRICS, WiseFocalMetrics, get_intensities, get_focal_metrics
+
+def get_best_focus_index(hews):
+    hews = numpy.asarray(hews, dtype=float)
+
+    # problems with double precision numbers: inconsistent comparisons
+    rounded_hews = numpy.round(hews*1e6, 11)
+    index_min_list = numpy.where(rounded_hews == numpy.nanmin(rounded_hews))[0]
+
+    return int(index_min_list[int(len(index_min_list)/2)]) # choosing the central value, when hew reach a plateau
+
+#
+# planes of a defocus sweep: (n_defocus, N) arrays allocated once, at the first plane received (N is known only
+# after the first propagation, with automatic sampling). With memory_mapped=True the planes live in .npy files
+# in directory (a temporary one, removed by release(), if not given).
+# Indexing with a slice or an array of indexes returns a sweep on views/copies of the selected planes
+#
+class WiseSweepResult(object):
+    def __init__(self, defocus_list, memory_mapped=False, directory=None):
+        self.defocus_list = numpy.array(defocus_list, dtype=float)
+        self.hews = numpy.full(len(self.defocus_list), numpy.nan)
+        self.computed = numpy.zeros(len(self.defocus_list), dtype=bool)
+        self.metrics = WiseFocalMetrics(**{name: numpy.full(len(self.defocus_list), numpy.nan) for name in METRICS})
+
+        self.positions = None
+        self.electric_fields = None
+
+        self._memory_mapped = memory_mapped
+        self._directory = directory
+        self._temporary_directory = None
+
+    def __len__(self):
+        return len(self.defocus_list)
+
+    def get_number_of_points(self):
+        return 0 if self.positions is None else self.positions.shape[1]
+
+    def is_memory_mapped(self):
+        return self._memory_mapped
+
+    def _allocate(self, number_of_points):
+        shape = (len(self.defocus_list), number_of_points)
+
+        if self._memory_mapped:
+            if self._directory is None:
+                self._temporary_directory = tempfile.mkdtemp(prefix="wise_sweep_")
+                directory = self._temporary_directory
+            else:
+                directory = self._directory
+                if not os.path.exists(directory): os.makedirs(directory)
+
+            self.positions = numpy.lib.format.open_memmap(os.path.join(directory, "positions.npy"), mode="w+", dtype=float, shape=shape)
+            self.electric_fields = numpy.lib.format.open_memmap(os.path.join(directory, "electric_fields.npy"), mode="w+", dtype=complex, shape=shape)
+        else:
+            self.positions = numpy.empty(shape, dtype=float)
+            self.electric_fields = numpy.empty(shape, dtype=complex)
+
+    # metrics: WiseFocalMetrics of the planes, as calculated by the propagation
+    def set_planes(self, indexes, positions, electric_fields, hews, metrics=None):
+        positions = numpy.atleast_2d(positions)
+        electric_fields = numpy.atleast_2d(electric_fields)
+
+        if self.positions is None: self._allocate(positions.shape[1])
+
+        if positions.shape[1] != self.get_number_of_points():
+            raise ValueError("Planes with different number of points: " + str(positions.shape[1]) + " != " + str(self.get_number_of_points()))
+
+        self.positions[indexes] = positions
+        self.electric_fields[indexes] = electric_fields
+        self.hews[indexes] = hews
+        self.computed[indexes] = True
+
+        if not metrics is None:
+            for name in METRICS: getattr(self.metrics, name)[indexes] = getattr(metrics, name)
+
+    def get_plane(self, index):
+        return self.defocus_list[index], self.positions[index], self.electric_fields[index], self.hews[index]
+
+    def __getitem__(self, indexes):
+        sweep_result = WiseSweepResult(self.defocus_list[indexes])
+        sweep_result.hews = self.hews[indexes]
+        sweep_result.computed = self.computed[indexes]
+        sweep_result.metrics = self.metrics[indexes]
+
+        if not self.positions is None:
+            sweep_result.positions = self.positions[indexes]
+            sweep_result.electric_fields = self.electric_fields[indexes]
+
+        return sweep_result
+
+    def is_complete(self):
+        return numpy.all(self.computed)
+
+    ###################################################################
+    # reductions over all the planes
+
+    def get_intensities(self):
+        return get_intensities(self.electric_fields)
+
+    def get_peak_intensities(self):
+        return numpy.max(self.get_intensities(), axis=1)
+
+    def get_integrated_intensities(self):
+        return get_focal_metrics(self.positions, self.get_intensities()).integrated_intensity
+
+    # all the metrics recalculated from the stored planes (e.g. planes set without metrics), HEW as calculated by the propagation
+    def get_focal_metrics(self):
+        return get_focal_metrics(self.positions, self.get_intensities(), hews=self.hews)
+
+    def get_best_focus_index(self):
+        return get_best_focus_index(numpy.where(self.computed, self.hews, numpy.nan))
+
+    def release(self):
+        self.positions = None
+        self.electric_fields = None
+
+        if not self._temporary_directory is None:
+            shutil.rmtree(self._temporary_directory, ignore_errors=True)
+            self._temporary_directory = None
+
+    def get_caustic(self):
+        return WiseCaustic(self.defocus_list, self.positions, self.get_intensities(), hews=self.hews)
+
+###################################################################
+# CAUSTIC: intensity vs (defocus, transverse position) of a whole sweep
+###################################################################
+
+#
+# the full resolution image is kept: envelope and display images are computed once, on first request.
+# Display images are reduced to at most max_shape pixels by the maximum of each block (a narrow focus
+# doesn't disappear); non uniform defocus lists (golden section search) are shown on a uniform grid, each
+# column showing the nearest plane
+#
+class WiseCaustic(object):
+    def __init__(self, defocus_list, positions, intensities, hews=None):
+        self.defocus_list = numpy.asarray(defocus_list, dtype=float)
+        self.intensities = intensities
+        self.hews = hews
+
+        # planes on the same transverse grid (always, with the WISE detector): one axis for the whole image
+        if positions.ndim == 2 and numpy.allclose(positions, positions[0]):
+            self.positions = numpy.array(positions[0])
+        else:
+            self.positions = positions
+
+        self._envelope = None
+        self._display_images = {}
+
+    def has_common_positions(self):
+        return self.positions.ndim == 1
+
+    # WiseFocalMetrics of all the planes
+    def get_envelope(self):
+        if self._envelope is None: self._envelope = get_focal_metrics(self.positions, self.intensities, hews=self.hews)
+
+        return self._envelope
+
+    def _get_column_indexes(self, number_of_columns):
+        order = numpy.argsort(self.defocus_list)
+        defocus_list = self.defocus_list[order]
+
+        if len(defocus_list) < 2: return order, defocus_list
+
+        steps = numpy.diff(defocus_list)
+
+        if numpy.allclose(steps, steps[0]):
+            if len(defocus_list) <= number_of_columns: return order, defocus_list
+            number_of_columns = len(defocus_list)
+        else:
+            number_of_columns = int(min(number_of_columns, numpy.ceil((defocus_list[-1] - defocus_list[0])/numpy.min(steps[steps > 0])) + 1))
+
+        columns_defocus = numpy.linspace(defocus_list[0], defocus_list[-1], number_of_columns)
+        nearest = numpy.clip(numpy.searchsorted(defocus_list, columns_defocus), 1, len(defocus_list) - 1)
+        nearest -= (columns_defocus - defocus_list[nearest - 1]) < (defocus_list[nearest] - columns_defocus)
+
+        return order[nearest], columns_defocus
+
+    #
+    # returns image (rows: positions, columns: defocus), defocus of the columns and positions of the rows
+    # (interval centres of the blocks). Log scale: log10(I/max(I)), clipped at -decades
+    #
+    def get_display_image(self, max_shape=(1000, 1000), log_scale=False, decades=6):
+        key = (tuple(max_shape), bool(log_scale), decades)
+
+        if not key in self._display_images:
+            if not self.has_common_positions(): raise ValueError("Caustic image needs planes with the same transverse positions")
+
+            max_rows, max_columns = max_shape
+            number_of_points = len(self.positions)
+
+            row_starts = numpy.unique(numpy.linspace(0, number_of_points, min(number_of_points, max_rows) + 1).astype(int)[:-1])
+            image = numpy.maximum.reduceat(self.intensities, row_starts, axis=1)
+
+            column_indexes, columns_defocus = self._get_column_indexes(max_columns)
+            image = image[column_indexes]
+
+            if len(columns_defocus) > max_columns:
+                column_starts = numpy.unique(numpy.linspace(0, len(columns_defocus), max_columns + 1).astype(int)[:-1])
+                image = numpy.maximum.reduceat(image, column_starts, axis=0)
+                columns_defocus = numpy.add.reduceat(columns_defocus, column_starts)/numpy.diff(numpy.append(column_starts, len(columns_defocus)))
+
+            row_ends = numpy.append(row_starts[1:], number_of_points) - 1
+            rows_positions = (self.positions[row_starts] + self.positions[row_ends])/2
+
+            image = image.T
+
+            if log_scale:
+                maximum = numpy.max(image)
+                with numpy.errstate(divide="ignore"):
+                    image = numpy.log10(image/maximum) if maximum > 0 else numpy.zeros(image.shape)
+                numpy.maximum(image, -decades, out=image)
+
+            self._display_images[key] = (numpy.ascontiguousarray(image), columns_defocus, rows_positions)
+
+        return self._display_images[key]
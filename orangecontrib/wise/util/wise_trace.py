@@ -0,0 +1,128 @@
+import os, time, json, atexit, threading, functools, multiprocessing
+
+###################################################################
+# TIMELINE TRACE: begin/end events in the Chrome trace event format,
+# to be opened in chrome://tracing, ui.perfetto.dev or speedscope.
+#
+# Opt-in: start_tracing()/stop_tracing(), or the environment variable WISE_TRACE=<file.json>
+# (the trace is written at exit). Tasks of the worker pools record their events in the worker
+# process and send them back with the results: timestamps share the same monotonic clock
+###################################################################
+
+class WiseTracer(object):
+    def __init__(self):
+        self.enabled = False
+        self.file_name = None
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add_event(self, name, phase, category, args=None):
+        event = {"name": name,
+                 "cat": category,
+                 "ph": phase,
+                 "ts": time.perf_counter()*1e6, # microseconds
+                 "pid": os.getpid(),
+                 "tid": threading.get_native_id()}
+        if not args is None: event["args"] = args
+
+        with self._lock: self.events.append(event)
+
+    def add_events(self, events):
+        with self._lock: self.events.extend(events)
+
+    def take_events(self):
+        with self._lock:
+            events = self.events
+            self.events = []
+
+        return events
+
+_tracer = WiseTracer()
+
+def is_tracing():
+    return _tracer.enabled
+
+def start_tracing(file_name=None):
+    _tracer.take_events()
+    _tracer.file_name = file_name
+    _tracer.enabled = True
+
+    _add_process_name("WISE (main)")
+
+# returns the events, also written on file when a file name was given to start_tracing
+def stop_tracing():
+    if not _tracer.enabled: return []
+
+    _tracer.enabled = False
+    events = _tracer.take_events()
+
+    if not _tracer.file_name is None: write_trace(_tracer.file_name, events)
+
+    return events
+
+def write_trace(file_name, events):
+    with open(file_name, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+def add_events(events):
+    if _tracer.enabled and not events is None: _tracer.add_events(events)
+
+def _add_process_name(process_name):
+    _tracer.events.append({"name": "process_name", "ph": "M", "pid": os.getpid(), "tid": 0, "args": {"name": process_name}})
+
+def trace_begin(name, category="wise", args=None):
+    if _tracer.enabled: _tracer.add_event(name, "B", category, args)
+
+def trace_end(name, category="wise"):
+    if _tracer.enabled: _tracer.add_event(name, "E", category)
+
+class traced(object):
+    def __init__(self, name, category="wise", args=None):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        trace_begin(self.name, self.category, self.args)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        trace_end(self.name, self.category)
+
+        return False
+
+# decorator for methods of widgets (or any object with a name): the span is named <name>.<method>
+def traced_method(category="wise"):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not _tracer.enabled: return method(self, *args, **kwargs)
+
+            with traced(str(getattr(self, "name", type(self).__name__)) + "." + method.__name__, category):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+###################################################################
+# worker side: events of one task are collected and returned to the caller
+###################################################################
+
+_named_process = [None]
+
+def begin_task_capture():
+    _tracer.take_events() # forked workers inherit a copy of the events of the main process
+    _tracer.enabled = True
+
+    if _named_process[0] != os.getpid():
+        _add_process_name("WISE (worker " + str(os.getpid()) + ")")
+        _named_process[0] = os.getpid()
+
+def end_task_capture():
+    _tracer.enabled = False
+
+    return _tracer.take_events()
+
+if os.environ.get("WISE_TRACE", "").strip() != "" and multiprocessing.current_process().name == "MainProcess":
+    start_tracing(os.environ["WISE_TRACE"].strip())
+    atexit.register(stop_tracing)
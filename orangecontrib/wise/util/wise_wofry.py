@@ -0,0 +1,37 @@
+import numpy
+
+from wofry.propagator.wavefront1D.generic_wavefront import GenericWavefront1D
+
+###################################################################
+# WOFRY <-> WISE WAVEFRONT CONVERSIONS
+#
+# WOFRY widgets change the arrays of the wavefronts they receive, so they get writable arrays: copied once, or
+# handed over without copy when WISE doesn't need them anymore (transfer=True).
+# A WISE widget changing the field of a wavefront received builds a new wavefront (with_electric_field):
+# the wavefront of the sender is never modified.
+###################################################################
+
+# writable array for a consumer outside WISE: with transfer the array itself if possible
+def _as_writable(array, dtype, transfer=False):
+    if transfer and isinstance(array, numpy.ndarray) and array.dtype == dtype and array.flags.writeable:
+        return array
+    else:
+        return numpy.array(array, dtype=dtype)
+
+#
+# WISE -> WOFRY: positions must be uniformly spaced (GenericWavefront1D keeps only start and step).
+# transfer: the caller doesn't use electric_fields anymore, the wavefront can own it (copied if read-only)
+#
+def wise_to_wofry(wavelength, positions, electric_fields, transfer=False):
+    positions = numpy.asarray(positions, dtype=float) # only start and step are kept: never shared
+
+    return GenericWavefront1D.initialize_wavefront_from_arrays(x_array=positions,
+                                                               y_array=_as_writable(electric_fields, complex, transfer),
+                                                               wavelength=wavelength)
+
+#
+# new wavefront with the abscissas and wavelength of wavefront and a new field, owned by the new wavefront
+# (the caller doesn't use it anymore): the original one is unchanged
+#
+def with_electric_field(wavefront, electric_fields):
+    return wise_to_wofry(wavefront._wavelength, wavefront._electric_field_array.get_abscissas(), electric_fields, transfer=True)
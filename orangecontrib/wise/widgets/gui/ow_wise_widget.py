@@ -13,6 +13,7 @@ from oasys.util.oasys_util import EmittingStream
 
 from orangecontrib.wise.util.wise_util import WisePlot
 from orangecontrib.wise.util.wise_objects import WiseOutput
+from orangecontrib.wise.util.wise_trace import traced_method
 
 class WiseWidget(widget.OWWidget):
     author = "Luca Rebuffi"
@@ -214,6 +215,7 @@ class WiseWidget(widget.OWWidget):
         self.progressBarSet(progressBarValue)
 
 
+    @traced_method("widget")
     def compute(self):
         self.setStatusMessage("Running XOPPY")
 
@@ -15,7 +15,8 @@ from oasys.widgets import congruence
 from oasys.widgets.gui import ConfirmDialog
 from oasys.util.oasys_util import EmittingStream
 
-from orangecontrib.wise.util.wise_objects import WisePreInputData
+from orangecontrib.wise.util.wise_objects import WisePreInputData, WiseEnsemblePreInputData
+from orangecontrib.wise.util.wise_ensemble import simulate_profile_ensemble, get_ensemble_statistics, save_profile_ensemble
 from orangecontrib.wise.util.wise_util import WisePlot
 
 class OWheight_profile_simulator(OWWidget):
@@ -58,6 +59,9 @@ class OWheight_profile_simulator(OWWidget):
     montecarlo_seed_y = Setting(8788)
     error_type_y = Setting(profiles_simulation.FIGURE_ERROR)
 
+    number_of_profiles = Setting(1)
+    n_pools = Setting(0)
+
     heigth_profile_file_name = Setting('figure_error.dat')
 
     def __init__(self):
@@ -154,6 +158,13 @@ class OWheight_profile_simulator(OWWidget):
         oasysgui.lineEdit(self.kind_of_profile_y_box_1, self, "rms_y", "Rms Value",
                           labelWidth=260, valueType=float, orientation="horizontal")
 
+        ensemble_box = oasysgui.widgetBox(input_box_l, "Monte Carlo Ensemble", addSpace=False, orientation="vertical")
+
+        oasysgui.lineEdit(ensemble_box, self, "number_of_profiles", "Number of Profiles (seeds: initial seed + i)",
+                          labelWidth=260, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(ensemble_box, self, "n_pools", "Nr. Parallel Processes (0 = none)",
+                          labelWidth=260, valueType=int, orientation="horizontal")
+
 
         self.set_KindOfProfileY()
 
@@ -208,29 +219,40 @@ class OWheight_profile_simulator(OWWidget):
                 rms_y = self.rms_y * 1e-6 # from urad to rad
 
 
-            xx, yy = profiles_simulation.simulate_profile_1D(step = self.step_y * self.workspace_units_to_m,
-                                                             mirror_length = self.dimension_y * self.workspace_units_to_m,
-                                                             random_seed = self.montecarlo_seed_y,
-                                                             error_type = self.error_type_y,
-                                                             profile_type=1-self.kind_of_profile_y,
-                                                             rms = rms_y,
-                                                             correlation_length = self.correlation_length_y * self.workspace_units_to_m,
-                                                             power_law_exponent_beta = self.power_law_exponent_beta_y)
+            # one profile per row: the seed of profile i is montecarlo_seed_y + i
+            xx, yy = simulate_profile_ensemble(number_of_profiles = self.number_of_profiles,
+                                               random_seed = self.montecarlo_seed_y,
+                                               n_pools = self.n_pools,
+                                               step = self.step_y * self.workspace_units_to_m,
+                                               mirror_length = self.dimension_y * self.workspace_units_to_m,
+                                               error_type = self.error_type_y,
+                                               profile_type=1-self.kind_of_profile_y,
+                                               rms = rms_y,
+                                               correlation_length = self.correlation_length_y * self.workspace_units_to_m,
+                                               power_law_exponent_beta = self.power_law_exponent_beta_y)
 
             xx_to_plot = xx/self.workspace_units_to_m # to user units
-            yy_to_plot = yy * 1e9 # nm
-            self.yy = yy/self.workspace_units_to_m # to user units
+            yy_to_plot = yy[0] * 1e9 # nm
+
+            if self.number_of_profiles == 1:
+                self.yy = yy[0]/self.workspace_units_to_m # to user units
+            else:
+                self.yy = yy/self.workspace_units_to_m # to user units
 
-            ny = yy.size
+            statistics = get_ensemble_statistics(xx, yy)
+            sloperms = statistics["slope_rms"]
 
-            slope = numpy.zeros(ny)
-            for i in range(ny-1):
-                step = xx[i+1] - xx[i]
-                slope[i] = numpy.arctan((yy[i+1] - yy[i]) / step)
-            slope[ny-1] = slope[ny-2]
-            sloperms = slope.std()
+            if self.number_of_profiles == 1:
+                title = ' Slope error rms in Z direction: %f $\mu$rad' % (sloperms[0]*1e6)
+            else:
+                title = ' Profile 1 of %d - Slope error rms in Z direction: %f $\mu$rad (ensemble: %f $\pm$ %f $\mu$rad)' % \
+                        (self.number_of_profiles, sloperms[0]*1e6, sloperms.mean()*1e6, sloperms.std()*1e6)
 
-            title = ' Slope error rms in Z direction: %f $\mu$rad' % (sloperms*1e6)
+                print("Height Profiles Ensemble: " + str(self.number_of_profiles) + " profiles")
+                print("Height error rms [nm]  : mean " + str(round(statistics["height_rms"].mean()*1e9, 6)) + ", std " + str(round(statistics["height_rms"].std()*1e9, 6)) +
+                      ", min " + str(round(statistics["height_rms"].min()*1e9, 6)) + ", max " + str(round(statistics["height_rms"].max()*1e9, 6)))
+                print("Slope error rms [urad] : mean " + str(round(sloperms.mean()*1e6, 6)) + ", std " + str(round(sloperms.std()*1e6, 6)) +
+                      ", min " + str(round(sloperms.min()*1e6, 6)) + ", max " + str(round(sloperms.max()*1e6, 6)))
 
             if self.plot_canvas is None:
                 self.plot_canvas = oasysgui.plotWindow(roi=False, control=False, position=False)
@@ -257,16 +279,28 @@ class OWheight_profile_simulator(OWWidget):
 
                 sys.stdout = EmittingStream(textWritten=self.writeStdOut)
 
-                numpy.savetxt(self.heigth_profile_file_name, self.yy)
+                if self.yy.ndim == 1:
+                    numpy.savetxt(self.heigth_profile_file_name, self.yy)
+
+                    QMessageBox.information(self, "QMessageBox.information()",
+                                                "Height Profile file " + self.heigth_profile_file_name + " written on disk",
+                                                QMessageBox.Ok)
+
 
-                QMessageBox.information(self, "QMessageBox.information()",
-                                            "Height Profile file " + self.heigth_profile_file_name + " written on disk",
-                                            QMessageBox.Ok)
+                    self.send("PreInput", WisePreInputData(figure_error_file=self.heigth_profile_file_name,
+                                                           figure_error_step=self.step_y,
+                                                           figure_user_units_to_m=self.workspace_units_to_m))
+                else:
+                    # the whole ensemble in one binary file, one profile per row
+                    file_name = save_profile_ensemble(self.heigth_profile_file_name, self.yy)
 
+                    QMessageBox.information(self, "QMessageBox.information()",
+                                                "Height Profiles file (" + str(self.yy.shape[0]) + " profiles) " + file_name + " written on disk",
+                                                QMessageBox.Ok)
 
-                self.send("PreInput", WisePreInputData(figure_error_file=self.heigth_profile_file_name,
-                                                       figure_error_step=self.step_y,
-                                                       figure_user_units_to_m=self.workspace_units_to_m))
+                    self.send("PreInput", WiseEnsemblePreInputData(figure_error_file=file_name,
+                                                                   figure_error_step=self.step_y,
+                                                                   figure_user_units_to_m=self.workspace_units_to_m))
             except Exception as exception:
                 QMessageBox.critical(self, "Error",
                                      exception.args[0],
@@ -286,6 +320,8 @@ class OWheight_profile_simulator(OWWidget):
         if self.kind_of_profile_y == 1: self.correlation_length_y = congruence.checkStrictlyPositiveNumber(self.correlation_length_y, "Correlation Length")
         self.rms_y = congruence.checkPositiveNumber(self.rms_y, "Rms")
         self.montecarlo_seed_y = congruence.checkPositiveNumber(self.montecarlo_seed_y, "Monte Carlo initial seed")
+        self.number_of_profiles = congruence.checkStrictlyPositiveNumber(self.number_of_profiles, "Number of Profiles")
+        self.n_pools = congruence.checkPositiveNumber(self.n_pools, "Nr. Parallel Processes")
 
         congruence.checkDir(self.heigth_profile_file_name)
 
@@ -297,7 +333,7 @@ class OWheight_profile_simulator(OWWidget):
         self.wise_output.ensureCursorVisible()
 
     def selectFile(self):
-        self.le_heigth_profile_file_name.setText(oasysgui.selectFileFromDialog(self, self.heigth_profile_file_name, "Select Output File", file_extension_filter="Data Files (*.dat *.txt)"))
+        self.le_heigth_profile_file_name.setText(oasysgui.selectFileFromDialog(self, self.heigth_profile_file_name, "Select Output File", file_extension_filter="Data Files (*.dat *.txt *.npy)"))
 
 
 if __name__ == "__main__":
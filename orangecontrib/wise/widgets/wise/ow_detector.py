@@ -2,7 +2,7 @@ import sys, threading
 import numpy
 from PyQt5.QtGui import QPalette, QColor, QFont
 from PyQt5.QtWidgets import QMessageBox, QFileDialog, QSlider
-from PyQt5.QtCore import QRect, Qt
+from PyQt5.QtCore import QRect, Qt, pyqtSignal
 from orangewidget import gui
 from orangewidget.widget import OWAction
 from orangewidget.settings import Setting
@@ -13,6 +13,12 @@ from oasys.util.oasys_util import EmittingStream
 from orangecontrib.wise.util.wise_objects import WiseOutput, WiseNumericalIntegrationParameters
 from orangecontrib.wise.widgets.gui.ow_wise_widget import WiseWidget
 from orangecontrib.wise.util.wise_propagator import WisePropagatorsChain, WisePropagationAlgorithms, WisePropagationParameters
+from orangecontrib.wise.util.wise_focus import golden_section_best_focus, estimate_number_of_propagations
+from orangecontrib.wise.util.wise_profile import WisePropagationProfile, set_memory_tracing
+from orangecontrib.wise.util.wise_sweep import WiseSweepResult
+from orangecontrib.wise.util.wise_metrics import stack_focal_metrics
+from orangecontrib.wise.util.wise_export import save_sweep_result, save_sweep_result_as_text
+from orangecontrib.wise.util.wise_trace import traced_method
 
 from  wiselib.Rayman import Amp
 
@@ -32,14 +38,29 @@ class OWDetector(WiseWidget):
     number_of_points = Setting(0)
     detector_size = Setting(50)
     calculated_number_of_points = 0
+    detector_sampling = Setting(0)
+    detector_number_of_points = Setting(101)
+    calculated_detector_number_of_points = 0
     oe_f2 = 0.0
     defocus_sweep = Setting(0.0)
     defocus_start = Setting(-1.0)
     defocus_stop = Setting(1.0)
     defocus_step = Setting(0.1)
+    propagation_algorithm = Setting(0)
     use_multipool = Setting(0)
     n_pools = Setting(5)
+    use_disk_cache = Setting(0)
+    disk_cache_directory = Setting("wise_cache")
+    disk_cache_size = Setting(10.0)
     show_animation = Setting(0)
+    planes_per_propagation = Setting(10)
+    best_focus_search = Setting(0)
+    coarse_points = Setting(11)
+    trace_memory_allocations = Setting(0)
+    sweep_storage = Setting(0)
+    export_format = Setting(0)
+    caustic_log_scale = Setting(0)
+    caustic_decades = Setting(6)
 
     input_data = None
     run_calculation = True
@@ -47,8 +68,19 @@ class OWDetector(WiseWidget):
     _global_propagation_output = None
     _global_propagation_parameter = None
 
+    best_focus_profile = None
+    sweep_result = None
+    caustic = None
+
+    # sweep being saved by the export thread: its planes are released only when the export ends
+    exporting_sweep_result = None
+    export_thread = None
+
     _defocus_sign = -1
 
+    # emitted by the export thread: (path, error message, empty if none)
+    export_finished = pyqtSignal(str, str)
+
     def set_input(self, input_data):
         self.setStatusMessage("")
 
@@ -64,6 +96,8 @@ class OWDetector(WiseWidget):
             if self.is_automatic_run: self.compute()
 
     def build_gui(self):
+        WisePropagatorsChain.Instance().acquire_worker_pool(self)
+
         runaction = OWAction("Find Best Focus Position", self)
         runaction.triggered.connect(self.do_best_focus_calculation)
         self.addAction(runaction)
@@ -94,7 +128,7 @@ class OWDetector(WiseWidget):
 
         self.detector_box = oasysgui.widgetBox(main_box, "", orientation="vertical", width=self.CONTROL_AREA_WIDTH-40, height=30)
 
-        le_calculated_number_of_points = oasysgui.lineEdit(self.detector_box, self, "calculated_number_of_points", "Calculated Number of Points", labelWidth=240, valueType=float, orientation="horizontal")
+        le_calculated_number_of_points = oasysgui.lineEdit(self.detector_box, self, "calculated_number_of_points", "Calculated Mirror Number of Points", labelWidth=240, valueType=float, orientation="horizontal")
         le_calculated_number_of_points.setReadOnly(True)
         font = QFont(le_calculated_number_of_points.font())
         font.setBold(True)
@@ -106,10 +140,32 @@ class OWDetector(WiseWidget):
 
         self.number_box = oasysgui.widgetBox(main_box, "", orientation="vertical", width=self.CONTROL_AREA_WIDTH-40, height=30)
 
-        oasysgui.lineEdit(self.number_box, self, "number_of_points", "Number of Points", labelWidth=240, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(self.number_box, self, "number_of_points", "Mirror Number of Points", labelWidth=240, valueType=int, orientation="horizontal")
 
         self.set_CalculationType()
 
+        gui.comboBox(main_box, self, "detector_sampling", label="Detector Sampling",
+                     items=["Automatic (from Spot Size)", "User Defined Number of Points"], labelWidth=140,
+                     callback=self.set_DetectorSampling, sendSelectedValue=False, orientation="horizontal")
+
+        self.detector_sampling_box = oasysgui.widgetBox(main_box, "", orientation="vertical", width=self.CONTROL_AREA_WIDTH-40, height=30)
+
+        le_calculated_detector_number_of_points = oasysgui.lineEdit(self.detector_sampling_box, self, "calculated_detector_number_of_points", "Calculated Detector Number of Points", labelWidth=240, valueType=float, orientation="horizontal")
+        le_calculated_detector_number_of_points.setReadOnly(True)
+        font = QFont(le_calculated_detector_number_of_points.font())
+        font.setBold(True)
+        le_calculated_detector_number_of_points.setFont(font)
+        palette = QPalette(le_calculated_detector_number_of_points.palette())
+        palette.setColor(QPalette.Text, QColor('dark blue'))
+        palette.setColor(QPalette.Base, QColor(243, 240, 140))
+        le_calculated_detector_number_of_points.setPalette(palette)
+
+        self.detector_number_box = oasysgui.widgetBox(main_box, "", orientation="vertical", width=self.CONTROL_AREA_WIDTH-40, height=30)
+
+        oasysgui.lineEdit(self.detector_number_box, self, "detector_number_of_points", "Detector Number of Points", labelWidth=240, valueType=int, orientation="horizontal")
+
+        self.set_DetectorSampling()
+
         self.le_oe_f2 = oasysgui.lineEdit(main_box, self, "oe_f2", "O.E. F2", labelWidth=240, valueType=float, orientation="horizontal")
         self.le_oe_f2.setReadOnly(True)
         font = QFont(self.le_oe_f2.font())
@@ -132,6 +188,23 @@ class OWDetector(WiseWidget):
 
         gui.separator(best_focus_box, height=5)
 
+        gui.comboBox(best_focus_box, self, "best_focus_search", label="Search Mode",
+                     items=["Linear Scan", "Bracketing + Golden Section"], labelWidth=140,
+                     callback=self.set_BestFocusSearch, sendSelectedValue=False, orientation="horizontal")
+
+        self.coarse_points_box = oasysgui.widgetBox(best_focus_box, "", orientation="vertical", width=self.CONTROL_AREA_WIDTH-40, height=30)
+        self.coarse_points_box_empty = oasysgui.widgetBox(best_focus_box, "", orientation="vertical", width=self.CONTROL_AREA_WIDTH-40, height=30)
+
+        oasysgui.lineEdit(self.coarse_points_box, self, "coarse_points", "Bracketing grid points", labelWidth=240, valueType=int, orientation="horizontal")
+
+        self.set_BestFocusSearch()
+
+        gui.separator(best_focus_box, height=5)
+
+        oasysgui.lineEdit(best_focus_box, self, "planes_per_propagation", "Defocus planes per propagation", labelWidth=240, valueType=int, orientation="horizontal")
+
+        gui.separator(best_focus_box, height=5)
+
         gui.checkBox(best_focus_box, self, "show_animation", "Show animation during calculation")
 
         gui.separator(best_focus_box, height=5)
@@ -151,6 +224,12 @@ class OWDetector(WiseWidget):
         self.save_button = gui.button(best_focus_box, self, "Save Best Focus Calculation Complete Results", callback=self.save_best_focus_results, height=35)
         self.save_button.setEnabled(False)
 
+        algorithm_box = oasysgui.widgetBox(self.tab_pro, "Huygens Integral", orientation="vertical", width=self.CONTROL_AREA_WIDTH-20)
+
+        gui.comboBox(algorithm_box, self, "propagation_algorithm", label="Integration Engine",
+                     items=["WISE (Rayman)", "Vectorized (NumPy)", "Mixed Precision (NumPy)"], labelWidth=240,
+                     sendSelectedValue=False, orientation="horizontal")
+
         parallel_box = oasysgui.widgetBox(self.tab_pro, "Parallel Computing", orientation="vertical", width=self.CONTROL_AREA_WIDTH-20)
 
         gui.comboBox(parallel_box, self, "use_multipool", label="Use Parallel Processing",
@@ -160,24 +239,130 @@ class OWDetector(WiseWidget):
         self.use_multipool_box = oasysgui.widgetBox(parallel_box, "", addSpace=True, orientation="vertical", height=30, width=self.CONTROL_AREA_WIDTH-40)
         self.use_multipool_box_empty = oasysgui.widgetBox(parallel_box, "", addSpace=True, orientation="vertical", height=30, width=self.CONTROL_AREA_WIDTH-40)
 
-        oasysgui.lineEdit(self.use_multipool_box, self, "n_pools", "Nr. Parallel Processes", labelWidth=240, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(self.use_multipool_box, self, "n_pools", "Nr. Parallel Processes", labelWidth=240, valueType=int, orientation="horizontal", callback=self.set_NPools)
 
         self.set_Multipool()
 
+        disk_cache_box = oasysgui.widgetBox(self.tab_pro, "Results Cache", orientation="vertical", width=self.CONTROL_AREA_WIDTH-20)
+
+        gui.comboBox(disk_cache_box, self, "use_disk_cache", label="Store results on disk",
+                     items=["No", "Yes"], labelWidth=240,
+                     callback=self.set_DiskCache, sendSelectedValue=False, orientation="horizontal")
+
+        self.use_disk_cache_box = oasysgui.widgetBox(disk_cache_box, "", addSpace=True, orientation="vertical", height=60, width=self.CONTROL_AREA_WIDTH-40)
+        self.use_disk_cache_box_empty = oasysgui.widgetBox(disk_cache_box, "", addSpace=True, orientation="vertical", height=60, width=self.CONTROL_AREA_WIDTH-40)
+
+        directory_box = oasysgui.widgetBox(self.use_disk_cache_box, "", addSpace=False, orientation="horizontal")
+        self.le_disk_cache_directory = oasysgui.lineEdit(directory_box, self, "disk_cache_directory", "Directory", labelWidth=100, valueType=str, orientation="horizontal")
+        gui.button(directory_box, self, "...", callback=self.selectDiskCacheDirectory)
+
+        oasysgui.lineEdit(self.use_disk_cache_box, self, "disk_cache_size", "Max size [GB]", labelWidth=240, valueType=float, orientation="horizontal")
+
+        self.set_DiskCache()
+
+        sweep_box = oasysgui.widgetBox(self.tab_pro, "Defocus Sweep Results", orientation="vertical", width=self.CONTROL_AREA_WIDTH-20)
+
+        gui.comboBox(sweep_box, self, "sweep_storage", label="Store planes", labelWidth=200,
+                     items=["In memory", "On disk (memory mapped)"],
+                     sendSelectedValue=False, orientation="horizontal")
+
+        gui.comboBox(sweep_box, self, "export_format", label="Save results as", labelWidth=200,
+                     items=["HDF5 (.h5)", "NumPy (.npz)", "Text (one file per plane)"],
+                     sendSelectedValue=False, orientation="horizontal")
+
+        self.export_finished.connect(self.best_focus_results_saved)
+
+        caustic_box = oasysgui.widgetBox(self.tab_pro, "Caustic", orientation="vertical", width=self.CONTROL_AREA_WIDTH-20)
+
+        gui.comboBox(caustic_box, self, "caustic_log_scale", label="Intensity scale", labelWidth=200,
+                     items=["Linear", "Logarithmic"], callback=self.plot_caustic,
+                     sendSelectedValue=False, orientation="horizontal")
+
+        oasysgui.lineEdit(caustic_box, self, "caustic_decades", "Logarithmic scale decades", labelWidth=240, valueType=int, orientation="horizontal", callback=self.plot_caustic)
+
+        profile_box = oasysgui.widgetBox(self.tab_pro, "Profiling", orientation="vertical", width=self.CONTROL_AREA_WIDTH-20)
+
+        gui.comboBox(profile_box, self, "trace_memory_allocations", label="Memory per stage", labelWidth=200,
+                     items=["Peak resident memory", "Traced allocations (slower)"],
+                     sendSelectedValue=False, orientation="horizontal")
+
         self.best_focus_slider = None
 
     def set_CalculationType(self):
         self.detector_box.setVisible(self.calculation_type==0)
         self.number_box.setVisible(self.calculation_type==1)
 
+    def set_DetectorSampling(self):
+        self.detector_sampling_box.setVisible(self.detector_sampling==0)
+        self.detector_number_box.setVisible(self.detector_sampling==1)
+
+    # <= 0: sampled from the expected spot size
+    def get_detector_number_of_points(self):
+        return self.detector_number_of_points if self.detector_sampling == 1 else 0
+
+    def set_BestFocusSearch(self):
+        self.coarse_points_box.setVisible(self.best_focus_search == 1)
+        self.coarse_points_box_empty.setVisible(self.best_focus_search == 0)
+
     def set_Multipool(self):
         self.use_multipool_box.setVisible(self.use_multipool == 1)
         self.use_multipool_box_empty.setVisible(self.use_multipool == 0)
 
+        self.set_NPools()
+
+    def set_NPools(self):
+        try:
+            WisePropagatorsChain.Instance().set_n_pools(self.n_pools if self.use_multipool == 1 else 0, self)
+        except ValueError as exception:
+            QMessageBox.critical(self, "Error", "Nr. Parallel Processes: " + str(exception), QMessageBox.Ok)
+
+    def set_DiskCache(self):
+        self.use_disk_cache_box.setVisible(self.use_disk_cache == 1)
+        self.use_disk_cache_box_empty.setVisible(self.use_disk_cache == 0)
+
+    def selectDiskCacheDirectory(self):
+        directory = QFileDialog.getExistingDirectory(self, "Select cache directory", self.disk_cache_directory, QFileDialog.ShowDirsOnly)
+
+        if not directory is None and not directory.strip() == "": self.le_disk_cache_directory.setText(directory)
+
+    def apply_disk_cache(self):
+        if self.use_disk_cache == 1:
+            WisePropagatorsChain.Instance().set_disk_cache(self.disk_cache_directory, int(self.disk_cache_size*1024**3))
+        else:
+            WisePropagatorsChain.Instance().set_disk_cache(None)
+
+    def set_sweep_result(self, sweep_result):
+        if not self.sweep_result is None and not self.sweep_result is self.exporting_sweep_result: self.sweep_result.release()
+
+        self.sweep_result = sweep_result
+        self.caustic = None
+
+    def onDeleteWidget(self):
+        WisePropagatorsChain.Instance().release_worker_pool(self)
+        self.set_sweep_result(None)
+
+        if not self.export_thread is None: self.export_thread.join()
+        self.release_exported_sweep_result()
+
+        super().onDeleteWidget()
+
 
     def set_ViewType(self):
         self.view_type = 1
 
+    def get_propagation_algorithm(self):
+        if self.propagation_algorithm == 1:
+            return WisePropagationAlgorithms.VectorizedHuygensIntegral
+        elif self.propagation_algorithm == 2:
+            return WisePropagationAlgorithms.MixedPrecisionHuygensIntegral
+        else:
+            return WisePropagationAlgorithms.HuygensIntegral
+
+    # sweeps: only the planes recalculated in double precision are reported
+    def print_precision_fallback(self, propagation_output):
+        if not propagation_output.precision_check is None and propagation_output.precision_check.recalculated_in_double_precision:
+            print(propagation_output.precision_check)
+
     def after_change_workspace_units(self):
         label = self.le_oe_f2.parent().layout().itemAt(0).widget()
         label.setText(label.text() + " [" + self.workspace_units_label + "]")
@@ -195,7 +380,10 @@ class OWDetector(WiseWidget):
         self.detector_size = congruence.checkStrictlyPositiveNumber(self.detector_size, "Detector Size")
 
         if self.calculation_type == 1: #auto
-            self.number_of_points = congruence.checkStrictlyPositiveNumber(self.number_of_points, "Number of Points")
+            self.number_of_points = congruence.checkStrictlyPositiveNumber(self.number_of_points, "Mirror Number of Points")
+
+        if self.detector_sampling == 1:
+            self.detector_number_of_points = congruence.checkStrictlyPositiveNumber(self.detector_number_of_points, "Detector Number of Points")
 
         if self.oe_f2 + self.defocus_sweep <= 0: raise Exception("Defocus sweep reached the previous mirror")
 
@@ -210,6 +398,14 @@ class OWDetector(WiseWidget):
             elif self.n_pools >= number_of_cpus:
                 raise Exception("Max number of parallel processes allowed on this computer: " + str(number_of_cpus-1))
 
+        if self.use_disk_cache == 1:
+            congruence.checkEmptyString(self.disk_cache_directory, "Cache Directory")
+            self.disk_cache_size = congruence.checkStrictlyPositiveNumber(self.disk_cache_size, "Cache Max Size")
+
+        self.apply_disk_cache()
+
+        set_memory_tracing(self.trace_memory_allocations == 1)
+
     def do_wise_calculation(self):
         if self.input_data is None:
             raise Exception("No Input Data!")
@@ -221,24 +417,14 @@ class OWDetector(WiseWidget):
         else:
             number_of_points = self.number_of_points
 
-        previous_numerical_integration_parameters = self.input_data.get_numerical_integration_parameters()
-        numerical_integration_parameters = WiseNumericalIntegrationParameters(self.calculation_type, detector_size, number_of_points)
-
-        propagation_type = WisePropagationParameters.MIRROR_AND_DETECTOR
+        numerical_integration_parameters = WiseNumericalIntegrationParameters(self.calculation_type, detector_size, number_of_points,
+                                                                              detector_number_of_points=int(self.get_detector_number_of_points()))
 
         #
-        # No need to recalculated wavefront on previous mirror surface
-        # if numerical integration parameters are identical
+        # the wavefront on the mirror surface is recalculated only if not already available
+        # in the mirror wavefronts cache of the propagators chain
         #
-        if self.calculation_type == previous_numerical_integration_parameters.calculation_type:
-            if self.calculation_type == WiseNumericalIntegrationParameters.AUTOMATIC:
-                if detector_size == previous_numerical_integration_parameters.detector_size:
-                    propagation_type = WisePropagationParameters.DETECTOR_ONLY
-                    numerical_integration_parameters.calculated_number_of_points = previous_numerical_integration_parameters.calculated_number_of_points
-            else:
-                if self.number_of_points == previous_numerical_integration_parameters.number_of_points:
-                    propagation_type = WisePropagationParameters.DETECTOR_ONLY
-                    numerical_integration_parameters.calculated_number_of_points = previous_numerical_integration_parameters.calculated_number_of_points
+        propagation_type = WisePropagationParameters.MIRROR_AND_DETECTOR
 
         propagation_parameter = WisePropagationParameters(propagation_type=propagation_type,
                                                           source=self.input_data.get_source().inner_wise_source,
@@ -248,13 +434,21 @@ class OWDetector(WiseWidget):
                                                           defocus_sweep=self._defocus_sign * self.defocus_sweep * self.workspace_units_to_m)
 
         propagation_output = WisePropagatorsChain.Instance().do_propagation(propagation_parameter,
-                                                                            WisePropagationAlgorithms.HuygensIntegral)
+                                                                            self.get_propagation_algorithm())
 
         if self.calculation_type == 0:
             self.calculated_number_of_points = propagation_output.number_of_points
         else:
             self.calculated_number_of_points = 0
 
+        self.calculated_detector_number_of_points = propagation_output.detector_number_of_points if self.detector_sampling == 0 else 0
+
+        print("Focal metrics: " + str(propagation_output.metrics))
+        if not propagation_output.precision_check is None: print(propagation_output.precision_check)
+        print(propagation_output.profile)
+        print(WisePropagatorsChain.Instance().get_mirror_field_cache())
+        if not WisePropagatorsChain.Instance().get_disk_cache() is None: print(WisePropagatorsChain.Instance().get_disk_cache())
+
         positions_s = propagation_output.det_s
         electric_fields = propagation_output.electric_fields
 
@@ -265,7 +459,7 @@ class OWDetector(WiseWidget):
         return data_to_plot
 
     def getTabTitles(self):
-        return ["Intensity on O.E. Focus", "Intensity on Best Focus", "Hew"]
+        return ["Intensity on O.E. Focus", "Intensity on Best Focus", "Hew", "Caustic"]
 
     def getTitles(self):
         return ["Intensity on Focus Position: " + str(numpy.round(self.oe_f2 + self.defocus_sweep, 6))]
@@ -291,6 +485,7 @@ class OWDetector(WiseWidget):
     def stop_best_focus_calculation(self):
         self.run_calculation = False
 
+    @traced_method("widget")
     def do_best_focus_calculation(self):
         try:
             if self.input_data is None:
@@ -302,6 +497,8 @@ class OWDetector(WiseWidget):
             if self.defocus_start >= self.defocus_stop: raise Exception("Defocus sweep start must be < Defocus sweep stop")
             self.defocus_step = congruence.checkStrictlyPositiveNumber(self. defocus_step, "Defocus sweep step")
             if self.defocus_step >= self.defocus_stop - self.defocus_start: raise Exception("Defocus step is too big")
+            self.planes_per_propagation = congruence.checkStrictlyPositiveNumber(self.planes_per_propagation, "Defocus planes per propagation")
+            if self.best_focus_search == 1 and self.coarse_points < 3: raise Exception("Bracketing grid points must be >= 3")
 
             if self.best_focus_slider is None:
                 self.best_focus_slider = QSlider(self.tab[1])
@@ -329,24 +526,14 @@ class OWDetector(WiseWidget):
             else:
                 number_of_points = self.number_of_points
 
-            previous_numerical_integration_parameters = self.input_data.get_numerical_integration_parameters()
-            numerical_integration_parameters = WiseNumericalIntegrationParameters(self.calculation_type, detector_size, int(number_of_points))
-
-            propagation_type = WisePropagationParameters.MIRROR_AND_DETECTOR
+            numerical_integration_parameters = WiseNumericalIntegrationParameters(self.calculation_type, detector_size, int(number_of_points),
+                                                                                  detector_number_of_points=int(self.get_detector_number_of_points()))
 
             #
-            # No need to recalculated wavefront on previous mirror surface
-            # if numerical integration parameters are identical
+            # the wavefront on the mirror surface is recalculated only if not already available
+            # in the mirror wavefronts cache of the propagators chain
             #
-            if self.calculation_type == previous_numerical_integration_parameters.calculation_type:
-                if self.calculation_type == WiseNumericalIntegrationParameters.AUTOMATIC:
-                    if detector_size == previous_numerical_integration_parameters.detector_size:
-                        propagation_type = WisePropagationParameters.DETECTOR_ONLY
-                        numerical_integration_parameters.calculated_number_of_points = previous_numerical_integration_parameters.calculated_number_of_points
-                else:
-                    if self.number_of_points == previous_numerical_integration_parameters.number_of_points:
-                        propagation_type = WisePropagationParameters.DETECTOR_ONLY
-                        numerical_integration_parameters.calculated_number_of_points = previous_numerical_integration_parameters.calculated_number_of_points
+            propagation_type = WisePropagationParameters.MIRROR_AND_DETECTOR
 
             self.defocus_list = numpy.arange(self.defocus_start * self.workspace_units_to_m,
                                              self.defocus_stop  * self.workspace_units_to_m,
@@ -372,13 +559,8 @@ class OWDetector(WiseWidget):
             else:
                 n_pools = self.n_pools
 
-            hew_min = numpy.inf
-            index_min_list = []
-
             self.best_focus_index = -1
-            self.electric_fields_list = []
-            self.positions_list = []
-            self.hews_list = []
+            self.set_sweep_result(WiseSweepResult(self.defocus_list, memory_mapped=self.sweep_storage == 1))
 
             propagation_parameter = WisePropagationParameters(propagation_type=propagation_type,
                                                               source=source,
@@ -392,62 +574,82 @@ class OWDetector(WiseWidget):
 
             self.run_calculation = True
 
-            for i, defocus in enumerate(self.defocus_list):
-                if not self.run_calculation:
+            WisePropagatorsChain.Instance().get_worker_pool().statistics.reset()
+            self.best_focus_profile = WisePropagationProfile()
+
+            if self.best_focus_search == 1:
+                index_min = self.do_golden_section_search(propagation_parameter)
+
+                if index_min is None:
                     if not self.best_focus_slider is None: self.best_focus_slider.valueChanged.connect(self.plot_detail)
                     return
 
-                if numpy.abs(defocus) < 1e-15:
-                    defocus = 0.0
-                    self.defocus_list[i] = 0.0
+                n_defocus = len(self.defocus_list)
+
+                self.best_focus_slider.setMaximum(n_defocus-1)
+            else:
+                self.defocus_list[numpy.abs(self.defocus_list) < 1e-15] = 0.0
+
+                #
+                # every propagation computes a batch of defocused planes, sharing the wavefront on the mirror
+                #
+                if self.show_animation == 1:
+                    n_planes_per_propagation = 1
+                else:
+                    n_planes_per_propagation = self.planes_per_propagation
 
-                propagation_parameter.defocus_sweep = defocus
+                for batch in numpy.array_split(numpy.arange(n_defocus), int(numpy.ceil(n_defocus/n_planes_per_propagation))):
+                    if not self.run_calculation:
+                        if not self.best_focus_slider is None: self.best_focus_slider.valueChanged.connect(self.plot_detail)
+                        return
 
-                propagation_output = WisePropagatorsChain.Instance().do_propagation(propagation_parameter,
-                                                                                    WisePropagationAlgorithms.HuygensIntegral)
-                # E1
-                self.electric_fields_list.append(propagation_output.electric_fields)
-                self.positions_list.append(propagation_output.det_s)
-                self.hews_list.append(propagation_output.HEW)
+                    propagation_parameter.defocus_sweep = self.defocus_list[batch]
 
-                self.best_focus_slider.setValue(i)
+                    propagation_output = WisePropagatorsChain.Instance().do_propagation(propagation_parameter,
+                                                                                        self.get_propagation_algorithm())
+                    self.best_focus_profile.merge(propagation_output.profile)
+                    self.print_precision_fallback(propagation_output)
 
-                if self.show_animation == 1:
+                    self.sweep_result.set_planes(batch, propagation_output.det_s, propagation_output.electric_fields, propagation_output.HEW, propagation_output.metrics)
 
-                    self.plot_histo(propagation_output.det_s * 1e6,
-                                    Amp(propagation_output.electric_fields)**2,
-                                    i*progress_bar_increment,
-                                    tabs_canvas_index=1,
-                                    plot_canvas_index=1,
-                                    title="Defocus Sweep: " + str(self._defocus_sign * defocus/self.workspace_units_to_m) + " (" + str(i+1) + "/" + str(n_defocus) +
-                                          "), HEW: " + str(round(propagation_output.HEW*1e6, 4)) + " [$\mu$m]",
-                                    xtitle="Z [$\mu$m]",
-                                    ytitle="Intensity",
-                                    log_x=False,
-                                    log_y=False)
-
-                    self.tabs.setCurrentIndex(1)
-                else:
-                    self.progressBarSet(value=i*progress_bar_increment)
+                    for i in batch:
+                        defocus, positions, electric_fields, hew = self.sweep_result.get_plane(i)
 
-                hew = round(propagation_output.HEW*1e6, 11) # problems with double precision numbers: inconsistent comparisons
+                        self.best_focus_slider.setValue(i)
 
-                if hew < hew_min:
-                    hew_min = hew
-                    index_min_list = [i]
-                elif hew == hew_min:
-                    index_min_list.append(i)
+                        if self.show_animation == 1:
 
-            index_min = index_min_list[int(len(index_min_list)/2)] # choosing the central value, when hew reach a pletau
+                            self.plot_histo(positions * 1e6,
+                                            Amp(electric_fields)**2,
+                                            i*progress_bar_increment,
+                                            tabs_canvas_index=1,
+                                            plot_canvas_index=1,
+                                            title="Defocus Sweep: " + str(self._defocus_sign * defocus/self.workspace_units_to_m) + " (" + str(i+1) + "/" + str(n_defocus) +
+                                                  "), HEW: " + str(round(hew*1e6, 4)) + " [$\mu$m]",
+                                            xtitle="Z [$\mu$m]",
+                                            ytitle="Intensity",
+                                            log_x=False,
+                                            log_y=False)
+
+                            self.tabs.setCurrentIndex(1)
+                        else:
+                            self.progressBarSet(value=i*progress_bar_increment)
+
+                index_min = self.sweep_result.get_best_focus_index()
+
+            print(self.best_focus_profile)
+            if n_pools > 0: print(WisePropagatorsChain.Instance().get_worker_pool().statistics)
+            print(WisePropagatorsChain.Instance().get_mirror_field_cache())
+            if not WisePropagatorsChain.Instance().get_disk_cache() is None: print(WisePropagatorsChain.Instance().get_disk_cache())
 
             self.best_focus_index = index_min
-            best_focus_electric_fields = self.electric_fields_list[index_min]
-            best_focus_positions       = self.positions_list[index_min]
+            print("Best focus metrics: " + str(self.sweep_result.metrics[index_min]))
+            _, best_focus_positions, best_focus_electric_fields, best_focus_hew = self.sweep_result.get_plane(index_min)
 
             QMessageBox.information(self,
                                     "Best Focus Calculation",
                                     "Best Focus Found!\n\nPosition: " + str(self.oe_f2 + (self._defocus_sign * self.defocus_list[index_min]/self.workspace_units_to_m)) +
-                                    "\nHEW: " + str(round(self.hews_list[index_min]*1e6, 4)) + " [" + u"\u03BC" + "m]",
+                                    "\nHEW: " + str(round(best_focus_hew*1e6, 4)) + " [" + u"\u03BC" + "m]",
                                     QMessageBox.Ok
                                     )
 
@@ -459,14 +661,14 @@ class OWDetector(WiseWidget):
                             title="(BEST FOCUS) Defocus Sweep: " + str(self._defocus_sign * self.defocus_list[index_min]/self.workspace_units_to_m) +
                                   " ("+ str(index_min+1) + "/" + str(n_defocus) + "), Position: " +
                                   str(self.oe_f2 + (self._defocus_sign * self.defocus_list[index_min]/self.workspace_units_to_m)) +
-                                  ", HEW: " + str(round(self.hews_list[index_min]*1e6, 4)) + " [$\mu$m]",
+                                  ", HEW: " + str(round(best_focus_hew*1e6, 4)) + " [$\mu$m]",
                             xtitle="Z [$\mu$m]",
                             ytitle="Intensity",
                             log_x=False,
                             log_y=False)
 
             self.plot_histo(self._defocus_sign * self.defocus_list,
-                            numpy.multiply(self.hews_list, 1e6),
+                            self.sweep_result.hews*1e6,
                             100,
                             tabs_canvas_index=2,
                             plot_canvas_index=2,
@@ -481,6 +683,9 @@ class OWDetector(WiseWidget):
             self.plot_canvas[2].setGraphXLabel("Defocus [" + self.workspace_units_label + "]")
             self.plot_canvas[2].setGraphYLabel("HEW [$\mu$m]")
 
+            self.caustic = self.sweep_result.get_caustic()
+            self.plot_caustic()
+
             self.best_focus_slider.setValue(index_min)
 
             self.tabs.setCurrentIndex(1)
@@ -499,22 +704,73 @@ class OWDetector(WiseWidget):
         self.progressBarFinished()
 
 
+    def do_golden_section_search(self, propagation_parameter):
+        evaluated_planes = {}
+
+        expected_propagations = estimate_number_of_propagations(self.defocus_start * self.workspace_units_to_m,
+                                                                self.defocus_stop * self.workspace_units_to_m,
+                                                                self.defocus_step * self.workspace_units_to_m,
+                                                                self.coarse_points)
+
+        def calculate_hews(defocus_values):
+            propagation_parameter.defocus_sweep = defocus_values
+
+            propagation_output = WisePropagatorsChain.Instance().do_propagation(propagation_parameter,
+                                                                                self.get_propagation_algorithm())
+            self.best_focus_profile.merge(propagation_output.profile)
+            self.print_precision_fallback(propagation_output)
+
+            for j, defocus in enumerate(defocus_values):
+                evaluated_planes[float(defocus)] = (propagation_output.electric_fields[j],
+                                                    propagation_output.det_s[j],
+                                                    propagation_output.HEW[j],
+                                                    propagation_output.metrics[j])
+
+            self.progressBarSet(value=min(99, 100*len(evaluated_planes)/expected_propagations))
+
+            return propagation_output.HEW
+
+        search_result = golden_section_best_focus(calculate_hews,
+                                                  self.defocus_start * self.workspace_units_to_m,
+                                                  self.defocus_stop * self.workspace_units_to_m,
+                                                  tolerance=self.defocus_step * self.workspace_units_to_m,
+                                                  coarse_points=self.coarse_points,
+                                                  keep_running=lambda : self.run_calculation)
+
+        if search_result.interrupted: return None
+
+        self.defocus_list = search_result.defocus_list
+
+        self.set_sweep_result(WiseSweepResult(self.defocus_list, memory_mapped=self.sweep_storage == 1))
+        self.sweep_result.set_planes(slice(None),
+                                     [evaluated_planes[float(defocus)][1] for defocus in self.defocus_list],
+                                     [evaluated_planes[float(defocus)][0] for defocus in self.defocus_list],
+                                     [evaluated_planes[float(defocus)][2] for defocus in self.defocus_list],
+                                     stack_focal_metrics([evaluated_planes[float(defocus)][3] for defocus in self.defocus_list]))
+
+        print("Golden section search " + ("converged" if search_result.converged else "NOT converged") +
+              " to defocus: " + str(self._defocus_sign * search_result.defocus/self.workspace_units_to_m) +
+              ", HEW: " + str(round(search_result.hew*1e6, 4)) + " [" + u"\u03BC" + "m]" +
+              ", propagated planes: " + str(search_result.number_of_propagations) +
+              " (" + str(search_result.number_of_calls) + " calls)")
+
+        return int(numpy.where(self.defocus_list == search_result.defocus)[0][0])
+
     def plot_detail(self, value):
         try:
             index = value
-            n_defocus = len(self.positions_list)
+            n_defocus = len(self.sweep_result)
 
-            electric_fields = self.electric_fields_list[index]
-            positions       = self.positions_list[index]
+            _, positions, electric_fields, hew = self.sweep_result.get_plane(index)
 
             if index == self.best_focus_index:
                 title = "(BEST FOCUS) Defocus Sweep: " + str(self._defocus_sign * self.defocus_list[index]/self.workspace_units_to_m) + \
                         " ("+ str(index+1) + "/" + str(n_defocus) + "), Position: " + \
                         str(self.oe_f2 + (self.defocus_list[index]/self.workspace_units_to_m)) + \
-                        ", HEW: " + str(round(self.hews_list[index]*1e6, 4)) + " [$\mu$m]"
+                        ", HEW: " + str(round(hew*1e6, 4)) + " [$\mu$m]"
             else:
                 title = "Defocus Sweep: " + str(self._defocus_sign * self.defocus_list[index]/self.workspace_units_to_m) + \
-                        " (" + str(index+1) + "/" + str(n_defocus) + "), HEW: " + str(round(self.hews_list[index]*1e6, 4)) + " [$\mu$m]"
+                        " (" + str(index+1) + "/" + str(n_defocus) + "), HEW: " + str(round(hew*1e6, 4)) + " [$\mu$m]"
 
             self.plot_histo(positions * 1e6,
                             Amp(electric_fields)**2,
@@ -532,41 +788,143 @@ class OWDetector(WiseWidget):
         except:
             pass
 
+    #
+    # the caustic is built once per sweep from all the planes: changing the scale only redraws the (cached) display image
+    #
+    def plot_caustic(self):
+        if self.caustic is None: return
+
+        try:
+            if self.caustic_log_scale == 1: self.caustic_decades = congruence.checkStrictlyPositiveNumber(self.caustic_decades, "Logarithmic scale decades")
+
+            image, defocus_list, positions = self.caustic.get_display_image(max_shape=(self.IMAGE_HEIGHT, self.IMAGE_WIDTH),
+                                                                            log_scale=self.caustic_log_scale == 1,
+                                                                            decades=self.caustic_decades)
+
+            defocus_list = self._defocus_sign * defocus_list/self.workspace_units_to_m
+            positions = positions*1e6
+
+            if self._defocus_sign < 0:
+                image = image[:, ::-1]
+                defocus_list = defocus_list[::-1]
+
+            scale_x = (defocus_list[-1] - defocus_list[0])/(len(defocus_list) - 1) if len(defocus_list) > 1 else 1.0
+            scale_y = (positions[-1] - positions[0])/(len(positions) - 1) if len(positions) > 1 else 1.0
+
+            if self.plot_canvas[3] is None:
+                self.plot_canvas[3] = oasysgui.plotWindow(roi=False, control=True, position=True)
+                self.tab[3].layout().addWidget(self.plot_canvas[3])
+
+            plot_canvas = self.plot_canvas[3]
+            plot_canvas.addImage(image,
+                                 legend="caustic",
+                                 origin=(defocus_list[0] - scale_x/2, positions[0] - scale_y/2),
+                                 scale=(scale_x, scale_y),
+                                 colormap={"name": "temperature", "normalization": "linear", "autoscale": True, "vmin": 0, "vmax": 0, "colors": 256},
+                                 replace=True)
+
+            envelope = self.caustic.get_envelope()
+            envelope_defocus = self._defocus_sign * self.caustic.defocus_list/self.workspace_units_to_m
+            order = numpy.argsort(envelope_defocus)
+
+            for width, color in (("FWHM", "white"), ("HEW", "green")):
+                for side in (-1, 1):
+                    plot_canvas.addCurve(envelope_defocus[order],
+                                         (envelope.centroid + side*getattr(envelope, width)/2)[order]*1e6,
+                                         legend=width + (" -" if side < 0 else " +"),
+                                         symbol='', color=color, replace=False)
+
+            plot_canvas.setGraphTitle("Caustic (" + ("log10 Intensity" if self.caustic_log_scale == 1 else "Intensity") + "), envelope: FWHM (white), HEW (green)")
+            plot_canvas.setGraphXLabel("Defocus [" + self.workspace_units_label + "]")
+            plot_canvas.setGraphYLabel("Z [$\mu$m]")
+            plot_canvas.resetZoom()
+        except Exception as exception:
+            QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
+
+    def get_best_focus_parameters(self):
+        source = self.input_data.get_source().inner_wise_source
+        elliptic_mirror = self.input_data.get_optical_element().inner_wise_optical_element
+
+        return {"wavelength": source.Lambda,
+                "f1": elliptic_mirror.f1,
+                "f2": elliptic_mirror.f2,
+                "alpha": elliptic_mirror.Alpha,
+                "mirror_length": elliptic_mirror.L,
+                "detector_size": self.detector_size*1e-6,
+                "calculation_type": "automatic" if self.calculation_type == 0 else "user_defined",
+                "number_of_points": self.number_of_points,
+                "detector_number_of_points": self.get_detector_number_of_points(),
+                "defocus_start": self.defocus_start * self.workspace_units_to_m,
+                "defocus_stop": self.defocus_stop * self.workspace_units_to_m,
+                "defocus_step": self.defocus_step * self.workspace_units_to_m,
+                "defocus_sign": self._defocus_sign,
+                "search_mode": "golden_section" if self.best_focus_search == 1 else "linear",
+                "propagation_algorithm": self.get_propagation_algorithm(),
+                "best_focus_index": self.best_focus_index}
+
     def save_best_focus_results(self):
         try:
-            path_dir = QFileDialog.getExistingDirectory(self, "Select destination directory", ".", QFileDialog.ShowDirsOnly)
+            if self.sweep_result is None: raise Exception("No Best Focus Calculation results")
 
-            if not path_dir is None:
-                if not path_dir.strip() == "":
-                    if QMessageBox.question(self,
-                                            "Save Data",
-                                            "Data will be saved in :\n\n" + path_dir + "\n\nConfirm?",
-                                            QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
-                        for index in range(0, len(self.electric_fields_list)):
-                            file_name = "best_focus_partial_result_" + str(index) + ".dat"
+            if self.export_format == 2:
+                path = QFileDialog.getExistingDirectory(self, "Select destination directory", ".", QFileDialog.ShowDirsOnly)
+            else:
+                extension = ".h5" if self.export_format == 0 else ".npz"
+                path, _ = QFileDialog.getSaveFileName(self, "Save Best Focus Calculation Results", "best_focus" + extension, "*" + extension)
+
+                if not path is None and not path.strip() == "" and not path.lower().endswith(extension): path += extension
+
+            if not path is None and not path.strip() == "":
+                if QMessageBox.question(self,
+                                        "Save Data",
+                                        "Data will be saved in :\n\n" + path + "\n\nConfirm?",
+                                        QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
+                    # a new calculation replaces self.sweep_result while the thread is saving: the planes of this one
+                    # (memory mapped files included) are released when the export ends, see best_focus_results_saved
+                    self.exporting_sweep_result = self.sweep_result
+                    parameters = self.get_best_focus_parameters()
+
+                    self.save_button.setEnabled(False)
+                    self.setStatusMessage("Saving Best Focus Calculation results")
+
+                    self.export_thread = threading.Thread(target=self.save_best_focus_results_in_background,
+                                                          args=(path, self.exporting_sweep_result, parameters, self.export_format == 2),
+                                                          daemon=True)
+                    self.export_thread.start()
+        except Exception as exception:
+            QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
 
-                            file = open(path_dir + "/" + file_name, "w")
+            self.setStatusMessage("Error!")
 
-                            intensities = Amp(self.electric_fields_list[index]) ** 2
+    def save_best_focus_results_in_background(self, path, sweep_result, parameters, as_text):
+        try:
+            if as_text: save_sweep_result_as_text(path, sweep_result)
+            else: save_sweep_result(path, sweep_result, parameters)
 
-                            file.write("# Defocus Sweep: " + str(self.defocus_list[index]) + " [m]\n")
-                            file.write("# HEW          : " + str(self.hews_list[index]) + " [m]\n")
-                            file.write("# Position [m]  Intensity\n")
+            self.export_finished.emit(path, "")
+        except Exception as exception:
+            self.export_finished.emit(path, str(exception))
 
-                            for i in range (0, len(self.positions_list[index])):
-                                file.write(str(self.positions_list[index][i]) + " " + str(intensities[i]) + "\n")
+    def release_exported_sweep_result(self):
+        if not self.exporting_sweep_result is None and not self.exporting_sweep_result is self.sweep_result: self.exporting_sweep_result.release()
 
+        self.exporting_sweep_result = None
+        self.export_thread = None
 
-                            file.close()
+    def best_focus_results_saved(self, path, error):
+        self.release_exported_sweep_result()
+        self.save_button.setEnabled(True)
 
-                        QMessageBox.information(self,
-                                                "Best Focus Calculation",
-                                                "Best Focus Calculation complete results saved on directory:\n\n" + path_dir,
-                                                QMessageBox.Ok
-                                                )
+        if error == "":
+            self.setStatusMessage("")
 
-        except Exception as exception:
-            QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
+            QMessageBox.information(self,
+                                    "Best Focus Calculation",
+                                    "Best Focus Calculation complete results saved in:\n\n" + path,
+                                    QMessageBox.Ok
+                                    )
+        else:
+            QMessageBox.critical(self, "Error", error, QMessageBox.Ok)
 
             self.setStatusMessage("Error!")
 
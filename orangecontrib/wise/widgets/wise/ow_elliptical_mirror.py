@@ -7,15 +7,15 @@ from orangewidget.settings import Setting
 from oasys.widgets import gui as oasysgui
 from oasys.widgets import congruence
 
-from orangecontrib.wise.util.wise_objects import WiseOpticalElement, WiseWavefront, WiseOutput, WisePreInputData, WiseNumericalIntegrationParameters
+from orangecontrib.wise.util.wise_objects import WiseOutput, WisePreInputData, WiseEnsemblePreInputData, WiseNumericalIntegrationParameters
 from orangecontrib.wise.widgets.gui.ow_wise_widget import WiseWidget
-from orangecontrib.wise.util.wise_propagator import WisePropagatorsChain, WisePropagationAlgorithms, WisePropagationParameters
+from orangecontrib.wise.util.wise_pipeline import create_elliptical_mirror, position_source_at_mirror_focus, propagate_to_mirror
+from orangecontrib.wise.util.wise_metrology import load_figure_error, get_figure_error_key, METROLOGY_FILE_EXTENSION_FILTER
 
 from syned.widget.widget_decorator import WidgetDecorator
 from syned.beamline.optical_elements.mirrors.mirror import Mirror
 from syned.beamline.shape import Ellipsoid
 
-from wiselib import Optics
 from wiselib.Rayman import Amp, Cyc
 
 SOURCE = 0
@@ -42,6 +42,7 @@ class OWEllipticalMirror(WiseWidget, WidgetDecorator):
     figure_error_file = Setting("figure_error.dat")
     figure_error_step = Setting(0.002)
     figure_error_um_conversion = Setting(1.0)
+    figure_error_index = Setting(0)
     use_roughness = Setting(0)
     roughness_file = Setting("roughness.dat")
     roughness_x_scaling = Setting(1.0)
@@ -73,6 +74,7 @@ class OWEllipticalMirror(WiseWidget, WidgetDecorator):
                 self.figure_error_file = data.figure_error_file
                 self.figure_error_step = data.figure_error_step
                 self.figure_error_um_conversion = data.figure_user_units_to_m
+                self.figure_error_index = data.profile_index if isinstance(data, WiseEnsemblePreInputData) else 0
                 self.use_figure_error = 1
 
                 self.set_UseFigureError()
@@ -108,8 +110,8 @@ class OWEllipticalMirror(WiseWidget, WidgetDecorator):
                      items=["None", "User Defined"], labelWidth=240,
                      callback=self.set_UseFigureError, sendSelectedValue=False, orientation="horizontal")
 
-        self.use_figure_error_box = oasysgui.widgetBox(figure_error_box, "", addSpace=True, orientation="vertical", height=80)
-        self.use_figure_error_box_empty = oasysgui.widgetBox(figure_error_box, "", addSpace=True, orientation="vertical", height=80)
+        self.use_figure_error_box = oasysgui.widgetBox(figure_error_box, "", addSpace=True, orientation="vertical", height=105)
+        self.use_figure_error_box_empty = oasysgui.widgetBox(figure_error_box, "", addSpace=True, orientation="vertical", height=105)
 
 
         file_box =  oasysgui.widgetBox(self.use_figure_error_box, "", addSpace=False, orientation="horizontal")
@@ -118,6 +120,7 @@ class OWEllipticalMirror(WiseWidget, WidgetDecorator):
 
         self.le_figure_error_step = oasysgui.lineEdit(self.use_figure_error_box, self, "figure_error_step", "Step", labelWidth=240, valueType=float, orientation="horizontal")
         oasysgui.lineEdit(self.use_figure_error_box, self, "figure_error_um_conversion", "user file u.m. to [m] factor", labelWidth=240, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(self.use_figure_error_box, self, "figure_error_index", "Profile index (ensemble files)", labelWidth=240, valueType=int, orientation="horizontal")
 
         self.set_UseFigureError()
 
@@ -168,10 +171,10 @@ class OWEllipticalMirror(WiseWidget, WidgetDecorator):
         self.set_CalculationType()
 
     def selectFigureErrorFile(self):
-        self.le_figure_error_file.setText(oasysgui.selectFileFromDialog(self, self.figure_error_file, "Select File", file_extension_filter="Data Files (*.dat *.txt)"))
+        self.le_figure_error_file.setText(oasysgui.selectFileFromDialog(self, self.figure_error_file, "Select File", file_extension_filter=METROLOGY_FILE_EXTENSION_FILTER))
 
     def selectroughnessFile(self):
-        self.le_roughness_file.setText(oasysgui.selectFileFromDialog(self, self.roughness_file, "Select File", file_extension_filter="Data Files (*.dat *.txt)"))
+        self.le_roughness_file.setText(oasysgui.selectFileFromDialog(self, self.roughness_file, "Select File", file_extension_filter=METROLOGY_FILE_EXTENSION_FILTER))
 
     def set_UseFigureError(self):
         self.use_figure_error_box.setVisible(self.use_figure_error == 1)
@@ -203,6 +206,7 @@ class OWEllipticalMirror(WiseWidget, WidgetDecorator):
 
         if self.use_figure_error == 1:
             congruence.checkFileName(self.figure_error_file)
+            self.figure_error_index = congruence.checkPositiveNumber(self.figure_error_index, "Profile index")
 
         if self.use_roughness == 1:
             congruence.checkFileName(self.roughness_file)
@@ -216,103 +220,50 @@ class OWEllipticalMirror(WiseWidget, WidgetDecorator):
         if self.input_data is None:
             raise Exception("No Input Data!")
 
-        elliptic_mirror = Optics.Ellipse(f1 = self.f1 * self.workspace_units_to_m,
-                                         f2 = self.f2 * self.workspace_units_to_m,
-                                         Alpha = numpy.radians(self.alpha),
-                                         L = self.length * self.workspace_units_to_m)
-
         if self.use_figure_error == 1:
-            elliptic_mirror.FigureErrorAdd(numpy.loadtxt(self.figure_error_file) * self.figure_error_um_conversion,
-                                           self.figure_error_step * self.workspace_units_to_m) # (m)
-
-
-
-        if self.use_roughness == 1:
-            elliptic_mirror.Roughness.NumericPsdLoadXY(self.roughness_file,
-                                                       xScaling = self.roughness_x_scaling * self.workspace_units_to_m,
-                                                       yScaling = self.roughness_y_scaling * self.workspace_units_to_m,
-                                                       xIsSpatialFreq = False)
-            elliptic_mirror.Roughness.Options.FIT_NUMERIC_DATA_WITH_POWER_LAW = (self.roughness_fit_data == 1)
-            elliptic_mirror.Options.USE_ROUGHNESS = True
+            figure_error      = load_figure_error(self.figure_error_file, self.figure_error_um_conversion, self.figure_error_index) # parsed once, or memory mapped
+            figure_error_step = self.figure_error_step * self.workspace_units_to_m # (m)
+            figure_error_key  = get_figure_error_key(self.figure_error_file, self.figure_error_um_conversion, self.figure_error_index)
         else:
-            elliptic_mirror.Options.USE_ROUGHNESS = False
+            figure_error      = None
+            figure_error_step = 0.0
+            figure_error_key  = None
+
+        mirror_sampling = {"calculation_type": self.calculation_type,
+                           "detector_size": self.detector_size*1e-6,
+                           "number_of_points": self.number_of_points}
+
+        elliptic_mirror = create_elliptical_mirror(f1 = self.f1 * self.workspace_units_to_m,
+                                                   f2 = self.f2 * self.workspace_units_to_m,
+                                                   alpha = self.alpha,
+                                                   length = self.length * self.workspace_units_to_m,
+                                                   figure_error = figure_error,
+                                                   figure_error_step = figure_error_step,
+                                                   roughness_file = self.roughness_file if self.use_roughness == 1 else None,
+                                                   roughness_x_scaling = self.roughness_x_scaling * self.workspace_units_to_m,
+                                                   roughness_y_scaling = self.roughness_y_scaling * self.workspace_units_to_m,
+                                                   roughness_fit_data = (self.roughness_fit_data == 1),
+                                                   wavelength = self.input_data.get_source().inner_wise_source.Lambda,
+                                                   mirror_sampling = mirror_sampling, # the figure error is resampled to the mirror points
+                                                   figure_error_key = figure_error_key)
 
         #------------------------------------------------------------
 
-        source = self.input_data.get_source()
-
-        if source.get_property("source_on_mirror_focus"):
-            longitudinal_correction = float(source.get_property("longitudinal_correction"))
-            transverse_correction   = float(source.get_property("transverse_correction"))
-            delta_theta             = float(source.get_property("delta_theta"))
-
-            if longitudinal_correction == 0.0:
-                if transverse_correction == 0.0:
-                    alpha = 0
-                else:
-                    alpha = elliptic_mirror.p1_Angle + numpy.sign(transverse_correction)*numpy.pi/2
-            else:
-                alpha = elliptic_mirror.p1_Angle + numpy.arctan(transverse_correction/longitudinal_correction)
-
-            defocus = numpy.sqrt(longitudinal_correction**2 + transverse_correction**2)
-
-            theta = elliptic_mirror.p1_Angle + delta_theta
-            z_origin = elliptic_mirror.XYF1[0] + defocus*numpy.cos(alpha)
-            y_origin = elliptic_mirror.XYF1[1] + defocus*numpy.sin(alpha)
-
-            print("theta (deg)", numpy.degrees(theta), "Z", z_origin, "Y", y_origin)
-
-            if (isinstance(source.inner_wise_source, Optics.GaussianSource_1d)):
-                source.inner_wise_source = Optics.GaussianSource_1d(source.inner_wise_source.Lambda,
-                                                                    source.inner_wise_source.Waist0,
-                                                                    ZOrigin=z_origin,
-                                                                    YOrigin=y_origin,
-                                                                    Theta=theta)
-            elif (isinstance(source.inner_wise_source, Optics.PointSource_1d)):
-                source.inner_wise_source = Optics.GaussianSource_1d(source.inner_wise_source.Lambda,
-                                                                    XOrigin=z_origin,
-                                                                    YOrigin=y_origin)
-            else:
-                source.inner_wise_source.ZOrigin = z_origin
-                source.inner_wise_source.YOrigin = y_origin
-                source.inner_wise_source.ThetaPropagation = theta
-
-        if self.calculation_type == WiseNumericalIntegrationParameters.AUTOMATIC:
-            detector_size = self.detector_size*1e-6
-            number_of_points = -1
-        else:
-            detector_size = 0.0
-            number_of_points = self.number_of_points
-
-        numerical_integration_parameters = WiseNumericalIntegrationParameters(self.calculation_type, detector_size, number_of_points)
-
-        propagation_parameter = WisePropagationParameters(propagation_type=WisePropagationParameters.MIRROR_ONLY,
-                                                          source=source.inner_wise_source,
-                                                          optical_element=elliptic_mirror,
-                                                          numerical_integration_parameters=numerical_integration_parameters)
-
-        propagation_output = WisePropagatorsChain.Instance().do_propagation(propagation_parameter,
-                                                                            WisePropagationAlgorithms.HuygensIntegral)
+        source = position_source_at_mirror_focus(self.input_data.get_source(), elliptic_mirror)
 
+        wise_output, propagation_output = propagate_to_mirror(source, elliptic_mirror, **mirror_sampling)
 
         if self.calculation_type == WiseNumericalIntegrationParameters.AUTOMATIC:
             self.calculated_number_of_points = propagation_output.number_of_points
         else:
             self.calculated_number_of_points = 0
 
-        wavefront_out = WiseWavefront(propagation_output.mir_x,
-                                      propagation_output.mir_y,
-                                      propagation_output.mir_s,
-                                      propagation_output.mir_E,
-                                      propagation_output.residuals)
-
+        print(propagation_output.profile)
 
-        numerical_integration_parameters_out = WiseNumericalIntegrationParameters(self.calculation_type,
-                                                                                  detector_size,
-                                                                                  number_of_points,
-                                                                                  propagation_output.number_of_points)
+        wavefront_out = wise_output.get_wavefront()
+        numerical_integration_parameters_out = wise_output.get_numerical_integration_parameters()
 
-        optical_element_out = WiseOpticalElement(inner_wise_optical_element=elliptic_mirror)
+        optical_element_out = wise_output.get_optical_element()
 
         data_to_plot = numpy.zeros((5, len(propagation_output.mir_s)))
         data_to_plot[0, :] = propagation_output.mir_s / self.workspace_units_to_m
@@ -6,10 +6,10 @@ from orangewidget.settings import Setting
 from oasys.widgets import gui as oasysgui
 from oasys.widgets import congruence
 
-from orangecontrib.wise.util.wise_objects import WiseSource, WiseOutput
+from orangecontrib.wise.util.wise_objects import WiseOutput
+from orangecontrib.wise.util.wise_pipeline import create_gaussian_source
 from orangecontrib.wise.widgets.gui.ow_wise_widget import WiseWidget
 
-from wiselib import Optics
 
 class OWGaussianSource1d(WiseWidget):
     name = "GaussianSource1d"
@@ -93,11 +93,15 @@ class OWGaussianSource1d(WiseWidget):
             self.x_origin = 0.0
             self.theta    = 0.0
 
-        wise_inner_source = Optics.GaussianSource_1d(Lambda=self.source_lambda * 1e-9,
-                                                     Waist0=self.source_sigma * self.workspace_units_to_m * numpy.sqrt(2),
-                                                     ZOrigin = self.z_origin * self.workspace_units_to_m,
-                                                     YOrigin =  self.x_origin * self.workspace_units_to_m,
-                                                     Theta = numpy.radians(self.theta))
+        wise_source = create_gaussian_source(wavelength=self.source_lambda * 1e-9,
+                                             sigma=self.source_sigma * self.workspace_units_to_m,
+                                             z_origin=self.z_origin * self.workspace_units_to_m,
+                                             y_origin=self.x_origin * self.workspace_units_to_m,
+                                             theta=self.theta,
+                                             source_on_mirror_focus=(self.source_position == 1),
+                                             longitudinal_correction=self.longitudinal_correction * self.workspace_units_to_m,
+                                             transverse_correction=self.transverse_correction * self.workspace_units_to_m,
+                                             delta_theta=self.delta_theta)
 
         data_to_plot = numpy.zeros((2, 100))
 
@@ -107,7 +111,7 @@ class OWGaussianSource1d(WiseWidget):
         data_to_plot[0, :] = numpy.linspace((-5*sigma) + mu, mu + (5*sigma), 100)
         data_to_plot[1, :] = (norm.pdf(data_to_plot[0, :], mu, sigma))**2
 
-        return wise_inner_source, data_to_plot
+        return wise_source, data_to_plot
 
     def getTitles(self):
         return ["Gaussian Source Intensity"]
@@ -122,13 +126,5 @@ class OWGaussianSource1d(WiseWidget):
         return calculation_output[1]
 
     def extract_wise_output_from_calculation_output(self, calculation_output):
-        wise_source = WiseSource(inner_wise_source=calculation_output[0])
-        wise_source.set_property("source_on_mirror_focus", self.source_position == 1)
-
-        if self.source_position == 1:
-            wise_source.set_property("longitudinal_correction", self.longitudinal_correction * self.workspace_units_to_m)
-            wise_source.set_property("transverse_correction", self.transverse_correction * self.workspace_units_to_m)
-            wise_source.set_property("delta_theta", numpy.radians(self.delta_theta))
-
-        return WiseOutput(source=wise_source)
+        return WiseOutput(source=calculation_output[0])
 
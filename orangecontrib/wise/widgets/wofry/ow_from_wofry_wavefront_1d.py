@@ -1,10 +1,13 @@
 import numpy
+from PyQt5.QtWidgets import QMessageBox
 from orangewidget import gui
 from orangewidget.settings import Setting
 from oasys.widgets import gui as oasysgui
 from oasys.widgets import congruence
 
 from orangecontrib.wise.util.wise_objects import WiseSource, WiseOutput
+from orangecontrib.wise.util.wise_wofry import with_electric_field
+from orangecontrib.wise.util.wise_propagator import WisePropagatorsChain
 from orangecontrib.wise.widgets.gui.ow_wise_widget import WiseWidget
 
 from wofry.propagator.wavefront1D.generic_wavefront import GenericWavefront1D
@@ -34,11 +37,14 @@ class OWFromWofryWavefront1d(WiseWidget):
     reset_phase = Setting(1)
     normalization_factor = Setting(1000)
 
+    n_pools = Setting(0)
+
     wofry_wavefront = None
 
     def build_gui(self):
+        WisePropagatorsChain.Instance().acquire_worker_pool(self)
 
-        main_box = oasysgui.widgetBox(self.controlArea, "Wofry Wavefront Parameters", orientation="vertical", width=self.CONTROL_AREA_WIDTH-5, height=300)
+        main_box = oasysgui.widgetBox(self.controlArea, "Wofry Wavefront Parameters", orientation="vertical", width=self.CONTROL_AREA_WIDTH-5, height=330)
 
         oasysgui.lineEdit(main_box, self, "source_lambda", "Wavelength [nm]", labelWidth=260, valueType=float, orientation="horizontal")
 
@@ -68,6 +74,23 @@ class OWFromWofryWavefront1d(WiseWidget):
 
         oasysgui.lineEdit(main_box, self, "normalization_factor", "Normalization Factor", labelWidth=260, valueType=float, orientation="horizontal")
 
+        gui.separator(main_box, height=5)
+
+        oasysgui.lineEdit(main_box, self, "n_pools", "Nr. Parallel Processes (0 = none)", labelWidth=260, valueType=int, orientation="horizontal", callback=self.set_NPools)
+
+        self.set_NPools()
+
+    def set_NPools(self):
+        try:
+            WisePropagatorsChain.Instance().set_n_pools(congruence.checkPositiveNumber(self.n_pools, "Nr. Parallel Processes"), self)
+        except Exception as exception:
+            QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
+
+    def onDeleteWidget(self):
+        WisePropagatorsChain.Instance().release_worker_pool(self)
+
+        super().onDeleteWidget()
+
     def set_SourcePosition(self):
         self.source_position_box_1.setVisible(self.source_position == 0)
         self.source_position_box_2.setVisible(self.source_position == 1)
@@ -93,6 +116,8 @@ class OWFromWofryWavefront1d(WiseWidget):
         else:
             self.theta = congruence.checkAngle(self.theta, "Theta")
 
+        self.n_pools = congruence.checkPositiveNumber(self.n_pools, "Nr. Parallel Processes")
+
     def do_wise_calculation(self):
         if self.source_position == 1:
             self.z_origin = 0.0
@@ -106,18 +131,20 @@ class OWFromWofryWavefront1d(WiseWidget):
         else:
             electric_fields = self.wofry_wavefront.get_amplitude()*rinorm + self.wofry_wavefront.get_phase()
 
-        self.wofry_wavefront.set_complex_amplitude(electric_fields)
+        # the input wavefront is shared with the sender: the normalized field goes in a new wavefront, on the same abscissas
+        wofry_wavefront = with_electric_field(self.wofry_wavefront, electric_fields)
 
-        wise_inner_source = WofryWavefrontSource_1d(wofry_wavefront=self.wofry_wavefront,
+        wise_inner_source = WofryWavefrontSource_1d(wofry_wavefront=wofry_wavefront,
                                                     ZOrigin = self.z_origin * self.workspace_units_to_m,
                                                     YOrigin =  self.x_origin * self.workspace_units_to_m,
                                                     Theta = numpy.radians(self.theta),
-                                                    units_converter=self.workspace_units_to_m)
+                                                    units_converter=self.workspace_units_to_m,
+                                                    n_pools=self.n_pools)
 
-        data_to_plot = numpy.zeros((2, self.wofry_wavefront.size()))
+        data_to_plot = numpy.zeros((2, wofry_wavefront.size()))
 
-        data_to_plot[0, :] = self.wofry_wavefront._electric_field_array.get_abscissas()/self.workspace_units_to_m
-        data_to_plot[1, :] = numpy.abs(self.wofry_wavefront._electric_field_array.get_values())**2
+        data_to_plot[0, :] = wofry_wavefront._electric_field_array.get_abscissas()/self.workspace_units_to_m
+        data_to_plot[1, :] = numpy.abs(wofry_wavefront._electric_field_array.get_values())**2
 
         return wise_inner_source, data_to_plot
 
@@ -148,18 +175,26 @@ class OWFromWofryWavefront1d(WiseWidget):
         self.setStatusMessage("")
 
         if not input_data is None:
-            self.wofry_wavefront = input_data.duplicate()
+            self.wofry_wavefront = input_data # never modified: no copy
             self.source_lambda = round(self.wofry_wavefront._wavelength*1e9, 4)
 
             if self.is_automatic_run: self.compute()
 
-from wiselib import Rayman
+from orangecontrib.wise.util.wise_cache import WiseLRUCache, WiseHashError, get_hash
+from orangecontrib.wise.util.wise_propagator import huygens_integral
+
+# fields evaluated from the WOFRY samples, by source and target coordinates: shared by all the sources, a new
+# source built on the same wavefront (e.g. re-running the mirror) doesn't repeat the integral
+_field_cache = WiseLRUCache(max_size=256*1024**2, name="Wofry source field cache")
+
+def get_field_cache():
+    return _field_cache
 
 class WofryWavefrontSource_1d(object):
     #================================================
     #     __init__
     #================================================
-    def __init__(self, wofry_wavefront=GenericWavefront1D(), ZOrigin = 0, YOrigin = 0, Theta = 0, units_converter=1e-2):
+    def __init__(self, wofry_wavefront=GenericWavefront1D(), ZOrigin = 0, YOrigin = 0, Theta = 0, units_converter=1e-2, n_pools=0):
         self.wofry_wavefront=wofry_wavefront
         self.Lambda = self.wofry_wavefront._wavelength
         self.Name = 'Wofry Wavefront @ %0.2fnm' % (self.Lambda *1e9)
@@ -168,55 +203,90 @@ class WofryWavefrontSource_1d(object):
         self.YOrigin = YOrigin
         self.ThetaPropagation = Theta
 
-        parameters, covariance_matrix_pv = WofryWavefrontSource_1d.gaussian_fit(self.wofry_wavefront.get_intensity(), self.wofry_wavefront.get_abscissas())
+        self.units_converter = units_converter
 
-        self.Waist0 = parameters[3]
+        # not part of the state of the source (see get_hash): Waist0 is fitted on first access
+        self._wise_n_pools = n_pools
+        self._wise_waist0 = None
 
-        self.units_converter = units_converter
+    #================================================
+    #     Waist0
+    #================================================
+    # FWHM from the second moment of the intensity: no fit
+    def get_waist_estimate(self):
+        return 2.355*WofryWavefrontSource_1d.moments(self.wofry_wavefront.get_abscissas(), self.wofry_wavefront.get_intensity())[1]
+
+    @property
+    def Waist0(self):
+        if self._wise_waist0 is None:
+            try:
+                parameters, _ = WofryWavefrontSource_1d.gaussian_fit(self.wofry_wavefront.get_abscissas(), self.wofry_wavefront.get_intensity())
+
+                self._wise_waist0 = parameters[3]
+            except RuntimeError: # no convergence
+                self._wise_waist0 = self.get_waist_estimate()
+
+        return self._wise_waist0
+
+    @Waist0.setter
+    def Waist0(self, waist0):
+        self._wise_waist0 = waist0
 
     #================================================
     #     EvalField
     #================================================
-    def EvalField_XYLab(self, x = numpy.array(None), y = numpy.array(None)):
+    def _eval_field(self, x, y):
         wav_E = self.wofry_wavefront._electric_field_array.get_values()
-        wav_x = numpy.zeros(len(wav_E)) + self.ZOrigin
-        wav_y = self.wofry_wavefront._electric_field_array.get_abscissas()*self.units_converter + self.YOrigin
+        abscissas = self.wofry_wavefront._electric_field_array.get_abscissas()
+
+        try:
+            key = get_hash("wofry_source_field", self.Lambda, self.ZOrigin, self.YOrigin, self.units_converter, wav_E, abscissas, x, y)
+        except WiseHashError:
+            key = None # never cached
 
-        electric_fields = Rayman.HuygensIntegral_1d_MultiPool(self.Lambda,
-                                                              wav_E,
-                                                              wav_x,
-                                                              wav_y,
-                                                              x,
-                                                              y)
-        return electric_fields
+        electric_fields = None if key is None else _field_cache.get(key)
 
+        if electric_fields is None:
+            wav_x = numpy.zeros(len(wav_E)) + self.ZOrigin
+            wav_y = abscissas*self.units_converter + self.YOrigin
 
+            electric_fields = huygens_integral(self.Lambda,
+                                               wav_E,
+                                               wav_x,
+                                               wav_y,
+                                               numpy.asarray(x, dtype=float),
+                                               numpy.asarray(y, dtype=float),
+                                               self._wise_n_pools)
+            electric_fields.flags.writeable = False
+
+            if not key is None: _field_cache.put(key, electric_fields)
+
+        return electric_fields.copy()
+
+    def EvalField_XYLab(self, x = numpy.array(None), y = numpy.array(None)):
+        return self._eval_field(x, y)
 
     def EvalField_XYSelf(self, x = numpy.array(None), y = numpy.array(None)):
-        wav_E = self.wofry_wavefront._electric_field_array.get_values()
-        wav_x = numpy.zeros(len(wav_E)) + self.ZOrigin
-        wav_y = self.wofry_wavefront._electric_field_array.get_abscissas()*self.units_converter + self.YOrigin
+        return self._eval_field(x, y)
 
-        electric_fields = Rayman.HuygensIntegral_1d_MultiPool(self.Lambda,
-                                                              wav_E,
-                                                              wav_x,
-                                                              wav_y,
-                                                              x,
-                                                              y)
+    # mean and standard deviation of the distribution y(x)
+    @classmethod
+    def moments(cls, data_x, data_y):
+        x = numpy.asarray(data_x)
+        y_norm = numpy.asarray(data_y)/numpy.sum(data_y)
 
-        return electric_fields
+        mean = numpy.sum(x*y_norm)
 
+        return mean, numpy.sqrt(numpy.sum(y_norm*(x-mean)**2))
 
     @classmethod
     def gaussian_fit(cls, data_x, data_y):
-        from scipy import optimize, asarray
+        from scipy import optimize
 
-        x = asarray(data_x)
-        y = asarray(data_y)
-        y_norm = y/sum(y)
+        x = numpy.asarray(data_x)
+        y = numpy.asarray(data_y)
 
-        mean = sum(x*y_norm)
-        sigma = numpy.sqrt(sum(y_norm*(x-mean)**2)/len(x))
+        mean, sigma = WofryWavefrontSource_1d.moments(x, y)
         amplitude = max(y)
 
         parameters, covariance_matrix = optimize.curve_fit(WofryWavefrontSource_1d.gaussian_function, x, y, p0 = [amplitude, mean, sigma])
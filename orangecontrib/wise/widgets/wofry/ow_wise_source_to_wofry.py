@@ -10,9 +10,10 @@ from oasys.widgets import gui as oasysgui
 from oasys.widgets.widget import AutomaticWidget
 
 from wofry.propagator.wavefront1D.generic_wavefront import GenericWavefront1D
-from wofrywise.propagator.wavefront1D.wise_wavefront import WiseWavefront
 
 from orangecontrib.wise.util.wise_objects import WiseOutput
+from orangecontrib.wise.util.wise_trace import traced_method
+from orangecontrib.wise.util.wise_wofry import wise_to_wofry
 
 
 class OWWiseSourceToWofryWavefront1d(AutomaticWidget):
@@ -64,6 +65,7 @@ class OWWiseSourceToWofryWavefront1d(AutomaticWidget):
 
         gui.button(main_box, self, "Compute", height=40, callback=self.compute)
 
+    @traced_method("widget")
     def compute(self):
         if not self.source is None:
             try:
@@ -73,12 +75,7 @@ class OWWiseSourceToWofryWavefront1d(AutomaticWidget):
 
                 electric_fields = self.source.EvalField_XYSelf(z=numpy.zeros(int(self.number_of_points)), y=yy)
 
-                source_wavefront = WiseWavefront(wavelength=self.source.Lambda,
-                                                 positions=yy/self.workspace_units_to_m,
-                                                 electric_fields=electric_fields,
-                                                 residuals=numpy.zeros(int(self.number_of_points)))
-
-                self.send("GenericWavefront1D", source_wavefront.toGenericWavefront())
+                self.send("GenericWavefront1D", wise_to_wofry(self.source.Lambda, yy/self.workspace_units_to_m, electric_fields, transfer=True))
             except Exception as exception:
                 QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
 
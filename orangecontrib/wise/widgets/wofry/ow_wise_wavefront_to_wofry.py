@@ -1,5 +1,3 @@
-import numpy
-
 from PyQt5.QtWidgets import QApplication, QMessageBox
 from PyQt5.QtCore import QRect
 
@@ -11,10 +9,10 @@ from oasys.widgets.widget import AutomaticWidget
 
 from wofry.propagator.wavefront1D.generic_wavefront import GenericWavefront1D
 
-from wofrywise.propagator.wavefront1D.wise_wavefront import WiseWavefront
-
 from orangecontrib.wise.util.wise_objects import WiseOutput, WiseNumericalIntegrationParameters
 from orangecontrib.wise.util.wise_propagator import WisePropagatorsChain, WisePropagationAlgorithms, WisePropagationParameters
+from orangecontrib.wise.util.wise_trace import traced_method
+from orangecontrib.wise.util.wise_wofry import wise_to_wofry
 
 class OWWiseSourceToWofryWavefront1d(AutomaticWidget):
     name = "Wise Wavefront To Wofry Wavefront 1D"
@@ -74,25 +72,21 @@ class OWWiseSourceToWofryWavefront1d(AutomaticWidget):
         label = self.le_defocus_sweep.parent().layout().itemAt(0).widget()
         label.setText(label.text() + " [" + self.workspace_units_label + "]")
 
+    @traced_method("widget")
     def compute(self):
         if not self.input_data is None:
             try:
                 detector_size = self.area_size*1e-6
                 number_of_points = self.number_of_points
     
-                previous_numerical_integration_parameters = self.input_data.get_numerical_integration_parameters()
-                numerical_integration_parameters = WiseNumericalIntegrationParameters(WiseNumericalIntegrationParameters.USER_DEFINED, detector_size, number_of_points)
-    
-                propagation_type = WisePropagationParameters.MIRROR_AND_DETECTOR
+                numerical_integration_parameters = WiseNumericalIntegrationParameters(WiseNumericalIntegrationParameters.USER_DEFINED, detector_size, number_of_points,
+                                                                                      detector_number_of_points=number_of_points)
     
                 #
-                # No need to recalculated wavefront on previous mirror surface
-                # if numerical integration parameters are identical
+                # the wavefront on the mirror surface is recalculated only if not already available
+                # in the mirror wavefronts cache of the propagators chain
                 #
-                if WiseNumericalIntegrationParameters.USER_DEFINED == previous_numerical_integration_parameters.calculation_type:
-                    if self.number_of_points == previous_numerical_integration_parameters.number_of_points:
-                        propagation_type = WisePropagationParameters.DETECTOR_ONLY
-                        numerical_integration_parameters.calculated_number_of_points = previous_numerical_integration_parameters.calculated_number_of_points
+                propagation_type = WisePropagationParameters.MIRROR_AND_DETECTOR
     
                 propagation_parameter = WisePropagationParameters(propagation_type=propagation_type,
                                                                   source=self.input_data.get_source().inner_wise_source,
@@ -104,12 +98,11 @@ class OWWiseSourceToWofryWavefront1d(AutomaticWidget):
                 propagation_output = WisePropagatorsChain.Instance().do_propagation(propagation_parameter,
                                                                                     WisePropagationAlgorithms.HuygensIntegral)
     
-                wavefront = WiseWavefront(wavelength=self.input_data.get_source().inner_wise_source.Lambda,
-                                          positions=propagation_output.det_s,
-                                          electric_fields=propagation_output.electric_fields,
-                                          residuals=numpy.zeros(self.number_of_points))
-    
-                self.send("GenericWavefront1D", wavefront.toGenericWavefront())
+                # the propagation output is not used anymore: its field is handed over (copied only if read-only, e.g. from the disk cache)
+                self.send("GenericWavefront1D", wise_to_wofry(self.input_data.get_source().inner_wise_source.Lambda,
+                                                              propagation_output.det_s,
+                                                              propagation_output.electric_fields,
+                                                              transfer=True))
             except Exception as exception:
                 QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
 
@@ -47,7 +47,7 @@ INSTALL_REQUIRES = (
     'wofrywise'
 )
 
-PACKAGES = find_packages(exclude=('*.tests', '*.tests.*', 'tests.*', 'tests'))
+PACKAGES = find_packages(exclude=('*.tests', '*.tests.*', 'tests.*', 'tests', 'benchmarks', 'benchmarks.*'))
 
 PACKAGE_DATA = {
     "orangecontrib.wise.widgets.wise":["icons/*.png", "icons/*.jpg"],
@@ -64,6 +64,11 @@ ENTRY_POINTS = {
         "WISE Tools = orangecontrib.wise.widgets.tools",
         "WISE Wofry = orangecontrib.wise.widgets.wofry",
     ),
+    'console_scripts' : (
+        "wise-run = orangecontrib.wise.util.wise_pipeline:main",
+        "wise-scan = orangecontrib.wise.util.wise_scan:main",
+        "wise-ensemble = orangecontrib.wise.util.wise_montecarlo:main",
+    ),
 }
 
 if __name__ == '__main__':
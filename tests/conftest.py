@@ -0,0 +1,35 @@
+import os, sys, multiprocessing
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#
+# the tests run on wiselib when installed, on the numpy stand-in of benchmarks/ otherwise
+# (same call signatures, not the same physics: the tests check WISE, not wiselib)
+#
+from benchmarks import wiselib_standin
+
+if not wiselib_standin.is_wiselib_available():
+    wiselib_standin.install()
+
+    # the pool workers must inherit the stand-in modules instead of importing wiselib again
+    if "fork" in multiprocessing.get_all_start_methods(): multiprocessing.set_start_method("fork", force=True)
+
+# aperture of 4 mm focused at 1.2 m: get_geometry(number_of_mirror_points, number_of_detector_points) returns
+# wavelength, mir_E, mir_x, mir_y, det_x, det_y
+@pytest.fixture
+def get_geometry():
+    def geometry(number_of_mirror_points=400, number_of_detector_points=101):
+        wavelength = 5e-9
+
+        mir_x = numpy.zeros(number_of_mirror_points)
+        mir_y = numpy.linspace(-2e-3, 2e-3, number_of_mirror_points)
+        mir_E = numpy.exp(2j*numpy.pi/wavelength*numpy.sqrt(1.2**2 + mir_y**2))
+
+        det_x = numpy.full(number_of_detector_points, 1.2)
+        det_y = numpy.linspace(-25e-6, 25e-6, number_of_detector_points)
+
+        return wavelength, mir_E, mir_x, mir_y, det_x, det_y
+
+    return geometry
@@ -0,0 +1,66 @@
+import numpy
+import pytest
+
+from orangecontrib.wise.util.wise_cache import WiseLRUCache, WiseHashError, get_hash, MAX_HASH_DEPTH
+
+class Node(object):
+    def __init__(self, value, child=None):
+        self.value = value
+        self.child = child
+
+def get_chain(length, value):
+    node = Node(value)
+    for _ in range(length): node = Node(0, node)
+
+    return node
+
+def test_hash_depends_on_state():
+    assert get_hash(Node(1.0)) == get_hash(Node(1.0))
+    assert get_hash(Node(1.0)) != get_hash(Node(2.0))
+    assert get_hash(numpy.arange(3.0)) != get_hash(numpy.arange(3))
+
+def test_volatile_attributes_are_skipped():
+    node = Node(1.0)
+    node.LastResidualUsed = numpy.arange(10)
+
+    assert get_hash(node) == get_hash(Node(1.0))
+
+def test_circular_references():
+    node = Node(1.0)
+    node.child = node
+
+    assert get_hash(node) == get_hash(node)
+
+def test_too_deep_raises():
+    with pytest.raises(WiseHashError):
+        get_hash(get_chain(MAX_HASH_DEPTH + 2, 1.0))
+
+def test_no_readable_state_raises():
+    with pytest.raises(WiseHashError):
+        get_hash(object())
+
+def test_lru_entries_are_read_only():
+    cache = WiseLRUCache(max_size=1024**2)
+
+    mir_E = numpy.ones(10, dtype=complex)
+    cache.put("key", (numpy.arange(10.0), mir_E, 10))
+
+    entry = cache.get("key")
+
+    assert not entry[0].flags.writeable
+    with pytest.raises(ValueError):
+        entry[1][0] = 0.0
+
+    assert numpy.all(cache.get("key")[1] == 1.0)
+
+def test_lru_eviction():
+    cache = WiseLRUCache(max_size=200)
+
+    cache.put("a", numpy.zeros(10))
+    cache.put("b", numpy.zeros(10))
+    cache.get("a")
+    cache.put("c", numpy.zeros(10))
+
+    assert "a" in cache and "c" in cache and not "b" in cache
+    assert cache.statistics.evictions == 1
+    assert cache.get_size() <= 200
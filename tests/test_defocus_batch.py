@@ -0,0 +1,44 @@
+import numpy, pytest
+
+from orangecontrib.wise.util.wise_objects import WiseNumericalIntegrationParameters
+from orangecontrib.wise.util.wise_propagator import WisePropagationAlgorithms
+from orangecontrib.wise.util.wise_pipeline import create_gaussian_source, create_elliptical_mirror, position_source_at_mirror_focus, \
+    propagate_to_mirror, propagate_to_detector
+
+DEFOCUS_LIST = numpy.array([-1e-3, 0.0, 1e-3])
+
+def get_mirror_output(algorithm):
+    elliptic_mirror = create_elliptical_mirror(98.0, 1.2, 2.5, 0.4)
+    source = position_source_at_mirror_focus(create_gaussian_source(5e-9, 20e-6, source_on_mirror_focus=True), elliptic_mirror)
+
+    wise_output, _ = propagate_to_mirror(source, elliptic_mirror, WiseNumericalIntegrationParameters.USER_DEFINED, number_of_points=300, algorithm=algorithm)
+
+    return wise_output
+
+def propagate(wise_output, defocus, algorithm):
+    return propagate_to_detector(wise_output, 50e-6, defocus, WiseNumericalIntegrationParameters.USER_DEFINED, 300,
+                                 algorithm=algorithm, detector_number_of_points=100)
+
+@pytest.mark.parametrize("algorithm", [WisePropagationAlgorithms.HuygensIntegral, WisePropagationAlgorithms.VectorizedHuygensIntegral])
+def test_batch_equals_single_planes(algorithm):
+    wise_output = get_mirror_output(algorithm)
+
+    batch_output = propagate(wise_output, DEFOCUS_LIST, algorithm)
+
+    assert batch_output.electric_fields.shape == (len(DEFOCUS_LIST), 100)
+    assert batch_output.det_s.shape == (len(DEFOCUS_LIST), 100)
+    assert len(batch_output.HEW) == len(DEFOCUS_LIST)
+
+    for index, defocus in enumerate(DEFOCUS_LIST):
+        plane_output = propagate(wise_output, defocus, algorithm)
+
+        assert plane_output.electric_fields.shape == (100,)
+        assert numpy.ndim(plane_output.HEW) == 0
+        assert numpy.array_equal(plane_output.det_s, batch_output.det_s[index])
+        assert numpy.allclose(plane_output.electric_fields, batch_output.electric_fields[index], rtol=1e-12, atol=0.0)
+        assert numpy.isclose(plane_output.HEW, batch_output.HEW[index], rtol=1e-12)
+
+def test_focus_is_the_smallest_spot():
+    batch_output = propagate(get_mirror_output(WisePropagationAlgorithms.HuygensIntegral), DEFOCUS_LIST, WisePropagationAlgorithms.HuygensIntegral)
+
+    assert numpy.argmin(batch_output.HEW) == 1
@@ -0,0 +1,51 @@
+import numpy
+import pytest
+
+from orangecontrib.wise.util.wise_objects import WiseNumericalIntegrationParameters
+from orangecontrib.wise.util.wise_propagator import get_detector_number_of_points, MIN_DETECTOR_NUMBER_OF_POINTS
+from orangecontrib.wise.util.wise_pipeline import create_gaussian_source, create_elliptical_mirror, position_source_at_mirror_focus, \
+    propagate_to_mirror, propagate_to_detector
+
+def get_number_of_points(detector_size, number_of_mirror_points=20000, detector_number_of_points=0):
+    elliptic_mirror = create_elliptical_mirror(98.0, 1.2, 2.5, 0.4)
+    mir_x, mir_y = elliptic_mirror.GetXY_MeasuredMirror(number_of_mirror_points, 0)
+
+    return get_detector_number_of_points(5e-9, elliptic_mirror, mir_x, mir_y,
+                                         WiseNumericalIntegrationParameters(WiseNumericalIntegrationParameters.USER_DEFINED, detector_size,
+                                                                            number_of_mirror_points, detector_number_of_points=detector_number_of_points))
+
+def test_user_defined_detector_sampling():
+    assert get_number_of_points(50e-6, detector_number_of_points=100) == 100
+    assert get_number_of_points(50e-6, detector_number_of_points=30000) == 30000 # not capped: the user asked for it
+
+@pytest.mark.parametrize("detector_size", [10e-6, 50e-6, 100e-6])
+def test_odd_detector_sampling(detector_size):
+    number_of_points = get_number_of_points(detector_size)
+
+    # a point on F2, about 4 points per diffraction limited spot (~0.34 um)
+    assert number_of_points % 2 == 1
+    assert MIN_DETECTOR_NUMBER_OF_POINTS < number_of_points < 20000
+    assert number_of_points > get_number_of_points(detector_size/2)
+
+def test_minimum_detector_sampling():
+    assert get_number_of_points(1e-6) == MIN_DETECTOR_NUMBER_OF_POINTS
+    assert get_number_of_points(1e-6, number_of_mirror_points=50) == 50
+
+def test_detector_sampling_capped_at_the_mirror_sampling():
+    assert get_number_of_points(50e-6, number_of_mirror_points=300) == 300
+    assert get_number_of_points(1e-3, number_of_mirror_points=5000) == 5000
+
+def test_same_hew_of_the_mirror_sampling():
+    elliptic_mirror = create_elliptical_mirror(98.0, 1.2, 2.5, 0.4)
+    source = position_source_at_mirror_focus(create_gaussian_source(5e-9, 20e-6, source_on_mirror_focus=True), elliptic_mirror)
+    wise_output, _ = propagate_to_mirror(source, elliptic_mirror, WiseNumericalIntegrationParameters.USER_DEFINED, number_of_points=2000)
+
+    defocus_list = numpy.array([-1e-3, -2e-4, 0.0, 5e-4])
+
+    propagation_output = propagate_to_detector(wise_output, 50e-6, defocus_list, WiseNumericalIntegrationParameters.USER_DEFINED, 2000)
+    reference_output = propagate_to_detector(wise_output, 50e-6, defocus_list, WiseNumericalIntegrationParameters.USER_DEFINED, 2000,
+                                             detector_number_of_points=2000)
+
+    assert propagation_output.detector_number_of_points < 2000
+    assert reference_output.detector_number_of_points == 2000
+    assert numpy.max(numpy.abs(propagation_output.HEW/reference_output.HEW - 1)) < 4e-3
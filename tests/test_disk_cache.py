@@ -0,0 +1,93 @@
+import os
+import numpy
+import pytest
+
+from orangecontrib.wise.util import wise_propagator
+from orangecontrib.wise.util.wise_cache import WiseDiskCache
+from orangecontrib.wise.util.wise_objects import WiseNumericalIntegrationParameters
+from orangecontrib.wise.util.wise_propagator import WisePropagatorsChain, get_version_stamp
+from orangecontrib.wise.util.wise_pipeline import create_gaussian_source, create_elliptical_mirror, position_source_at_mirror_focus, \
+    propagate_to_mirror, propagate_to_detector
+
+def get_entry():
+    return {"electric_fields": numpy.exp(1j*numpy.arange(10.0)), "HEW": 1.5e-6, "residuals": None}
+
+def test_hit_and_miss(tmp_path):
+    disk_cache = WiseDiskCache(str(tmp_path), version_stamp="a")
+
+    assert disk_cache.get("key") is None
+    disk_cache.put("key", get_entry())
+
+    assert "key" in disk_cache
+    entry = disk_cache.get("key")
+
+    assert numpy.array_equal(entry["electric_fields"], get_entry()["electric_fields"])
+    assert entry["HEW"] == 1.5e-6
+    assert not "residuals" in entry # None is not stored
+    assert not entry["electric_fields"].flags.writeable
+    assert disk_cache.get("other key") is None
+
+    assert disk_cache.statistics.hits == 1
+    assert disk_cache.statistics.misses == 2
+
+def test_entries_survive_with_the_same_version_stamp(tmp_path):
+    WiseDiskCache(str(tmp_path), version_stamp="a").put("key", get_entry())
+
+    disk_cache = WiseDiskCache(str(tmp_path), version_stamp="a")
+
+    assert "key" in disk_cache
+    assert disk_cache.get_size() > 0
+
+def test_new_version_stamp_invalidates_the_entries(tmp_path):
+    WiseDiskCache(str(tmp_path), version_stamp="a").put("key", get_entry())
+
+    disk_cache = WiseDiskCache(str(tmp_path), version_stamp="b")
+
+    assert disk_cache.get("key") is None
+    assert disk_cache.get_size() == 0
+    assert os.listdir(str(tmp_path)) == ["v_b"]
+
+def test_eviction(tmp_path):
+    disk_cache = WiseDiskCache(str(tmp_path), version_stamp="a")
+
+    disk_cache.put("first", get_entry())
+    entry_size = disk_cache.get_size()
+
+    disk_cache.set_max_size(int(2.5*entry_size))
+    disk_cache.put("second", get_entry())
+    os.utime(os.path.join(str(tmp_path), "v_a", "first"), (0, 0)) # least recently used
+    disk_cache.put("third", get_entry())
+
+    assert not "first" in disk_cache
+    assert "second" in disk_cache and "third" in disk_cache
+    assert disk_cache.get_size() == 2*entry_size
+    assert disk_cache.statistics.evictions == 1
+
+def test_version_stamp(monkeypatch):
+    version_stamp = get_version_stamp()
+
+    assert version_stamp == get_version_stamp()
+
+    monkeypatch.setattr(wise_propagator, "PROPAGATORS_VERSION", wise_propagator.PROPAGATORS_VERSION + 1)
+
+    assert get_version_stamp() != version_stamp
+
+def test_propagation_from_the_disk_cache(tmp_path):
+    elliptic_mirror = create_elliptical_mirror(98.0, 1.2, 2.5, 0.4)
+    source = position_source_at_mirror_focus(create_gaussian_source(5e-9, 20e-6, source_on_mirror_focus=True), elliptic_mirror)
+    wise_output, _ = propagate_to_mirror(source, elliptic_mirror, WiseNumericalIntegrationParameters.USER_DEFINED, number_of_points=200)
+
+    chain = WisePropagatorsChain.Instance()
+    chain.set_disk_cache(str(tmp_path))
+
+    try:
+        calculated = propagate_to_detector(wise_output, 50e-6, 0.0, WiseNumericalIntegrationParameters.USER_DEFINED, 200, detector_number_of_points=100)
+        cached = propagate_to_detector(wise_output, 50e-6, 0.0, WiseNumericalIntegrationParameters.USER_DEFINED, 200, detector_number_of_points=100)
+
+        assert chain.get_disk_cache().statistics.misses == 1
+        assert chain.get_disk_cache().statistics.hits == 1
+        assert numpy.array_equal(cached.electric_fields, calculated.electric_fields)
+        assert cached.HEW == calculated.HEW
+        assert cached.metrics.HEW == pytest.approx(calculated.metrics.HEW)
+    finally:
+        chain.set_disk_cache(None)
@@ -0,0 +1,53 @@
+import numpy
+import pytest
+
+from orangecontrib.wise.util.wise_metrics import METRICS, get_focal_metrics, get_intensities
+from orangecontrib.wise.util.wise_sweep import WiseSweepResult
+from orangecontrib.wise.util.wise_export import save_sweep_result, load_sweep_result
+
+PARAMETERS = {"wavelength": 5e-9, "number_of_points": numpy.int64(300), "single_precision": numpy.bool_(False),
+              "algorithm": "HuygensIntegral", "figure_error_file": None, "defocus_range": (-1e-3, 1e-3)}
+
+def get_sweep_result(computed=slice(None)):
+    defocus_list = numpy.linspace(-1e-3, 1e-3, 5)
+    positions = numpy.tile(numpy.linspace(-25e-6, 25e-6, 65), (5, 1))
+    electric_fields = numpy.exp(-positions**2/(4*(2e-6 + 5e-3*numpy.abs(defocus_list)[:, numpy.newaxis])**2) + 1j*positions*1e5)
+    hews = numpy.linspace(3e-6, 5e-6, 5)
+
+    sweep_result = WiseSweepResult(defocus_list)
+    sweep_result.set_planes(computed, positions[computed], electric_fields[computed], hews[computed],
+                            get_focal_metrics(positions[computed], get_intensities(electric_fields[computed]), hews=hews[computed]))
+
+    return sweep_result
+
+def check_round_trip(file_name, sweep_result):
+    save_sweep_result(file_name, sweep_result, PARAMETERS)
+    loaded_sweep_result, parameters = load_sweep_result(file_name)
+
+    for name in ("defocus_list", "positions", "electric_fields", "hews", "computed"):
+        assert numpy.array_equal(getattr(loaded_sweep_result, name), getattr(sweep_result, name), equal_nan=name != "computed")
+    for name in METRICS:
+        assert numpy.array_equal(getattr(loaded_sweep_result.metrics, name), getattr(sweep_result.metrics, name), equal_nan=True)
+
+    return parameters
+
+def test_npz_round_trip(tmp_path):
+    parameters = check_round_trip(str(tmp_path / "sweep.npz"), get_sweep_result())
+
+    assert parameters == {"wavelength": 5e-9, "number_of_points": 300, "single_precision": False,
+                          "algorithm": "HuygensIntegral", "figure_error_file": None, "defocus_range": "(-0.001, 0.001)"}
+
+def test_npz_round_trip_of_a_partial_sweep(tmp_path):
+    check_round_trip(str(tmp_path / "sweep.npz"), get_sweep_result(computed=numpy.array([0, 2])))
+
+def test_hdf5_round_trip(tmp_path):
+    pytest.importorskip("h5py")
+
+    parameters = check_round_trip(str(tmp_path / "sweep.h5"), get_sweep_result())
+
+    assert parameters["number_of_points"] == 300
+    assert parameters.get("figure_error_file") is None
+
+def test_wrong_sweeps_and_formats(tmp_path):
+    with pytest.raises(ValueError): save_sweep_result(str(tmp_path / "sweep.npz"), WiseSweepResult([0.0]))
+    with pytest.raises(ValueError): save_sweep_result(str(tmp_path / "sweep.txt"), get_sweep_result())
@@ -0,0 +1,55 @@
+import numpy, pytest
+
+from orangecontrib.wise.util.wise_focus import golden_section_best_focus, estimate_number_of_propagations
+
+# HEW of a caustic with waist at best_focus [m]
+def get_hew_calculator(best_focus, calls=None):
+    def calculate_hews(defocus_values):
+        if not calls is None: calls.append(len(defocus_values))
+
+        return 1e-6 + 2e-3*numpy.abs(numpy.asarray(defocus_values) - best_focus)
+
+    return calculate_hews
+
+@pytest.mark.parametrize("best_focus", [-3.3e-4, 0.0, 1.234e-4, 7.7e-4])
+def test_converges_to_the_minimum(best_focus):
+    calls = []
+
+    result = golden_section_best_focus(get_hew_calculator(best_focus, calls), -1e-3, 1e-3, 1e-6)
+
+    assert result.converged and not result.interrupted
+    assert abs(result.defocus - best_focus) <= 1e-6
+    assert result.hew == numpy.min(result.hew_list)
+    assert calls[0] == 11 # coarse grid in a single call
+    assert result.number_of_calls == len(calls)
+    assert result.number_of_propagations == sum(calls)
+    assert result.number_of_propagations <= estimate_number_of_propagations(-1e-3, 1e-3, 1e-6)
+    assert numpy.all(numpy.diff(result.defocus_list) > 0)
+
+@pytest.mark.parametrize("best_focus, edge", [(-1e-3, -1e-3), (-5e-3, -1e-3), (1e-3, 1e-3), (5e-3, 1e-3)])
+def test_minimum_at_the_scan_edges(best_focus, edge):
+    result = golden_section_best_focus(get_hew_calculator(best_focus), -1e-3, 1e-3, 1e-6)
+
+    # bracketed by the edge and its neighbour: the search never leaves the scan range
+    assert result.converged
+    assert numpy.all(result.defocus_list >= -1e-3) and numpy.all(result.defocus_list <= 1e-3)
+    assert abs(result.defocus - edge) <= 1e-6
+
+def test_interrupted():
+    calls = []
+
+    result = golden_section_best_focus(get_hew_calculator(1e-4, calls), -1e-3, 1e-3, 1e-9, keep_running=lambda: len(calls) < 4)
+
+    assert result.interrupted and not result.converged
+    assert len(calls) == 4
+    assert result.defocus in result.defocus_list
+
+def test_not_converged_within_max_iterations():
+    result = golden_section_best_focus(get_hew_calculator(1e-4), -1e-3, 1e-3, 1e-12, max_iterations=5)
+
+    assert not result.converged
+    assert result.number_of_propagations == 11 + 2 + 5
+
+def test_wrong_parameters():
+    with pytest.raises(ValueError): golden_section_best_focus(get_hew_calculator(0.0), 1e-3, -1e-3, 1e-6)
+    with pytest.raises(ValueError): golden_section_best_focus(get_hew_calculator(0.0), -1e-3, 1e-3, 0.0)
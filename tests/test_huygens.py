@@ -0,0 +1,36 @@
+import numpy
+
+from wiselib import Rayman
+
+from orangecontrib.wise.util.wise_huygens import huygens_integral_1d, get_block_size
+
+def test_same_integral_of_rayman(get_geometry):
+    wavelength, mir_E, mir_x, mir_y, det_x, det_y = get_geometry(500, 201)
+
+    electric_fields = huygens_integral_1d(wavelength, mir_E, mir_x, mir_y, det_x, det_y)
+    reference = Rayman.HuygensIntegral_1d_MultiPool(wavelength, mir_E, mir_x, mir_y, det_x, det_y, 0)
+
+    # the phase reduction modulo 2 pi costs < 1e-7 rad
+    assert numpy.max(numpy.abs(electric_fields - reference)) < 1e-6*numpy.max(numpy.abs(reference))
+
+def test_result_does_not_depend_on_the_blocks(get_geometry):
+    wavelength, mir_E, mir_x, mir_y, det_x, det_y = get_geometry(500, 201)
+
+    one_block = huygens_integral_1d(wavelength, mir_E, mir_x, mir_y, det_x, det_y, max_memory=1024**3)
+    uneven_blocks = huygens_integral_1d(wavelength, mir_E, mir_x, mir_y, det_x, det_y, max_memory=7*32*len(mir_x))
+
+    assert get_block_size(len(mir_x), max_memory=7*32*len(mir_x)) == 7
+    assert numpy.allclose(uneven_blocks, one_block, rtol=1e-12, atol=0.0)
+
+def test_block_size():
+    assert get_block_size(1000, max_memory=32*1000*10) == 10
+    assert get_block_size(1000, max_memory=1) == 1
+    assert get_block_size(1000, max_memory=28*1000*10, single_precision=True) == 10
+
+def test_single_precision(get_geometry):
+    wavelength, mir_E, mir_x, mir_y, det_x, det_y = get_geometry(500, 201)
+
+    electric_fields = huygens_integral_1d(wavelength, mir_E, mir_x, mir_y, det_x, det_y, single_precision=True)
+    reference = huygens_integral_1d(wavelength, mir_E, mir_x, mir_y, det_x, det_y)
+
+    assert numpy.max(numpy.abs(electric_fields - reference)) < 1e-4*numpy.max(numpy.abs(reference))
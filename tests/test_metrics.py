@@ -0,0 +1,103 @@
+import numpy
+import pytest
+
+from wiselib import Rayman
+
+from orangecontrib.wise.util.wise_objects import WiseNumericalIntegrationParameters
+from orangecontrib.wise.util.wise_propagator import HuygensIntegralPropagator
+from orangecontrib.wise.util.wise_metrics import get_focal_metrics, get_hews, get_fwhms, stack_focal_metrics
+from orangecontrib.wise.util.wise_pipeline import create_gaussian_source, create_elliptical_mirror, position_source_at_mirror_focus, \
+    propagate_to_mirror, propagate_to_detector
+
+SIGMA = 2e-6
+CENTRE = 1.5e-6
+
+# denser at the centre than at the ends
+def get_non_uniform_positions(number_of_points=2001):
+    u = numpy.linspace(-1.0, 1.0, number_of_points)
+
+    return 25e-6*(0.2*u + 0.8*u**3)
+
+def get_gaussian(positions, sigma=SIGMA, centre=CENTRE):
+    return numpy.exp(-(positions - centre)**2/(2*sigma**2))
+
+@pytest.mark.parametrize("positions", [numpy.linspace(-25e-6, 25e-6, 2001), get_non_uniform_positions()])
+def test_gaussian_profile(positions):
+    metrics = get_focal_metrics(positions, get_gaussian(positions))
+
+    assert metrics.integrated_intensity[0] == pytest.approx(numpy.sqrt(2*numpy.pi)*SIGMA, rel=1e-4)
+    assert metrics.centroid[0] == pytest.approx(CENTRE, rel=1e-4)
+    assert metrics.RMS_width[0] == pytest.approx(SIGMA, rel=1e-4)
+    assert metrics.FWHM[0] == pytest.approx(2*numpy.sqrt(2*numpy.log(2))*SIGMA, rel=1e-3)
+    assert metrics.HEW[0] == pytest.approx(2*0.6744897501960817*SIGMA, rel=1e-2) # estimate
+    assert metrics.peak_intensity[0] == pytest.approx(1.0, rel=1e-3)
+    assert metrics.strehl_ratio[0] == 1.0
+
+def test_non_uniform_grid_same_as_uniform_grid():
+    uniform_positions = numpy.linspace(-25e-6, 25e-6, 2001)
+    non_uniform_positions = get_non_uniform_positions()
+
+    uniform_metrics = get_focal_metrics(uniform_positions, get_gaussian(uniform_positions))
+    non_uniform_metrics = get_focal_metrics(non_uniform_positions, get_gaussian(non_uniform_positions))
+
+    for name in ("integrated_intensity", "centroid", "RMS_width"):
+        assert getattr(non_uniform_metrics, name)[0] == pytest.approx(getattr(uniform_metrics, name)[0], rel=1e-4)
+
+def test_stack_with_positions_per_plane():
+    positions = numpy.array([get_non_uniform_positions(), numpy.linspace(-25e-6, 25e-6, 2001)])
+    intensities = numpy.array([get_gaussian(positions[0], sigma=SIGMA), get_gaussian(positions[1], sigma=2*SIGMA)])
+
+    metrics = get_focal_metrics(positions, intensities)
+
+    assert len(metrics) == 2
+    assert numpy.allclose(metrics.RMS_width, [SIGMA, 2*SIGMA], rtol=1e-4)
+    assert numpy.allclose(get_fwhms(positions, intensities), 2*numpy.sqrt(2*numpy.log(2))*numpy.array([SIGMA, 2*SIGMA]), rtol=1e-3)
+    assert numpy.allclose(get_hews(positions, intensities), 2*0.6744897501960817*numpy.array([SIGMA, 2*SIGMA]), rtol=1e-2)
+    # sharpest plane as reference
+    assert numpy.allclose(metrics.strehl_ratio, [1.0, 0.5], rtol=1e-3)
+
+def test_given_hews_are_kept():
+    positions = get_non_uniform_positions()
+
+    metrics = get_focal_metrics(positions, [get_gaussian(positions), get_gaussian(positions, sigma=2*SIGMA)], hews=[1e-6, 2e-6])
+
+    assert list(metrics.HEW) == [1e-6, 2e-6]
+
+def test_planes_without_energy():
+    positions = get_non_uniform_positions()
+
+    metrics = get_focal_metrics(positions, [get_gaussian(positions), numpy.zeros(len(positions))])
+
+    assert list(metrics.get_invalid_indexes()) == [1]
+
+def test_plane_selection_and_stack():
+    positions = get_non_uniform_positions()
+    metrics = get_focal_metrics(positions, [get_gaussian(positions), get_gaussian(positions, sigma=2*SIGMA)])
+
+    stacked_metrics = stack_focal_metrics([metrics[1], metrics[0]])
+
+    assert numpy.array_equal(stacked_metrics.RMS_width, metrics.RMS_width[::-1])
+
+def test_propagation_hews_are_rayman_hews():
+    elliptic_mirror = create_elliptical_mirror(98.0, 1.2, 2.5, 0.4)
+    source = position_source_at_mirror_focus(create_gaussian_source(5e-9, 20e-6, source_on_mirror_focus=True), elliptic_mirror)
+    wise_output, _ = propagate_to_mirror(source, elliptic_mirror, WiseNumericalIntegrationParameters.USER_DEFINED, number_of_points=200)
+
+    propagation_output = propagate_to_detector(wise_output, 50e-6, numpy.array([-5e-4, 0.0]), WiseNumericalIntegrationParameters.USER_DEFINED, 200,
+                                               detector_number_of_points=100)
+
+    for index in range(2):
+        hew = Rayman.HalfEnergyWidth_1d(abs(propagation_output.electric_fields[index])**2, Step=numpy.mean(numpy.diff(propagation_output.det_s[index])))
+
+        assert propagation_output.HEW[index] == hew
+        assert propagation_output.metrics.HEW[index] == hew
+
+@pytest.mark.parametrize("bad_value", [numpy.nan, 0.0])
+def test_inconsistent_planes_are_rejected_before_rayman(bad_value):
+    det_s = numpy.linspace(-25e-6, 25e-6, 101)
+    electric_fields = numpy.array([get_gaussian(det_s), get_gaussian(det_s)], dtype=complex)
+    electric_fields[1] = electric_fields[1]*0.0 + bad_value
+
+    with pytest.raises(Exception, match="Inconsistent source parameters"):
+        HuygensIntegralPropagator().focal_metrics(5e-9, numpy.zeros(10), numpy.linspace(-2e-3, 2e-3, 10),
+                                                  numpy.full((2, 101), 1.2), numpy.tile(det_s, (2, 1)), numpy.tile(det_s, (2, 1)), electric_fields)
@@ -0,0 +1,61 @@
+import numpy
+import pytest
+
+from orangecontrib.wise.util.wise_metrology import resample_figure_error, FIGURE_ERROR_OVERSAMPLING
+
+FIGURE_ERROR_STEP = 1e-4 # [m]
+PROPAGATION_STEP = 1e-3 # [m]: Nyquist frequency 500 1/m
+NUMBER_OF_SAMPLES = 4001 # 0.4 m
+
+# sinusoids periodic on the FFT domain (NUMBER_OF_SAMPLES*FIGURE_ERROR_STEP), through zero at both ends
+def get_sinusoid(positions, periods, amplitude):
+    return amplitude*numpy.sin(numpy.pi*periods*positions/((NUMBER_OF_SAMPLES - 1)*FIGURE_ERROR_STEP))
+
+def test_high_frequencies_are_removed():
+    positions = numpy.arange(NUMBER_OF_SAMPLES)*FIGURE_ERROR_STEP
+    low_frequency = get_sinusoid(positions, 8, 1e-9) # 10 1/m
+    high_frequency = get_sinusoid(positions, 1000, 1e-9) # 1250 1/m
+
+    heights, step = resample_figure_error(low_frequency + high_frequency, FIGURE_ERROR_STEP, PROPAGATION_STEP)
+    low_frequency_heights, _ = resample_figure_error(low_frequency, FIGURE_ERROR_STEP, PROPAGATION_STEP)
+
+    assert step <= PROPAGATION_STEP/FIGURE_ERROR_OVERSAMPLING
+    assert numpy.max(numpy.abs(low_frequency_heights - get_sinusoid(numpy.arange(len(heights))*step, 8, 1e-9))) < 1e-11
+    # what is left of the high frequency: ripples at the ends of the profile
+    assert numpy.std(heights - low_frequency_heights) < 1e-2*numpy.std(high_frequency)
+
+@pytest.mark.parametrize("number_of_samples, figure_error_step, propagation_step", [(NUMBER_OF_SAMPLES, FIGURE_ERROR_STEP, PROPAGATION_STEP),
+                                                                                      (401, 1e-3, 10e-3),
+                                                                                      (1000, 1e-3, 10e-3)])
+def test_measured_length_and_end_points_are_preserved(number_of_samples, figure_error_step, propagation_step):
+    figure_error = numpy.random.default_rng(0).normal(size=number_of_samples)*1e-9
+
+    heights, step = resample_figure_error(figure_error, figure_error_step, propagation_step)
+
+    assert step <= propagation_step/FIGURE_ERROR_OVERSAMPLING
+    assert (len(heights) - 1)*step == pytest.approx((number_of_samples - 1)*figure_error_step, rel=1e-12)
+    assert heights[0] == pytest.approx(figure_error[0], rel=1e-9)
+    assert heights[-1] == pytest.approx(figure_error[-1], rel=1e-9)
+
+def test_linear_trend_is_kept():
+    figure_error = numpy.linspace(-2e-9, 3e-9, NUMBER_OF_SAMPLES)
+
+    heights, step = resample_figure_error(figure_error, FIGURE_ERROR_STEP, PROPAGATION_STEP)
+
+    assert numpy.allclose(heights, -2e-9 + 5e-9*numpy.arange(len(heights))*step/((NUMBER_OF_SAMPLES - 1)*FIGURE_ERROR_STEP), rtol=0.0, atol=1e-20)
+
+def test_coarse_profile_is_not_resampled():
+    figure_error = numpy.random.default_rng(0).normal(size=101)*1e-9
+
+    heights, step = resample_figure_error(figure_error, 1e-3, PROPAGATION_STEP)
+
+    assert heights is figure_error and step == 1e-3
+
+def test_resampled_profiles_are_cached():
+    figure_error = numpy.random.default_rng(1).normal(size=NUMBER_OF_SAMPLES)*1e-9
+
+    heights, step = resample_figure_error(figure_error, FIGURE_ERROR_STEP, PROPAGATION_STEP)
+
+    assert resample_figure_error(figure_error.copy(), FIGURE_ERROR_STEP, PROPAGATION_STEP)[0] is heights
+    assert not heights.flags.writeable
+    assert not numpy.array_equal(resample_figure_error(figure_error, FIGURE_ERROR_STEP, 2*PROPAGATION_STEP)[0], heights)
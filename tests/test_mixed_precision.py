@@ -0,0 +1,79 @@
+import numpy
+import pytest
+
+from orangecontrib.wise.util import wise_propagator
+from orangecontrib.wise.util.wise_objects import WiseNumericalIntegrationParameters
+from orangecontrib.wise.util.wise_propagator import MixedPrecisionHuygensIntegralPropagator, WisePropagationParameters, WisePropagationAlgorithms
+from orangecontrib.wise.util.wise_huygens import huygens_integral_1d, get_precision_errors
+from orangecontrib.wise.util.wise_pipeline import create_gaussian_source, create_elliptical_mirror, position_source_at_mirror_focus, \
+    propagate_to_mirror, propagate_to_detector
+
+def test_no_fallback_within_tolerance(get_geometry):
+    wavelength, mir_E, mir_x, mir_y, det_x, det_y = get_geometry()
+
+    propagator = MixedPrecisionHuygensIntegralPropagator()
+    propagator.huygens_integral(wavelength, mir_E, mir_x, mir_y, det_x, det_y, WisePropagationParameters())
+
+    assert propagator.number_of_integrals == 1
+    assert propagator.number_of_fallbacks == 0
+
+def _check_fallback(monkeypatch, get_geometry, precision_errors):
+    wavelength, mir_E, mir_x, mir_y, det_x, det_y = get_geometry()
+
+    monkeypatch.setattr(wise_propagator, "get_precision_errors", lambda *arguments: precision_errors)
+
+    propagator = MixedPrecisionHuygensIntegralPropagator()
+    electric_fields = propagator.huygens_integral(wavelength, mir_E, mir_x, mir_y, det_x, det_y, WisePropagationParameters())
+
+    assert propagator.number_of_fallbacks == 1
+    assert numpy.array_equal(electric_fields, huygens_integral_1d(wavelength, mir_E, mir_x, mir_y, det_x, det_y))
+
+def test_fallback_above_tolerance(monkeypatch, get_geometry):
+    _check_fallback(monkeypatch, get_geometry, (1e-2, 0.0))
+
+def test_fallback_with_nan_hew_error(monkeypatch, get_geometry):
+    _check_fallback(monkeypatch, get_geometry, (numpy.nan, 0.0))
+
+def test_fallback_with_nan_intensity_error(monkeypatch, get_geometry):
+    _check_fallback(monkeypatch, get_geometry, (0.0, numpy.nan))
+
+def test_batched_planes_are_checked_one_by_one(get_geometry):
+    wavelength, mir_E, mir_x, mir_y, det_x, det_y = get_geometry()
+
+    # second plane 20 um off axis: out of focus tails only
+    det_x = numpy.concatenate((det_x, det_x))
+    det_y = numpy.concatenate((det_y, det_y + 20e-6))
+
+    electric_fields = huygens_integral_1d(wavelength, mir_E, mir_x, mir_y, det_x, det_y)
+    electric_fields[len(electric_fields)//2:] *= 1.1
+
+    planes_errors = [get_precision_errors(wavelength, mir_E, mir_x, mir_y, det_x[plane], det_y[plane], electric_fields[plane])
+                     for plane in (slice(0, 101), slice(101, 202))]
+
+    assert planes_errors[0] == pytest.approx((0.0, 0.0), abs=1e-12)
+    assert planes_errors[1][1] == pytest.approx(0.21)
+    assert get_precision_errors(wavelength, mir_E, mir_x, mir_y, det_x, det_y, electric_fields, number_of_planes=2) == \
+           tuple(numpy.max(planes_errors, axis=0))
+
+def test_precision_check_on_the_output(monkeypatch, capsys):
+    elliptic_mirror = create_elliptical_mirror(98.0, 1.2, 2.5, 0.4)
+    source = position_source_at_mirror_focus(create_gaussian_source(5e-9, 20e-6, source_on_mirror_focus=True), elliptic_mirror)
+    wise_output, _ = propagate_to_mirror(source, elliptic_mirror, WiseNumericalIntegrationParameters.USER_DEFINED, number_of_points=200,
+                                         algorithm=WisePropagationAlgorithms.MixedPrecisionHuygensIntegral)
+
+    def propagate(defocus):
+        return propagate_to_detector(wise_output, 50e-6, defocus, WiseNumericalIntegrationParameters.USER_DEFINED, 200,
+                                     algorithm=WisePropagationAlgorithms.MixedPrecisionHuygensIntegral, detector_number_of_points=100)
+
+    precision_check = propagate(numpy.array([-1e-4, 0.0])).precision_check
+
+    assert not precision_check.recalculated_in_double_precision
+    assert all([error <= precision_check.tolerance for error in precision_check.precision_errors])
+
+    monkeypatch.setattr(wise_propagator, "get_precision_errors", lambda *arguments: (numpy.nan, 0.0))
+
+    precision_check = propagate(numpy.array([-2e-4, 0.0])).precision_check
+
+    assert precision_check.recalculated_in_double_precision
+    assert "recalculated in double precision" in str(precision_check)
+    assert capsys.readouterr().out == "" # the widgets report it
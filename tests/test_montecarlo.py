@@ -0,0 +1,83 @@
+import json
+import numpy
+import pytest
+
+from orangecontrib.wise.util.wise_metrics import METRICS
+from orangecontrib.wise.util.wise_montecarlo import WiseEnsembleStatistics
+
+POSITIONS = numpy.linspace(-25e-6, 25e-6, 51)
+
+def get_metrics(hew):
+    metrics = {name: 0.0 for name in METRICS}
+    metrics["HEW"] = hew
+    metrics["FWHM"] = 1.2*hew
+
+    return metrics
+
+def add_profiles(statistics, hews):
+    for index, hew in enumerate(hews):
+        statistics.add(index, get_metrics(hew), POSITIONS, numpy.exp(-POSITIONS**2/(2*hew**2)))
+
+def test_mean_and_standard_deviation():
+    hews = 1e-6 + 1e-8*numpy.random.default_rng(0).normal(size=200)
+
+    statistics = WiseEnsembleStatistics()
+    add_profiles(statistics, hews)
+
+    assert statistics.number_of_profiles == 200
+    assert statistics.means["HEW"] == pytest.approx(numpy.mean(hews), rel=1e-12)
+    assert statistics.get_standard_deviation("HEW") == pytest.approx(numpy.std(hews, ddof=1), rel=1e-9)
+    assert statistics.get_standard_deviation("FWHM") == pytest.approx(1.2*numpy.std(hews, ddof=1), rel=1e-9)
+    assert numpy.allclose(statistics.get_hew_percentiles(), numpy.percentile(hews, (5, 50, 95)))
+
+def test_confidence_interval():
+    hews = 1e-6 + 1e-8*numpy.random.default_rng(1).normal(size=100)
+
+    statistics = WiseEnsembleStatistics(confidence=0.95)
+    add_profiles(statistics, hews)
+
+    assert statistics.get_confidence_interval_width() == pytest.approx(2*1.959964*numpy.std(hews, ddof=1)/10, rel=1e-6)
+
+def test_fewer_than_two_profiles():
+    statistics = WiseEnsembleStatistics()
+
+    assert numpy.all(numpy.isnan(statistics.get_hew_percentiles()))
+    assert statistics.get_mean_intensities() is None
+
+    add_profiles(statistics, [1e-6])
+
+    assert numpy.isnan(statistics.get_standard_deviation())
+    assert statistics.get_confidence_interval_width() == numpy.inf
+    assert not statistics.is_converged(1.0, min_profiles=1)
+
+def test_convergence():
+    statistics = WiseEnsembleStatistics()
+    add_profiles(statistics, 1e-6 + 1e-8*numpy.random.default_rng(2).normal(size=5))
+
+    assert not statistics.is_converged(1.0, min_profiles=10) # too few profiles
+
+    add_profiles(statistics, 1e-6 + 1e-8*numpy.random.default_rng(3).normal(size=5))
+
+    assert statistics.is_converged(1.0, min_profiles=10)
+    assert not statistics.is_converged(1e-12, min_profiles=10)
+
+def test_mean_intensities_on_the_first_positions():
+    statistics = WiseEnsembleStatistics()
+    statistics.add(0, get_metrics(1e-6), POSITIONS, numpy.ones(len(POSITIONS)))
+    statistics.add(1, get_metrics(1e-6), POSITIONS[::2], 3*numpy.ones(len(POSITIONS[::2])))
+
+    assert numpy.allclose(statistics.get_mean_intensities(), 2.0)
+
+def test_wrong_confidence():
+    with pytest.raises(ValueError): WiseEnsembleStatistics(confidence=1.0)
+
+def test_save(tmp_path):
+    statistics = WiseEnsembleStatistics()
+    add_profiles(statistics, [1e-6, 2e-6, 3e-6])
+
+    statistics.save(str(tmp_path / "ensemble.npz"))
+
+    with numpy.load(str(tmp_path / "ensemble.npz")) as npz_file:
+        assert list(npz_file["profile_indexes"]) == [0, 1, 2]
+        assert numpy.array_equal(npz_file["hews"], [1e-6, 2e-6, 3e-6])
+        assert json.loads(str(npz_file["summary"]))["HEW_mean"] == pytest.approx(2e-6)
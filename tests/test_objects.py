@@ -0,0 +1,78 @@
+import numpy
+import pytest
+
+from orangecontrib.wise.util.wise_objects import WiseWavefront, WiseSource, WiseOpticalElement, get_wavefront_dtype
+
+def get_wavefront(number_of_points=50, single_precision=False):
+    positions_x = numpy.linspace(0.0, 1.0, number_of_points)
+    positions_y = numpy.linspace(-1.0, 1.0, number_of_points)
+    positions_s = numpy.linspace(-0.2, 0.2, number_of_points)
+    electric_fields = numpy.exp(1j*numpy.linspace(0, numpy.pi, number_of_points))
+
+    return WiseWavefront(positions_x, positions_y, positions_s, electric_fields, single_precision=single_precision), \
+           (positions_x, positions_y, positions_s, electric_fields)
+
+def test_fields_are_views_on_one_array():
+    wavefront, (positions_x, positions_y, positions_s, electric_fields) = get_wavefront()
+
+    assert len(wavefront) == 50
+    assert not wavefront.is_single_precision()
+    assert numpy.array_equal(wavefront.positions_x, positions_x)
+    assert numpy.array_equal(wavefront.positions_y, positions_y)
+    assert numpy.array_equal(wavefront.positions_s, positions_s)
+    assert numpy.array_equal(wavefront.electric_fields, electric_fields)
+
+    data = wavefront.get_data()
+    for field in [wavefront.positions_x, wavefront.positions_y, wavefront.positions_s, wavefront.electric_fields]:
+        assert numpy.shares_memory(field, data)
+
+    # writes through the views and the setters land in the same array
+    wavefront.electric_fields[0] = 2.0
+    wavefront.positions_y = positions_y + 1.0
+
+    assert data["E"][0] == 2.0
+    assert numpy.array_equal(data["y"], positions_y + 1.0)
+
+def test_single_precision_dtypes():
+    wavefront, (positions_x, positions_y, positions_s, electric_fields) = get_wavefront(single_precision=True)
+
+    assert wavefront.is_single_precision()
+    assert wavefront.get_data().dtype == get_wavefront_dtype(single_precision=True)
+    assert wavefront.electric_fields.dtype == numpy.complex64
+    assert wavefront.positions_s.dtype == numpy.float32
+
+    # the positions carry the phase of the Huygens integral: they stay in double precision
+    assert wavefront.positions_x.dtype == numpy.float64
+    assert wavefront.positions_y.dtype == numpy.float64
+    assert numpy.array_equal(wavefront.positions_y, positions_y)
+    assert numpy.allclose(wavefront.electric_fields, electric_fields, rtol=0.0, atol=1e-6)
+
+def test_default_wavefront():
+    wavefront = WiseWavefront()
+
+    assert len(wavefront) == 100
+    assert len(wavefront.residuals) == 0
+    assert numpy.all(wavefront.electric_fields == 0.0)
+
+def test_length_mismatch():
+    wavefront, (positions_x, _, _, electric_fields) = get_wavefront()
+
+    with pytest.raises(ValueError):
+        wavefront.electric_fields = electric_fields[:-1]
+    with pytest.raises(ValueError):
+        wavefront.positions_x = numpy.append(positions_x, 2.0)
+
+    assert numpy.array_equal(wavefront.electric_fields, electric_fields)
+
+@pytest.mark.parametrize("container_class", [WiseSource, WiseOpticalElement])
+def test_properties_are_not_shared(container_class):
+    container_1 = container_class()
+    container_2 = container_class()
+
+    container_1.set_property("delta_theta", 1e-6)
+
+    assert container_1.get_property("delta_theta") == 1e-6
+    assert not "delta_theta" in container_2.properties
+
+    with pytest.raises(KeyError):
+        container_2.get_property("delta_theta")
@@ -0,0 +1,41 @@
+import numpy
+
+from wiselib import Optics
+
+from orangecontrib.wise.util.wise_objects import WiseSource
+from orangecontrib.wise.util.wise_pipeline import create_gaussian_source, create_elliptical_mirror, position_source_at_mirror_focus
+
+def get_source_on_focus(inner_wise_source, longitudinal_correction=0.0):
+    wise_source = WiseSource(inner_wise_source=inner_wise_source)
+    wise_source.set_property("source_on_mirror_focus", True)
+    wise_source.set_property("longitudinal_correction", longitudinal_correction)
+    wise_source.set_property("transverse_correction", 0.0)
+    wise_source.set_property("delta_theta", 0.0)
+
+    return wise_source
+
+def test_gaussian_source_at_mirror_focus(capsys):
+    elliptic_mirror = create_elliptical_mirror(98.0, 1.2, 2.5, 0.4)
+    source = position_source_at_mirror_focus(create_gaussian_source(5e-9, 20e-6, source_on_mirror_focus=True), elliptic_mirror)
+
+    assert isinstance(source.inner_wise_source, Optics.GaussianSource_1d)
+    assert numpy.isclose(source.inner_wise_source.ZOrigin, elliptic_mirror.XYF1[0])
+    assert numpy.isclose(source.inner_wise_source.YOrigin, elliptic_mirror.XYF1[1])
+    assert capsys.readouterr().out == ""
+
+def test_point_source_at_mirror_focus(capsys):
+    elliptic_mirror = create_elliptical_mirror(98.0, 1.2, 2.5, 0.4)
+    source = position_source_at_mirror_focus(get_source_on_focus(Optics.PointSource_1d(5e-9), longitudinal_correction=1e-3), elliptic_mirror)
+
+    assert type(source.inner_wise_source) is Optics.PointSource_1d
+    assert source.inner_wise_source.Lambda == 5e-9
+    assert capsys.readouterr().out == ""
+
+    # same field as a point source built on F1, moved by the correction along the direction of F1
+    z_origin = elliptic_mirror.XYF1[0] + 1e-3*numpy.cos(elliptic_mirror.p1_Angle)
+    y_origin = elliptic_mirror.XYF1[1] + 1e-3*numpy.sin(elliptic_mirror.p1_Angle)
+
+    x, y = elliptic_mirror.GetXY_MeasuredMirror(100, 0)
+
+    assert numpy.allclose(source.inner_wise_source.EvalField_XYLab(x, y),
+                          Optics.PointSource_1d(5e-9, XOrigin=z_origin, YOrigin=y_origin).EvalField_XYLab(x, y))
@@ -0,0 +1,109 @@
+import threading
+import numpy
+
+from orangecontrib.wise.util.wise_pool import WiseWorkerPool
+from orangecontrib.wise.util.wise_propagator import WisePropagatorsChain, huygens_integral, TASKS_PER_PROCESS
+
+def square(value):
+    return value*value
+
+def test_map():
+    worker_pool = WiseWorkerPool(2)
+
+    try:
+        assert worker_pool.map(square, [(value,) for value in range(10)]) == [value*value for value in range(10)]
+        assert worker_pool.statistics.number_of_tasks == 10
+    finally:
+        worker_pool.shutdown()
+
+    assert not worker_pool.is_running()
+
+def test_imap_unordered_locks_the_pool():
+    worker_pool = WiseWorkerPool(2)
+
+    results = worker_pool.imap_unordered(square, [(value,) for value in range(10)])
+    first_result = next(results)
+
+    resize = threading.Thread(target=worker_pool.set_n_pools, args=(3,))
+    resize.start()
+    resize.join(0.3)
+
+    assert resize.is_alive() # waiting for the iteration
+    assert worker_pool.get_n_pools() == 2
+
+    assert sorted([first_result] + list(results)) == [value*value for value in range(10)]
+
+    resize.join(5)
+
+    assert not resize.is_alive()
+    assert worker_pool.get_n_pools() == 3
+
+    worker_pool.shutdown()
+
+def test_pooled_huygens_integral_is_identical_to_serial(get_geometry):
+    try:
+        assert numpy.array_equal(huygens_integral(*get_geometry(300, 64), n_pools=2), huygens_integral(*get_geometry(300, 64), n_pools=0))
+    finally:
+        WisePropagatorsChain.Instance().shutdown_worker_pool()
+
+def test_worker_pool_users():
+    chain = WisePropagatorsChain.Instance()
+    first_user, second_user = object(), object()
+
+    chain.acquire_worker_pool(first_user)
+    chain.acquire_worker_pool(second_user)
+
+    try:
+        chain.set_n_pools(2)
+        chain.get_worker_pool().map(square, [(1,)])
+
+        chain.release_worker_pool(first_user)
+        assert chain.get_worker_pool().is_running()
+    finally:
+        chain.release_worker_pool(second_user)
+
+    assert not chain.get_worker_pool().is_running()
+
+def test_integrals_do_not_resize_the_pool(get_geometry):
+    chain = WisePropagatorsChain.Instance()
+    user = object()
+
+    chain.acquire_worker_pool(user)
+
+    try:
+        chain.set_n_pools(2, user)
+
+        worker_pool = chain.get_worker_pool()
+        reference = huygens_integral(*get_geometry(300, 64), n_pools=0)
+
+        for n_pools, number_of_tasks in ((3, 2*TASKS_PER_PROCESS), (1, 1), (2, 2*TASKS_PER_PROCESS)):
+            pool = worker_pool._get_pool()
+            number_of_tasks_before = worker_pool.statistics.number_of_tasks
+
+            assert numpy.array_equal(huygens_integral(*get_geometry(300, 64), n_pools=n_pools), reference)
+
+            assert worker_pool.get_n_pools() == 2
+            assert worker_pool._get_pool() is pool
+            assert worker_pool.statistics.number_of_tasks - number_of_tasks_before == number_of_tasks
+    finally:
+        chain.release_worker_pool(user)
+
+def test_pool_sized_for_the_largest_request():
+    chain = WisePropagatorsChain.Instance()
+    first_user, second_user = object(), object()
+
+    chain.acquire_worker_pool(first_user)
+    chain.acquire_worker_pool(second_user)
+
+    try:
+        chain.set_n_pools(3, first_user)
+        chain.set_n_pools(2, second_user)
+
+        assert chain.get_worker_pool().get_n_pools() == 3
+
+        chain.set_n_pools(0, first_user)
+
+        assert chain.get_worker_pool().get_n_pools() == 2
+    finally:
+        chain.release_worker_pool(first_user)
+        chain.release_worker_pool(second_user)
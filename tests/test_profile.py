@@ -0,0 +1,63 @@
+import numpy
+
+from orangecontrib.wise.util.wise_objects import WiseNumericalIntegrationParameters
+from orangecontrib.wise.util.wise_profile import WisePropagationProfile, profiled_propagation, profile_stage, get_current_profile
+from orangecontrib.wise.util.wise_pipeline import create_gaussian_source, create_elliptical_mirror, position_source_at_mirror_focus, \
+    propagate_to_mirror, propagate_to_detector
+
+DETECTOR_STAGES = ["Total", "SamplingCalculator", "GetXY_TransversePlaneAtF2", "Huygens", "FocalMetrics"]
+
+def propagate(defocus=0.0):
+    elliptic_mirror = create_elliptical_mirror(98.0, 1.2, 2.5, 0.4)
+    source = position_source_at_mirror_focus(create_gaussian_source(5e-9, 20e-6, source_on_mirror_focus=True), elliptic_mirror)
+    wise_output, _ = propagate_to_mirror(source, elliptic_mirror, WiseNumericalIntegrationParameters.USER_DEFINED, number_of_points=200)
+
+    return propagate_to_detector(wise_output, 50e-6, defocus, WiseNumericalIntegrationParameters.USER_DEFINED, 200)
+
+def test_propagation_has_a_profile_of_each_stage():
+    profile = propagate().profile
+
+    for name in DETECTOR_STAGES:
+        assert profile.stages[name].calls == 1
+        assert profile.stages[name].wall_time >= 0.0
+
+    # the inner stages are counted in the outer one, the profile time is the one of the outer stage
+    assert profile.wall_time == profile.stages["Total"].wall_time
+    assert profile.stages["Huygens"].wall_time <= profile.wall_time
+    assert list(profile.to_dict().keys()) == list(profile.stages.keys())
+    assert get_current_profile() is None
+
+def test_merge_adds_up_the_times():
+    profiles = [propagate(defocus).profile for defocus in [-1e-4, 1e-4]]
+
+    merged_profile = WisePropagationProfile()
+    for profile in profiles + [None]: merged_profile.merge(profile)
+
+    assert numpy.isclose(merged_profile.wall_time, sum([profile.wall_time for profile in profiles]))
+    assert numpy.isclose(merged_profile.cpu_time, sum([profile.cpu_time for profile in profiles]))
+
+    for name in DETECTOR_STAGES:
+        stage = merged_profile.stages[name]
+
+        assert stage.calls == 2
+        assert numpy.isclose(stage.wall_time, sum([profile.stages[name].wall_time for profile in profiles]))
+        assert numpy.isclose(stage.cpu_time, sum([profile.stages[name].cpu_time for profile in profiles]))
+        assert stage.peak_memory == max([profile.stages[name].peak_memory for profile in profiles])
+
+def test_stages_of_nested_propagations():
+    with profiled_propagation("Outer") as outer_profile:
+        with profile_stage("A"): pass
+
+        with profiled_propagation("Inner") as inner_profile:
+            with profile_stage("B"): pass
+
+        with profile_stage("A"): pass
+
+    assert list(outer_profile.stages.keys()) == ["Outer", "A"]
+    assert outer_profile.stages["A"].calls == 2
+    assert list(inner_profile.stages.keys()) == ["Inner", "B"]
+
+    # no-op outside of a propagation
+    with profile_stage("C"): pass
+
+    assert get_current_profile() is None
@@ -0,0 +1,112 @@
+import json
+import numpy
+import pytest
+from collections import OrderedDict
+
+from orangecontrib.wise.util import wise_scan
+from orangecontrib.wise.util.wise_metrics import METRICS
+from orangecontrib.wise.util.wise_scan import cartesian_grid, latin_hypercube_grid, get_grid, get_scan_tasks, run_scan, WiseScanTable, DONE, PENDING
+
+DESCRIPTION = {"source": {"wavelength": 5e-9, "sigma": 20e-6, "source_on_mirror_focus": True},
+               "mirror": {"f1": 98.0, "f2": 1.2, "alpha": 2.5, "length": 0.4, "calculation_type": "user_defined", "number_of_points": 200},
+               "detector": {"detector_size": 50e-6, "calculation_type": "user_defined", "number_of_points": 200, "detector_number_of_points": 65}}
+
+def get_test_grid():
+    return cartesian_grid(OrderedDict([("defocus", [-1e-3, 0.0, 1e-3]), ("alpha", [2.4, 2.5])]))
+
+def test_cartesian_grid():
+    grid = get_test_grid()
+
+    # detector parameters vary fastest
+    assert grid.dtype.names == ("alpha", "defocus")
+    assert list(grid["alpha"]) == [2.4, 2.4, 2.4, 2.5, 2.5, 2.5]
+    assert list(grid["defocus"]) == [-1e-3, 0.0, 1e-3]*2
+
+def test_grid_from_description():
+    grid = get_grid({"parameters": {"f2": [1.1, 1.2], "defocus": {"start": -1e-3, "stop": 1e-3, "points": 5}}})
+
+    assert len(grid) == 10
+    assert numpy.allclose(grid["defocus"][:5], numpy.linspace(-1e-3, 1e-3, 5))
+
+    with pytest.raises(ValueError): get_grid({"parameters": {"wavelength": [1e-9]}})
+    with pytest.raises(ValueError): get_grid({"mode": "random", "parameters": {"f2": [1.1]}})
+
+def test_latin_hypercube_grid():
+    grid = latin_hypercube_grid(OrderedDict([("f2", [1.1, 1.3]), ("delta_theta", [-0.01, 0.01])]), 20, seed=1)
+
+    # one point per stratum on every axis
+    assert sorted(numpy.floor((grid["f2"] - 1.1)/0.01 + 1e-9).astype(int)) == list(range(20))
+    assert sorted(numpy.floor((grid["delta_theta"] + 0.01)/0.001 + 1e-9).astype(int)) == list(range(20))
+
+def test_tasks_share_the_mirror_parameters():
+    grid = cartesian_grid(OrderedDict([("defocus", numpy.linspace(-1e-3, 1e-3, 20)), ("alpha", [2.4, 2.5])]))
+
+    tasks = get_scan_tasks(grid, numpy.arange(len(grid)), number_of_processes=1)
+
+    assert [[index for index, _ in task] for task in tasks] == [list(range(0, 10)), list(range(10, 20)), list(range(20, 30)), list(range(30, 40))]
+    for task in tasks: assert len(set([point["alpha"] for _, point in task])) == 1
+
+    # groups split to have enough tasks for all the processes, never mixed
+    tasks = get_scan_tasks(grid, numpy.arange(len(grid)), number_of_processes=4)
+
+    assert len(tasks) == 14
+    assert sorted([index for task in tasks for index, _ in task]) == list(range(40))
+    for task in tasks: assert len(set([point["alpha"] for _, point in task])) == 1
+
+def test_table_columns(tmp_path):
+    table = run_scan(DESCRIPTION, get_test_grid(), str(tmp_path / "scan.npy"), number_of_processes=1)
+
+    assert table.dtype.names == ("alpha", "defocus") + METRICS + ("mirror_number_of_points", "detector_number_of_points", "time", "status")
+    assert numpy.all(table["status"] == DONE)
+    assert numpy.all(table["mirror_number_of_points"] == 200)
+    assert numpy.all(table["detector_number_of_points"] == 65)
+    assert numpy.all(numpy.isfinite(table["HEW"]))
+    assert numpy.array_equal(table["defocus"], get_test_grid()["defocus"])
+
+def test_resume_skips_the_points_done(tmp_path, monkeypatch):
+    table_file_name = str(tmp_path / "scan.npy")
+    calculated_indexes = []
+
+    run_scan_task = wise_scan._run_scan_task
+
+    def counted_run_scan_task(description, task):
+        calculated_indexes.extend([index for index, _ in task])
+
+        return run_scan_task(description, task)
+
+    monkeypatch.setattr(wise_scan, "_run_scan_task", counted_run_scan_task)
+
+    # interrupted after the first task
+    table = run_scan(DESCRIPTION, get_test_grid(), table_file_name, number_of_processes=1, keep_running=lambda: False)
+
+    assert calculated_indexes == [0, 1]
+    assert list(table["status"]) == [DONE]*2 + [PENDING]*4
+
+    table = run_scan(DESCRIPTION, get_test_grid(), table_file_name, number_of_processes=1)
+
+    assert sorted(calculated_indexes) == [0, 1, 2, 3, 4, 5]
+    assert numpy.all(table["status"] == DONE)
+
+    run_scan(DESCRIPTION, get_test_grid(), table_file_name, number_of_processes=1)
+
+    assert len(calculated_indexes) == 6
+
+def test_existing_table_of_another_grid(tmp_path):
+    table_file_name = str(tmp_path / "scan.npy")
+
+    WiseScanTable(table_file_name, get_test_grid()).close()
+
+    with pytest.raises(ValueError): WiseScanTable(table_file_name, cartesian_grid(OrderedDict([("defocus", [0.0]), ("alpha", [2.4, 2.5])])))
+
+def test_command_line(tmp_path, capsys):
+    description = dict(DESCRIPTION, scan={"mode": "cartesian", "parameters": {"defocus": [-1e-3, 0.0, 1e-3]}})
+
+    with open(str(tmp_path / "beamline.json"), "w") as beamline_file: json.dump(description, beamline_file)
+
+    assert wise_scan.main([str(tmp_path / "beamline.json"), "-o", str(tmp_path / "scan.npy"), "-n", "1"]) == 0
+
+    output = capsys.readouterr().out
+    summary = json.loads(output[output.index("{"):])
+
+    assert summary["completed_points"] == 3 and summary["failed_points"] == 0
+    assert summary["best_point"]["defocus"] == 0.0
@@ -0,0 +1,110 @@
+import os
+import numpy
+import pytest
+
+from orangecontrib.wise.util.wise_metrics import get_focal_metrics, get_intensities
+from orangecontrib.wise.util.wise_sweep import WiseSweepResult
+
+DEFOCUS_LIST = numpy.linspace(-1e-3, 1e-3, 5)
+
+# gaussian spots, waist at defocus = 0
+def get_planes(defocus_list, number_of_points=65):
+    positions = numpy.tile(numpy.linspace(-25e-6, 25e-6, number_of_points), (len(defocus_list), 1))
+    sigmas = 2e-6 + 5e-3*numpy.abs(numpy.asarray(defocus_list))[:, numpy.newaxis]
+    electric_fields = numpy.exp(-positions**2/(4*sigmas**2)).astype(complex)
+    hews = 1.349*sigmas[:, 0]
+
+    return positions, electric_fields, hews
+
+def fill(sweep_result, batches):
+    positions, electric_fields, hews = get_planes(sweep_result.defocus_list)
+
+    for batch in batches:
+        sweep_result.set_planes(batch, positions[batch], electric_fields[batch], hews[batch],
+                                get_focal_metrics(positions[batch], get_intensities(electric_fields[batch]), hews=hews[batch]))
+
+    return sweep_result
+
+def test_planes_set_in_batches():
+    sweep_result = WiseSweepResult(DEFOCUS_LIST)
+
+    assert sweep_result.positions is None
+    assert not sweep_result.is_complete()
+
+    fill(sweep_result, [numpy.array([0, 1]), numpy.array([2])])
+
+    assert sweep_result.positions.shape == (5, 65)
+    assert list(sweep_result.computed) == [True, True, True, False, False]
+    assert not sweep_result.is_complete()
+
+    fill(sweep_result, [slice(3, 5)])
+
+    positions, electric_fields, hews = get_planes(DEFOCUS_LIST)
+
+    assert sweep_result.is_complete()
+    assert numpy.array_equal(sweep_result.electric_fields, electric_fields)
+    assert numpy.array_equal(sweep_result.hews, hews)
+    assert numpy.array_equal(sweep_result.metrics.HEW, hews)
+    assert sweep_result.get_best_focus_index() == 2
+
+    defocus, plane_positions, plane_electric_fields, hew = sweep_result.get_plane(4)
+
+    assert defocus == DEFOCUS_LIST[4] and hew == hews[4]
+    assert numpy.array_equal(plane_electric_fields, electric_fields[4])
+
+def test_single_plane():
+    positions, electric_fields, hews = get_planes(DEFOCUS_LIST)
+
+    sweep_result = WiseSweepResult(DEFOCUS_LIST)
+    sweep_result.set_planes(1, positions[1], electric_fields[1], hews[1])
+
+    assert sweep_result.computed[1] and sweep_result.computed.sum() == 1
+    assert numpy.array_equal(sweep_result.electric_fields[1], electric_fields[1])
+
+def test_best_focus_among_computed_planes():
+    sweep_result = fill(WiseSweepResult(DEFOCUS_LIST), [numpy.array([0, 4, 3])])
+
+    assert sweep_result.get_best_focus_index() == 3
+
+def test_different_number_of_points():
+    sweep_result = fill(WiseSweepResult(DEFOCUS_LIST), [slice(0, 2)])
+    positions, electric_fields, hews = get_planes(DEFOCUS_LIST, number_of_points=33)
+
+    with pytest.raises(ValueError): sweep_result.set_planes(slice(2, 5), positions[2:], electric_fields[2:], hews[2:])
+
+def test_selection():
+    sweep_result = fill(WiseSweepResult(DEFOCUS_LIST), [slice(None)])
+
+    selection = sweep_result[1:4]
+
+    assert len(selection) == 3
+    assert numpy.array_equal(selection.defocus_list, DEFOCUS_LIST[1:4])
+    assert numpy.array_equal(selection.electric_fields, sweep_result.electric_fields[1:4])
+    assert numpy.array_equal(selection.metrics.HEW, sweep_result.metrics.HEW[1:4])
+
+def test_focal_metrics_from_the_planes():
+    sweep_result = fill(WiseSweepResult(DEFOCUS_LIST), [slice(None)])
+    metrics = sweep_result.get_focal_metrics()
+
+    assert numpy.array_equal(metrics.HEW, sweep_result.hews)
+    assert numpy.allclose(metrics.FWHM, sweep_result.metrics.FWHM)
+    assert numpy.allclose(sweep_result.get_peak_intensities(), 1.0)
+
+def test_memory_mapped_in_directory(tmp_path):
+    sweep_result = fill(WiseSweepResult(DEFOCUS_LIST, memory_mapped=True, directory=str(tmp_path)), [slice(None)])
+
+    assert sweep_result.is_memory_mapped()
+    assert isinstance(sweep_result.electric_fields, numpy.memmap)
+    assert sorted(os.listdir(str(tmp_path))) == ["electric_fields.npy", "positions.npy"]
+    assert numpy.array_equal(numpy.load(os.path.join(str(tmp_path), "electric_fields.npy")), get_planes(DEFOCUS_LIST)[1])
+
+def test_memory_mapped_temporary_directory():
+    sweep_result = fill(WiseSweepResult(DEFOCUS_LIST, memory_mapped=True), [slice(None)])
+    directory = os.path.dirname(sweep_result.electric_fields.filename)
+
+    assert os.path.isdir(directory)
+
+    sweep_result.release()
+
+    assert sweep_result.electric_fields is None
+    assert not os.path.exists(directory)
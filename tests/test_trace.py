@@ -0,0 +1,67 @@
+import os
+import json
+
+from orangecontrib.wise.util.wise_trace import start_tracing, stop_tracing, is_tracing, traced
+from orangecontrib.wise.util.wise_objects import WiseNumericalIntegrationParameters
+from orangecontrib.wise.util.wise_pipeline import create_gaussian_source, create_elliptical_mirror, position_source_at_mirror_focus, \
+    propagate_to_mirror, propagate_to_detector
+
+def check_events(events):
+    stacks = {}
+
+    for event in events:
+        assert "pid" in event and "tid" in event
+
+        if event["ph"] == "B":
+            stacks.setdefault((event["pid"], event["tid"]), []).append(event)
+        elif event["ph"] == "E":
+            begin_event = stacks[(event["pid"], event["tid"])].pop()
+
+            assert begin_event["name"] == event["name"]
+            assert begin_event["ts"] <= event["ts"]
+
+    # every span is closed
+    assert all([len(stack) == 0 for stack in stacks.values()])
+
+    return stacks.keys()
+
+def test_traced_propagation(tmp_path):
+    elliptic_mirror = create_elliptical_mirror(98.0, 1.2, 2.5, 0.4)
+    source = position_source_at_mirror_focus(create_gaussian_source(5e-9, 20e-6, source_on_mirror_focus=True), elliptic_mirror)
+
+    file_name = str(tmp_path / "trace.json")
+
+    start_tracing(file_name)
+    try:
+        with traced("test"):
+            wise_output, _ = propagate_to_mirror(source, elliptic_mirror, WiseNumericalIntegrationParameters.USER_DEFINED, number_of_points=200)
+            propagate_to_detector(wise_output, 50e-6, 0.0, WiseNumericalIntegrationParameters.USER_DEFINED, 200, n_pools=2)
+    finally:
+        returned_events = stop_tracing()
+
+    assert not is_tracing()
+
+    with open(file_name, "r") as file: trace = json.load(file)
+
+    events = trace["traceEvents"]
+
+    assert len(events) == len(returned_events)
+
+    threads = check_events(events)
+
+    names = set([event["name"] for event in events if event["ph"] == "B"])
+    assert set(["test", "Total", "Huygens"]).issubset(names)
+
+    # the events of the pool tasks come back from the workers
+    assert os.getpid() in [pid for pid, _ in threads]
+    assert len(set([pid for pid, _ in threads])) > 1
+
+    process_names = [event["args"]["name"] for event in events if event["ph"] == "M"]
+    assert "WISE (main)" in process_names
+    assert any([process_name.startswith("WISE (worker") for process_name in process_names])
+
+def test_no_events_when_not_tracing():
+    with traced("test"): pass
+
+    assert not is_tracing()
+    assert stop_tracing() == []
@@ -0,0 +1,48 @@
+import numpy
+import pytest
+
+pytest.importorskip("wofry")
+
+from orangecontrib.wise.util.wise_wofry import wise_to_wofry, with_electric_field
+
+def get_field(wavefront):
+    return wavefront._electric_field_array.get_values()
+
+def get_arrays(number_of_points=101):
+    positions = numpy.linspace(-1e-5, 1e-5, number_of_points)
+
+    return positions, numpy.exp(-(positions/5e-6)**2) + 0j
+
+def test_wise_to_wofry_is_writable_and_copied():
+    positions, electric_fields = get_arrays()
+
+    wavefront = wise_to_wofry(1e-9, positions, electric_fields)
+
+    assert not numpy.shares_memory(get_field(wavefront), electric_fields)
+
+    get_field(wavefront)[0] = 2.0 # as WOFRY widgets do
+    assert electric_fields[0] != 2.0
+
+def test_wise_to_wofry_transfer():
+    positions, electric_fields = get_arrays()
+
+    assert numpy.shares_memory(get_field(wise_to_wofry(1e-9, positions, electric_fields, transfer=True)), electric_fields)
+
+    electric_fields.flags.writeable = False # e.g. memory mapped from the disk cache
+
+    wavefront = wise_to_wofry(1e-9, positions, electric_fields, transfer=True)
+
+    assert not numpy.shares_memory(get_field(wavefront), electric_fields)
+    get_field(wavefront)[0] = 2.0
+
+def test_with_electric_field():
+    positions, electric_fields = get_arrays()
+
+    wavefront = wise_to_wofry(1e-9, positions, electric_fields)
+    new_wavefront = with_electric_field(wavefront, 2*electric_fields)
+
+    assert numpy.allclose(get_field(wavefront), electric_fields)
+    assert numpy.allclose(get_field(new_wavefront), 2*electric_fields)
+    assert get_field(new_wavefront).flags.writeable
+    assert new_wavefront._wavelength == 1e-9
+    assert numpy.allclose(new_wavefront._electric_field_array.get_abscissas(), positions)